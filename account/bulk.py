@@ -0,0 +1,104 @@
+"""
+Bulk creation of accounting records
+"""
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max, prefetch_related_objects
+
+from core import summaries
+from core.models import Accounting, Category
+from core.versions import lock_data_versions
+
+
+BULK_MAX_RECORDS = 1000
+BULK_BATCH_SIZE = 500
+
+
+def resolve_categories(user, names, categories=None):
+    """Return the user's categories by name, creating the missing ones
+
+    Existing categories are read with one query and the missing ones are
+    created with one bulk insert. With duplicate names the oldest category
+    is used. `categories` is a cache of already resolved categories which is
+    updated in place, callers working in chunks pass the same dict each time.
+    """
+    if categories is None:
+        categories = {}
+    names = set(names) - categories.keys()
+    if not names:
+        return categories
+
+    for category in Category.objects.filter(user=user, name__in=names).order_by('-id'):
+        categories[category.name] = category
+
+    missing = [Category(user=user, name=name) for name in sorted(names - categories.keys())]
+    if missing:
+        Category.objects.bulk_create(missing)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # The keys are read back, again keeping the oldest of duplicate names
+            missing = Category.objects.filter(user=user, name__in=[category.name for category in missing])
+            missing = missing.order_by('-id')
+        categories.update((category.name, category) for category in missing)
+
+    return categories
+
+
+def assign_inserted_ids(accountings, user, last_id):
+    """Set the keys of accountings bulk inserted for a user after the given id
+
+    For backends which cannot return the primary keys of a bulk insert
+    (MySQL). The user must be locked since before last_id was read, so the
+    user's rows after it are exactly the inserted ones, in insertion order.
+    """
+    ids = list(
+        Accounting.objects.filter(user=user, id__gt=last_id).order_by('id').values_list('id', flat=True)
+    )
+    if len(ids) != len(accountings):
+        raise DatabaseError(f'Inserted {len(accountings)} accountings but found {len(ids)}')
+
+    for accounting, pk in zip(accountings, ids):
+        accounting.pk = pk
+
+
+@transaction.atomic
+@summaries.batch()
+def bulk_create_accountings(user, records, categories=None, prefetch=True):
+    """Create accountings with their categories from validated serializer data
+
+    Accountings and their category links are inserted with bulk_create and
+    the summaries are refreshed once for the whole batch. Backends which
+    cannot return the primary keys of a bulk insert (MySQL) read them back
+    with one query, see assign_inserted_ids. `categories` is passed on to
+    resolve_categories, `prefetch` loads the categories of the returned
+    accountings.
+    """
+    # Before any insert, see lock_data_versions
+    lock_data_versions([user.pk])
+
+    records = [dict(record) for record in records]
+    category_names = [
+        [category['name'] for category in record.pop('category', [])]
+        for record in records
+    ]
+    categories = resolve_categories(user, [name for names in category_names for name in names], categories)
+
+    accountings = [Accounting(user=user, **record) for record in records]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Accounting.objects.bulk_create(accountings, batch_size=BULK_BATCH_SIZE)
+    else:
+        last_id = Accounting.objects.filter(user=user).aggregate(last_id=Max('id'))['last_id'] or 0
+        Accounting.objects.bulk_create(accountings, batch_size=BULK_BATCH_SIZE)
+        assign_inserted_ids(accountings, user, last_id)
+
+    Through = Accounting.category.through
+    Through.objects.bulk_create(
+        [
+            Through(accounting_id=accounting.id, category_id=categories[name].id)
+            for accounting, names in zip(accountings, category_names)
+            for name in dict.fromkeys(names)
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    if prefetch:
+        prefetch_related_objects(accountings, 'category')
+
+    return accountings
@@ -0,0 +1,48 @@
+"""
+Sparse field selection for accounting api
+"""
+from rest_framework.exceptions import ValidationError
+
+
+FIELDS_QUERY_PARAM = 'fields'
+
+
+def requested_fields(request, available):
+    """Return the fields named by ?fields= in the order of `available`, None when not sent
+
+    Unknown or missing field names are a validation error.
+    """
+    raw = request.query_params.get(FIELDS_QUERY_PARAM)
+    if raw is None:
+        return None
+
+    names = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = sorted(names - set(available))
+    if unknown:
+        raise ValidationError({FIELDS_QUERY_PARAM: [f"Unknown field '{name}'" for name in unknown]})
+    if not names:
+        raise ValidationError({FIELDS_QUERY_PARAM: ['At least one field is required']})
+
+    return tuple(name for name in available if name in names)
+
+
+class SparseFieldsViewMixin:
+    """Answer GET requests with only the serializer fields named by ?fields=
+
+    The serializer class must accept a `fields` argument, see
+    account.serializers.SparseFieldsMixin. Views narrow their queryset to
+    the columns of get_requested_fields() themselves.
+    """
+
+    def get_requested_fields(self):
+        """Return the requested serializer fields, None for every field"""
+        if self.request.method != 'GET':
+            return None
+
+        return requested_fields(self.request, self.get_serializer_class().Meta.fields)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
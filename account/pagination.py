@@ -0,0 +1,121 @@
+"""
+Keyset pagination for accounting api
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import date
+
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.utils.urls import replace_query_param
+
+
+def seek(queryset, day, pk, reverse=False):
+    """Return the accountings after (day, pk) in (-date, -id) order, before it with `reverse`
+
+    The redundant date bound keeps the seek predicate an index range.
+    """
+    if reverse:
+        return queryset.filter(Q(date__gte=day), Q(date__gt=day) | Q(id__gt=pk))
+    return queryset.filter(Q(date__lte=day), Q(date__lt=day) | Q(id__lt=pk))
+
+
+class AccountingCursorPagination(BasePagination):
+    """Opt-in (-date, -id) keyset pagination
+
+    A page is selected with a (date, id) seek predicate instead of an offset,
+    so every page is one index range read no matter how deep it is.
+    Pagination is only applied when the request sends `cursor` or `page_size`.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        """Return True when the client asked for a paginated response"""
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def get_page_size(self, request):
+        """Return the requested page size, clamped to [1, max_page_size]"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, reverse, accounting):
+        """Return an opaque cursor pointing at an accounting, a model instance or a values() row"""
+        if isinstance(accounting, dict):
+            day, pk = accounting['date'], accounting['id']
+        else:
+            day, pk = accounting.date, accounting.id
+        raw = f"{'p' if reverse else 'n'}:{day.isoformat()}:{pk}"
+        return urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        """Return (reverse, date, id) for the request cursor, or None on the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            direction, day, pk = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split(':')
+            if direction not in ('n', 'p'):
+                raise ValueError
+            return direction == 'p', date.fromisoformat(day), int(pk)
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return one page of accountings, or None when pagination is not requested"""
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            reverse = False
+        else:
+            reverse, day, pk = cursor
+            queryset = seek(queryset, day, pk, reverse)
+
+        ordering = ('date', 'id') if reverse else ('-date', '-id')
+        results = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_link(self, reverse, accounting):
+        """Return the URL of the page before or after an accounting"""
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(reverse, accounting))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(True, self.page[0])
@@ -0,0 +1,112 @@
+"""
+Read path of the accounting list built from plain rows
+"""
+from collections import defaultdict
+
+from account.pagination import seek
+from core.models import Accounting
+from core.renderers import ORJSONRenderer
+
+
+# Columns of the list rows, the categories are read separately
+ACCOUNTING_LIST_FIELDS = ('id', 'date', 'type', 'amount', 'title')
+# Rows fetched, represented and encoded at once by a streamed list
+STREAM_CHUNK_ROWS = 500
+
+
+def category_pairs(accounting_ids):
+    """Return the (id, name) categories of accountings by accounting id, with one query"""
+    categories = defaultdict(list)
+    if not accounting_ids:
+        return categories
+
+    pairs = (
+        Accounting.category.through.objects
+        .filter(accounting_id__in=accounting_ids)
+        .order_by('accounting_id', 'category_id')
+        .values_list('accounting_id', 'category_id', 'category__name')
+    )
+    for accounting_id, category_id, name in pairs:
+        categories[accounting_id].append({'id': category_id, 'name': name})
+    return categories
+
+
+def list_columns(fields=None):
+    """Return the values() columns needed to represent the given serializer fields
+
+    The id and date are always read, they key the categories and the cursors.
+    """
+    if fields is None:
+        return ACCOUNTING_LIST_FIELDS
+
+    return tuple(name for name in ACCOUNTING_LIST_FIELDS if name in ('id', 'date') or name in fields)
+
+
+def accounting_list_data(rows, fields=None):
+    """Return the AccountingSerializer representation of accounting rows
+
+    `rows` are dicts of `list_columns(fields)`, as returned by
+    `queryset.values(*list_columns(fields))`. The output is the same as
+    `AccountingSerializer(accountings, many=True, fields=fields).data`
+    without creating a model instance or a serializer per row. The
+    categories are only read when `fields` includes them.
+    """
+    rows = list(rows)
+    if fields is None or 'category' in fields:
+        categories = category_pairs({row['id'] for row in rows})
+    else:
+        categories = {}
+
+    if fields is None:
+        return [
+            {
+                'id': row['id'],
+                # DATE_FORMAT is left to the ISO 8601 default
+                'date': row['date'].isoformat(),
+                'type': row['type'],
+                'amount': row['amount'],
+                'category': categories.get(row['id'], []),
+                'title': row['title'],
+            }
+            for row in rows
+        ]
+
+    def value(row, name):
+        if name == 'date':
+            return row['date'].isoformat()
+        if name == 'category':
+            return categories.get(row['id'], [])
+        return row[name]
+
+    # Keys in the order of the serializer fields
+    return [{name: value(row, name) for name in fields} for row in rows]
+
+
+def stream_accounting_list(envelope, rows, fields=None, chunk_size=STREAM_CHUNK_ROWS):
+    """Yield the JSON of an accounting list response in chunks
+
+    The output is the same bytes as rendering `{**envelope, 'data': [...]}`
+    at once, with the records narrowed to `fields` as by accounting_list_data.
+    `rows` is a values() queryset of `list_columns(fields)`, read in (-date, -id)
+    order one chunk at a time, each with its own query seeking past the last
+    row of the previous one, so only one chunk is held in memory whatever the
+    database driver buffers. Records written while the list is streamed may
+    or may not be included.
+    """
+    renderer = ORJSONRenderer()
+    # The envelope without the closing `]}` of its empty data list
+    yield renderer.render({**envelope, 'data': []})[:-2]
+
+    rows = rows.order_by('-date', '-id')
+    chunk = list(rows[:chunk_size])
+    separator = b''
+    while chunk:
+        # The items of the rendered list without its brackets
+        yield separator + renderer.render(accounting_list_data(chunk, fields))[1:-1]
+        separator = b','
+        if len(chunk) < chunk_size:
+            break
+        last = chunk[-1]
+        chunk = list(seek(rows, last['date'], last['id'])[:chunk_size])
+
+    yield b']}'
@@ -1,12 +1,26 @@
 """
 Serializers for accounting api
 """
+from django.db import transaction
+
 from rest_framework import serializers
 
+from core import summaries
 from core.models import Accounting, Category, MonthTarget, SaveMoneyTarget
+from core.versions import lock_data_versions
+
+
+class SparseFieldsMixin:
+    """Serializer limited to the field names of its optional `fields` argument"""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for category objects"""
 
     class Meta:
@@ -15,7 +29,7 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class AccountingSerializer(serializers.ModelSerializer):
+class AccountingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for accounting objects"""
     category = CategorySerializer(many=True, required=False)
 
@@ -30,16 +44,23 @@ class AccountingSerializer(serializers.ModelSerializer):
             cate_obj, _ = Category.objects.get_or_create(user = auth_user, **category)
             instance.category.add(cate_obj)
 
+    @transaction.atomic
+    @summaries.batch()
     def create(self, validated_data):
         """Create a new accounting"""
+        # Before the insert, see lock_data_versions
+        lock_data_versions([validated_data['user'].pk])
         categories = validated_data.pop('category', [])
         accounting = Accounting.objects.create(**validated_data)
         self._get_or_create_category(categories, accounting)
 
         return accounting
 
+    @transaction.atomic
+    @summaries.batch()
     def update(self, instance, validated_data):
         '''Update a accounting'''
+        lock_data_versions([instance.user_id])
         categories = validated_data.pop('category', None)
         if categories is not None:
             instance.category.clear()
@@ -2,15 +2,18 @@
 Test cases for the accounting API
 """
 from datetime import datetime, date , timedelta
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Accounting, Category
+from core.models import Accounting, Category, MonthTarget, SaveMoneyTarget
 
 from account.serializers import AccountingSerializer, AccountingDetailSerializer
 
@@ -68,7 +71,7 @@ class PrivateAccountingApiTests(TestCase):
 
         res = self.client.get(ACCOUNTING_URL)
 
-        accounting = Accounting.objects.all().order_by('-date')
+        accounting = Accounting.objects.all().order_by('-date', '-id')
         serializer = AccountingSerializer(accounting, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data['data'], serializer.data)
@@ -135,7 +138,7 @@ class PrivateAccountingApiTests(TestCase):
         accounting_within_range = Accounting.objects.filter(
             user=self.user,
             date__range=[params['from'], params['end']]
-        ).order_by('-date')
+        ).order_by('-date', '-id')
         serializer = AccountingSerializer(accounting_within_range, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -163,7 +166,7 @@ class PrivateAccountingApiTests(TestCase):
         current_month_accounting = Accounting.objects.filter(
             user=self.user,
             date__range=[first_day, last_day]
-        ).order_by('-date')
+        ).order_by('-date', '-id')
         serializer = AccountingSerializer(current_month_accounting, many=True)
 
 
@@ -353,3 +356,295 @@ class PrivateAccountingApiTests(TestCase):
         self.assertIn(s1.data, res.data['data'])
         self.assertIn(s2.data, res.data['data'])
         self.assertNotIn(s3.data, res.data['data'])
+
+
+class AccountingQueryBudgetTests(TestCase):
+    """Test the accounting API query count does not grow with the records returned"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'testaccount',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.categories = [
+            Category.objects.create(user=self.user, name=name)
+            for name in ('食', '衣', '住')
+        ]
+
+    def create_records(self, count):
+        """Create accountings in January 2021 with two categories each"""
+        for index in range(count):
+            accounting = create_accounting(self.user, date=date(2021, 1, index % 28 + 1))
+            accounting.category.add(*self.categories[index % 2:index % 2 + 2])
+
+    def test_list_query_budget(self):
+        """Test listing accountings runs a constant number of queries"""
+        params = {'from': '2021-01-01', 'end': '2021-01-31'}
+        self.create_records(2)
+        # The data version for the ETag, the accountings and their categories
+        with self.assertNumQueries(3):
+            res = self.client.get(ACCOUNTING_URL, params)
+        self.assertEqual(len(res.data['data']), 2)
+
+        self.create_records(30)
+        with self.assertNumQueries(3):
+            res = self.client.get(ACCOUNTING_URL, params)
+        self.assertEqual(len(res.data['data']), 32)
+        self.assertEqual(len(res.data['data'][0]['category']), 2)
+
+    def test_retrieve_query_budget(self):
+        """Test retrieving an accounting prefetches its categories"""
+        self.create_records(1)
+        accounting = Accounting.objects.get(user=self.user)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(detail_url(accounting.id))
+
+        self.assertEqual(len(res.data['category']), 2)
+
+
+class AccountingPaginationTests(TestCase):
+    """Test the opt-in cursor pagination of the accounting list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'testaccount',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.params = {'from': '2021-01-01', 'end': '2021-01-31'}
+        for index in range(7):
+            create_accounting(self.user, date=date(2021, 1, index // 2 + 1), amount=index)
+        self.expected = list(
+            Accounting.objects.filter(user=self.user).order_by('-date', '-id').values_list('id', flat=True)
+        )
+
+    def get_page(self, url=ACCOUNTING_URL, **params):
+        """Return a page of the accounting list"""
+        res = self.client.get(url, {**self.params, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_unpaginated_by_default(self):
+        """Test the list is not paginated without page_size or cursor"""
+        data = self.get_page()
+
+        self.assertNotIn('next', data)
+        self.assertEqual([item['id'] for item in data['data']], self.expected)
+
+    def test_walk_pages_forward_and_back(self):
+        """Test following next and prev links covers every record once"""
+        page = self.get_page(page_size=3)
+        self.assertIsNone(page['prev'])
+        self.assertEqual(page['from'], '2021-01-01')
+        pages = [page]
+        while page['next']:
+            page = self.client.get(page['next']).data
+            pages.append(page)
+
+        self.assertEqual(len(pages), 3)
+        ids = [item['id'] for page in pages for item in page['data']]
+        self.assertEqual(ids, self.expected)
+
+        previous = self.client.get(pages[-1]['prev']).data
+        self.assertEqual(previous['data'], pages[-2]['data'])
+        first = self.client.get(previous['prev']).data
+        self.assertEqual(first['data'], pages[0]['data'])
+        self.assertIsNone(first['prev'])
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor returns 404"""
+        res = self.client.get(ACCOUNTING_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AccountingETagTests(TestCase):
+    """Test conditional GET on the accounting, category and target reads"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('testaccount', 'password123')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(user=self.user, name='食')
+        create_accounting(self.user, date='2021-01-05')
+        self.params = {'from': '2021-01-01', 'end': '2021-01-31'}
+
+    def assertNotModified(self, url, params=None):
+        """Assert a repeated request with the returned ETag is answered with 304"""
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('no-cache', res['Cache-Control'])
+
+        # Only the data version is read, the view itself does not run
+        with self.assertNumQueries(1):
+            again = self.client.get(url, params, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again['ETag'], res['ETag'])
+        self.assertFalse(again.content)
+        return res['ETag']
+
+    def test_accounting_list_not_modified(self):
+        """Test polling the accounting list returns 304 until the data changes"""
+        etag = self.assertNotModified(ACCOUNTING_URL, self.params)
+
+        create_accounting(self.user, date='2021-01-06')
+        res = self.client.get(ACCOUNTING_URL, self.params, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['data']), 2)
+
+    def test_etag_depends_on_params_and_user(self):
+        """Test other parameters and other users do not share an ETag"""
+        etag = self.client.get(ACCOUNTING_URL, self.params)['ETag']
+
+        res = self.client.get(ACCOUNTING_URL, {**self.params, 'end': '2021-01-30'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        other_user = get_user_model().objects.create_user('testaccount2', 'password123')
+        self.client.force_authenticate(other_user)
+        res = self.client.get(ACCOUNTING_URL, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_category_list_not_modified(self):
+        """Test the category list is invalidated by a category change"""
+        etag = self.assertNotModified(reverse('accounting:category-list'))
+
+        self.category.name = '吃'
+        self.category.save()
+        res = self.client.get(reverse('accounting:category-list'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_target_retrieval_not_modified(self):
+        """Test the target retrieval views support conditional GET"""
+        MonthTarget.objects.create(user=self.user, year=2021, month=1, income=10, outcome=10)
+        SaveMoneyTarget.objects.create(
+            user=self.user, category=self.category, target=10,
+            from_date=date(2021, 1, 1), end_date=date(2021, 12, 31),
+        )
+
+        self.assertNotModified(reverse('accounting:month-target-by-year-month', args=[2021, 1]))
+        self.assertNotModified(reverse('accounting:save-money-target-by-category', args=[self.category.id]))
+        self.assertNotModified(reverse('accounting:month_target-list'))
+
+    def test_errors_have_no_etag(self):
+        """Test error responses are not tagged"""
+        res = self.client.get(reverse('accounting:month-target-by-year-month', args=[2021, 2]))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', res)
+
+
+class AccountingBulkCreateTests(TestCase):
+    """Test creating accounting records in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('testaccount', 'password123')
+        self.client.force_authenticate(self.user)
+        self.food = Category.objects.create(user=self.user, name='食')
+        self.url = reverse('accounting:accounting-bulk')
+
+    def record(self, **params):
+        """Return a bulk record payload"""
+        default = {'date': '2021-01-05', 'type': 'outcome', 'amount': 100, 'title': 'test title'}
+        default.update(params)
+        return default
+
+    def test_bulk_create(self):
+        """Test records and their categories are created together"""
+        payload = [
+            self.record(category=[{'name': '食'}, {'name': '衣'}]),
+            self.record(date='2021-01-06', category=[{'name': '衣'}]),
+            self.record(type='income', amount=500),
+        ]
+
+        res = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(Accounting.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(Category.objects.filter(user=self.user, name='衣').count(), 1)
+        first = Accounting.objects.get(id=res.data['data'][0]['id'])
+        self.assertEqual(sorted(first.category.values_list('name', flat=True)), ['衣', '食'])
+        self.assertEqual([item['name'] for item in res.data['data'][1]['category']], ['衣'])
+
+    def test_bulk_create_query_count(self):
+        """Test the number of queries does not grow with the records"""
+        def post(count, day):
+            payload = [
+                self.record(date=day, category=[{'name': '食'}, {'name': f'new{count}-{index}'}])
+                for index in range(count)
+            ]
+            with CaptureQueriesContext(connection) as captured:
+                res = self.client.post(self.url, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(captured.captured_queries)
+
+        self.assertEqual(post(5, '2021-01-05'), post(50, '2021-02-05'))
+        self.assertEqual(Accounting.category.through.objects.count(), 110)
+
+    def test_bulk_create_without_returned_keys(self):
+        """Test backends which cannot return bulk inserted keys (MySQL) also insert in bulk"""
+        def post(count, day):
+            payload = [
+                self.record(
+                    date=day, title=f'{count}-{index}', category=[{'name': '食'}, {'name': f'new{count}-{index}'}],
+                )
+                for index in range(count)
+            ]
+            with CaptureQueriesContext(connection) as captured:
+                res = self.client.post(self.url, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(captured.captured_queries)
+
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock,
+            return_value=False,
+        ):
+            self.assertEqual(post(5, '2021-01-05'), post(50, '2021-02-05'))
+
+        self.assertEqual(Accounting.category.through.objects.count(), 110)
+        for accounting in Accounting.objects.filter(user=self.user).prefetch_related('category'):
+            self.assertEqual(
+                sorted(category.name for category in accounting.category.all()),
+                sorted(['食', f'new{accounting.title}']),
+            )
+
+    def test_bulk_create_updates_summaries(self):
+        """Test the summaries include the bulk created records"""
+        payload = [self.record(category=[{'name': '食'}]), self.record(amount=50)]
+
+        self.client.post(self.url, payload, format='json')
+        res = self.client.get(reverse('charts:type_cost'), {'from': '2021-01-01', 'end': '2021-01-31'})
+
+        self.assertEqual(res.data['data'][0]['name'], '食')
+        self.assertEqual(
+            self.client.get(reverse('charts:target', args=[2021, 1])).data['outcome'][0], 150
+        )
+
+    def test_bulk_create_reports_item_errors(self):
+        """Test invalid records are reported by index and nothing is created"""
+        payload = [self.record(), self.record(type='other'), self.record(amount='x', date='bad')]
+
+        res = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([item['index'] for item in res.data['errors']], [1, 2])
+        self.assertIn('type', res.data['errors'][0]['errors'])
+        self.assertEqual(set(res.data['errors'][1]['errors']), {'amount', 'date'})
+        self.assertFalse(Accounting.objects.exists())
+
+    def test_bulk_create_rejects_invalid_payloads(self):
+        """Test empty, non-list and oversized payloads are rejected"""
+        for payload in ([], {'title': 'x'}, [self.record()] * 1001):
+            res = self.client.post(self.url, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertFalse(Accounting.objects.exists())
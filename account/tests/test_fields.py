@@ -0,0 +1,127 @@
+"""
+Test sparse field selection on the accounting and category APIs
+"""
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Accounting, Category
+
+from account.serializers import AccountingSerializer
+
+
+ACCOUNTING_URL = reverse('accounting:accounting-list')
+CATEGORY_URL = reverse('accounting:category-list')
+
+
+def detail_url(accounting_id):
+    """Return accounting detail URL"""
+    return reverse('accounting:accounting-detail', args=[accounting_id])
+
+
+class SparseFieldsApiTests(TestCase):
+    """Test the ?fields= parameter"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('testaccount', 'password123')
+        self.client.force_authenticate(self.user)
+        self.params = {'from': '2021-01-01', 'end': '2021-01-31'}
+
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.bus = Category.objects.create(user=self.user, name='Bus')
+        for day in range(1, 6):
+            accounting = Accounting.objects.create(
+                user=self.user, date=date(2021, 1, day), type='outcome', amount=day * 100,
+                title=f'title {day}', description='long description',
+            )
+            accounting.category.add(self.food if day % 2 else self.bus)
+
+    def test_list_fields(self):
+        """Test the list only returns and reads the requested fields"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(ACCOUNTING_URL, {**self.params, 'fields': 'amount,type,date'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # In the order of the serializer fields
+        self.assertEqual(list(res.data['data'][0]), ['date', 'type', 'amount'])
+        self.assertEqual(res.data['data'][0], {'date': '2021-01-05', 'type': 'outcome', 'amount': 500})
+        # The data version and the accountings, no categories
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('title', queries[-1]['sql'])
+
+    def test_list_fields_parity(self):
+        """Test the list fields are represented as the serializer does"""
+        accountings = Accounting.objects.order_by('-date', '-id')
+        for fields in ('id', 'category', 'title,category', 'id,date,type,amount,category,title'):
+            res = self.client.get(ACCOUNTING_URL, {**self.params, 'fields': fields})
+            expected = AccountingSerializer(accountings, many=True, fields=fields.split(',')).data
+
+            self.assertEqual(res.data['data'], expected)
+
+    def test_streamed_list_fields(self):
+        """Test a streamed list only returns the requested fields"""
+        params = {**self.params, 'fields': 'amount'}
+        res = self.client.get(ACCOUNTING_URL, params)
+        streamed = self.client.get(ACCOUNTING_URL, {**params, 'stream': '1'})
+
+        self.assertEqual(b''.join(streamed.streaming_content), res.content)
+
+    def test_paginated_list_fields(self):
+        """Test the cursor links work without the date and id fields"""
+        params = {**self.params, 'fields': 'amount', 'page_size': 2}
+        page = self.client.get(ACCOUNTING_URL, params).data
+        amounts = [item['amount'] for item in page['data']]
+        while page['next']:
+            page = self.client.get(page['next']).data
+            amounts += [item['amount'] for item in page['data']]
+
+        self.assertEqual(amounts, [500, 400, 300, 200, 100])
+
+    def test_detail_fields(self):
+        """Test the detail only returns the requested fields without reading the categories"""
+        accounting = Accounting.objects.get(date=date(2021, 1, 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(detail_url(accounting.id), {'fields': 'description,id'})
+
+        self.assertEqual(res.data, {'id': accounting.id, 'description': 'long description'})
+        self.assertFalse(any('core_accounting_category' in query['sql'] for query in queries))
+
+        res = self.client.get(detail_url(accounting.id), {'fields': 'category'})
+        self.assertEqual(res.data, {'category': [{'id': self.food.id, 'name': 'Food'}]})
+
+    def test_invalid_fields(self):
+        """Test unknown and empty field lists are rejected"""
+        res = self.client.get(ACCOUNTING_URL, {'fields': 'amount,secret'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+        # Only the list serializer fields are selectable on the list
+        res = self.client.get(ACCOUNTING_URL, {'fields': 'description'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(CATEGORY_URL, {'fields': ','})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_ignore_fields(self):
+        """Test created records are returned with every field"""
+        payload = {'date': '2021-02-01', 'type': 'income', 'amount': 10, 'title': 'salary'}
+        res = self.client.post(f'{ACCOUNTING_URL}?fields=amount', payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn('description', res.data)
+
+    def test_category_fields(self):
+        """Test the category list only returns the requested fields"""
+        res = self.client.get(CATEGORY_URL, {'fields': 'name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'name': 'Food'}, {'name': 'Bus'}])
@@ -0,0 +1,153 @@
+"""
+Test the read path of the accounting list
+"""
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Accounting, Category
+
+from account.reads import ACCOUNTING_LIST_FIELDS, accounting_list_data, stream_accounting_list
+from account.serializers import AccountingSerializer
+
+
+ACCOUNTING_URL = reverse('accounting:accounting-list')
+
+
+class AccountingListDataTests(TestCase):
+    """Test accounting_list_data matches AccountingSerializer"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('testaccount', 'password123')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.tea = Category.objects.create(user=self.user, name='茶飲')
+        self.bus = Category.objects.create(user=self.user, name='Bus')
+
+        records = [
+            ('income', 1000, '', []),
+            ('outcome', 85, '珍珠奶茶   line', [self.tea, self.food]),
+            ('outcome', 0, 'bus', [self.bus]),
+            ('outcome', 2**31 - 1, 'Quote " and \\ slash', [self.bus, self.food, self.tea]),
+        ]
+        for index, (type, amount, title, categories) in enumerate(records):
+            accounting = Accounting.objects.create(
+                user=self.user, date=date(2021, 1, index + 1), type=type, amount=amount, title=title,
+            )
+            accounting.category.add(*categories)
+
+    def assert_same_representation(self, queryset):
+        expected = AccountingSerializer(queryset, many=True).data
+        data = accounting_list_data(queryset.values(*ACCOUNTING_LIST_FIELDS))
+
+        self.assertEqual(data, expected)
+        # Same keys in the same order, so the same bytes
+        self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(expected))
+
+    def test_parity_with_serializer(self):
+        """Test every record is represented as the serializer does"""
+        self.assert_same_representation(Accounting.objects.order_by('-date', '-id'))
+
+    def test_parity_with_duplicated_rows(self):
+        """Test rows repeated by a category filter are represented as the serializer does"""
+        queryset = Accounting.objects.filter(category__in=[self.food, self.tea]).order_by('-date', '-id')
+
+        self.assertEqual(queryset.count(), 4)
+        self.assert_same_representation(queryset)
+
+    def test_empty_rows(self):
+        """Test no rows runs no query"""
+        with self.assertNumQueries(0):
+            self.assertEqual(accounting_list_data([]), [])
+
+    def test_list_endpoint_parity(self):
+        """Test every page of the list endpoint matches the serializer"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.get(ACCOUNTING_URL, {'from': '2021-01-01', 'end': '2021-01-31', 'page_size': 3})
+        data = res.data['data']
+        data += client.get(res.data['next']).data['data']
+
+        expected = AccountingSerializer(Accounting.objects.order_by('-date', '-id'), many=True).data
+        self.assertEqual(data, expected)
+
+
+class StreamAccountingListTests(TestCase):
+    """Test the streamed accounting list"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('testaccount', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.params = {'from': '2021-01-01', 'end': '2021-01-31'}
+
+        category = Category.objects.create(user=self.user, name='早餐')
+        # Two records a day, so chunks also end between records of the same date
+        for index in range(8):
+            day = index // 2 + 1
+            accounting = Accounting.objects.create(
+                user=self.user, date=date(2021, 1, day), type='outcome', amount=index * 10, title=f'title {index}',
+            )
+            if day % 2:
+                accounting.category.add(category)
+
+    def test_chunks_render_like_whole_list(self):
+        """Test the joined chunks are the bytes of the rendered list"""
+        envelope = {'from': '2021-01-01', 'end': '2021-01-31'}
+        queryset = Accounting.objects.order_by('-date', '-id').values(*ACCOUNTING_LIST_FIELDS)
+        expected = JSONRenderer().render({**envelope, 'data': accounting_list_data(queryset)})
+
+        for chunk_size in (1, 2, 3, 8, 100):
+            chunks = list(stream_accounting_list(envelope, queryset, chunk_size=chunk_size))
+            self.assertEqual(b''.join(chunks), expected)
+
+        empty = queryset.none()
+        self.assertEqual(
+            b''.join(stream_accounting_list(envelope, empty)),
+            JSONRenderer().render({**envelope, 'data': []}),
+        )
+
+    def test_chunks_are_bounded_queries(self):
+        """Test every chunk is read with its own limited query"""
+        queryset = Accounting.objects.values(*ACCOUNTING_LIST_FIELDS)
+
+        with CaptureQueriesContext(connection) as queries:
+            list(stream_accounting_list({}, queryset, chunk_size=3))
+
+        rows = [query['sql'] for query in queries if 'core_accounting_category' not in query['sql']]
+        # 3 + 3 + 2 rows, the short last chunk ends the list
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all('LIMIT 3' in sql for sql in rows))
+
+    def test_stream_matches_list(self):
+        """Test the streamed response has the body of the plain response"""
+        res = self.client.get(ACCOUNTING_URL, self.params)
+        streamed = self.client.get(ACCOUNTING_URL, {**self.params, 'stream': '1'})
+
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(streamed['Content-Type'], 'application/json')
+        self.assertEqual(b''.join(streamed.streaming_content), res.content)
+
+    def test_stream_not_modified(self):
+        """Test a streamed list is answered with 304 while the data is unchanged"""
+        res = self.client.get(ACCOUNTING_URL, {**self.params, 'stream': '1'})
+        b''.join(res.streaming_content)
+
+        res = self.client.get(ACCOUNTING_URL, {**self.params, 'stream': '1'}, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_paginated_request_is_not_streamed(self):
+        """Test a page is returned as usual when pagination is requested"""
+        res = self.client.get(ACCOUNTING_URL, {**self.params, 'stream': '1', 'page_size': 3})
+
+        self.assertFalse(res.streaming)
+        self.assertEqual(len(res.data['data']), 3)
+        self.assertIsNotNone(res.data['next'])
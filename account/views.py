@@ -6,27 +6,42 @@ from drf_yasg import openapi
 
 from datetime import datetime , timedelta
 
+from django.http import StreamingHttpResponse
 from django.utils.timezone import make_aware
 
 from rest_framework import viewsets, mixins , status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
 
+from core.authentication import CachedTokenAuthentication
+from core.conditional import conditional_on_data_version
 from core.models import Accounting, Category , MonthTarget , SaveMoneyTarget
 from account import serializers
+from account.bulk import BULK_MAX_RECORDS, bulk_create_accountings
+from account.fields import SparseFieldsViewMixin
+from account.reads import accounting_list_data, list_columns, stream_accounting_list
+from account.pagination import AccountingCursorPagination
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 
-class AccountingViewSet(viewsets.ModelViewSet):
+def default_range_day(request):
+    """Return today when the accounting list falls back to the current month"""
+    if request.query_params.get('from') and request.query_params.get('end'):
+        return None
+
+    return datetime.now().date()
+
+
+class AccountingViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """View for managing accounting APIs"""
     serializer_class = serializers.AccountingDetailSerializer
     queryset = Accounting.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = AccountingCursorPagination
 
     def _params_to_ints(self, qs):
         """Convert a list of string IDs to a list of integers"""
@@ -41,7 +56,14 @@ class AccountingViewSet(viewsets.ModelViewSet):
                 category_ids = self._params_to_ints(categories)
                 queryset = queryset.filter(category__id__in=category_ids)
 
-            return queryset.filter(user=self.request.user).order_by('-date')
+            queryset = queryset.filter(user=self.request.user).order_by('-date', '-id')
+
+            fields = self.get_requested_fields()
+            if fields is None:
+                return queryset.prefetch_related('category')
+            if 'category' in fields:
+                queryset = queryset.prefetch_related('category')
+            return queryset.only('id', *(name for name in fields if name != 'category'))
         else:
             return queryset.none()
 
@@ -60,7 +82,12 @@ class AccountingViewSet(viewsets.ModelViewSet):
         operation_description="Get accounting records within a date range \
                                (default: current month) ex: /api/accounting/?from=2021-01-01&end=2021-01-31\n \
                                Get accounting records within comma separated list of categoryIDs \
-                               (default: all categories) ex: /api/accounting/?category=2,3",
+                               (default: all categories) ex: /api/accounting/?category=2,3\n \
+                               Paginate by (date, id) descending with page_size and the returned next/prev links \
+                               (default: not paginated) ex: /api/accounting/?page_size=50\n \
+                               Stream a long unpaginated range while it is read \
+                               ex: /api/accounting/?from=2015-01-01&end=2021-12-31&stream=1\n \
+                               Return only some fields ex: /api/accounting/?fields=date,amount,type",
         manual_parameters=[
             openapi.Parameter(
                 name='from',
@@ -83,8 +110,37 @@ class AccountingViewSet(viewsets.ModelViewSet):
                 description='Category ID',
                 required=False,
             ),
+            openapi.Parameter(
+                name='page_size',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description='Records per page, enables pagination',
+                required=False,
+            ),
+            openapi.Parameter(
+                name='cursor',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description='Page cursor taken from a next/prev link',
+                required=False,
+            ),
+            openapi.Parameter(
+                name='stream',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description='1 to stream the records of an unpaginated response',
+                required=False,
+            ),
+            openapi.Parameter(
+                name='fields',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description='Comma separated list of the fields to return (default: every field)',
+                required=False,
+            ),
         ],
     )
+    @conditional_on_data_version(extra=default_range_day)
     def list(self, request, *args, **kwargs):
         """Handle GET requests for accounting records within a date range"""
         from_date = request.query_params.get('from')
@@ -96,7 +152,7 @@ class AccountingViewSet(viewsets.ModelViewSet):
             from_date = make_aware(datetime.strptime(from_date, '%Y-%m-%d'))
             end_date = make_aware(datetime.strptime(end_date, '%Y-%m-%d'))
 
-            queryset = queryset.filter(date__range=[from_date, end_date]).order_by('-date')
+            queryset = queryset.filter(date__range=[from_date, end_date]).order_by('-date', '-id')
         else:
             now = datetime.now()
             first_day = now.replace(day=1)
@@ -112,16 +168,67 @@ class AccountingViewSet(viewsets.ModelViewSet):
 
             queryset = self.get_queryset().filter(date__range=[first_day, last_day])
 
-        serializer = self.get_serializer(queryset, many=True)
+        # Plain rows instead of model instances, see account.reads
+        fields = self.get_requested_fields()
+        queryset = queryset.prefetch_related(None).values(*list_columns(fields))
+        page = self.paginate_queryset(queryset)
         response_data={
             'from': from_date.strftime('%Y-%m-%d'),
             'end': end_date.strftime('%Y-%m-%d'),
-            'data': serializer.data
         }
+        if page is None and request.query_params.get('stream') in ('1', 'true'):
+            # Rows are read and encoded while the body is sent
+            return StreamingHttpResponse(
+                stream_accounting_list(response_data, queryset, fields),
+                content_type='application/json',
+            )
+
+        data = accounting_list_data(queryset if page is None else page, fields)
+        if page is not None:
+            response_data['next'] = self.paginator.get_next_link()
+            response_data['prev'] = self.paginator.get_previous_link()
+        response_data['data'] = data
         return Response(response_data)
 
+    @swagger_auto_schema(
+        operation_description=f"Create up to {BULK_MAX_RECORDS} accounting records at once, \
+                               either every record is created or none is \
+                               and the errors of each invalid record are returned with its index",
+        request_body=serializers.AccountingSerializer(many=True),
+        responses={
+            201: serializers.AccountingSerializer(many=True),
+            400: "invalid records",
+        },
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Create a list of accounting records"""
+        if isinstance(request.data, list) and len(request.data) > BULK_MAX_RECORDS:
+            return Response(
+                {"error": f"At most {BULK_MAX_RECORDS} records can be created at once"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = serializers.AccountingSerializer(
+            data=request.data, many=True, allow_empty=False, context=self.get_serializer_context()
+        )
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if isinstance(errors, list):
+                errors = [
+                    {"index": index, "errors": item_errors}
+                    for index, item_errors in enumerate(errors) if item_errors
+                ]
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
 
-class CategoryViewSet(mixins.CreateModelMixin,
+        accountings = bulk_create_accountings(request.user, serializer.validated_data)
+        data = serializers.AccountingSerializer(accountings, many=True).data
+
+        return Response({"count": len(accountings), "data": data}, status=status.HTTP_201_CREATED)
+
+
+class CategoryViewSet(SparseFieldsViewMixin,
+                      mixins.CreateModelMixin,
                       mixins.DestroyModelMixin,
                       mixins.UpdateModelMixin,
                       mixins.ListModelMixin,
@@ -129,14 +236,15 @@ class CategoryViewSet(mixins.CreateModelMixin,
     """View for managing category APIs"""
     serializer_class = serializers.CategorySerializer
     queryset = Category.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     @swagger_auto_schema(
         operation_description="Get categories assigned to accounting \
                                (default: all categories) ex: /api/category/?assigned_only=1\n \
                                Get categories not assigned to accounting \
-                               (default: all categories) ex: /api/category/?assigned_only=2",
+                               (default: all categories) ex: /api/category/?assigned_only=2\n \
+                               Return only some fields ex: /api/category/?fields=name",
         manual_parameters=[
             openapi.Parameter(
                 name='assigned_only',
@@ -145,8 +253,16 @@ class CategoryViewSet(mixins.CreateModelMixin,
                 description='1: assigned to accounting, 2: not assigned to accounting',
                 required=False,
             ),
+            openapi.Parameter(
+                name='fields',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description='Comma separated list of the fields to return (default: every field)',
+                required=False,
+            ),
         ],
     )
+    @conditional_on_data_version()
     def list(self, request, *args, **kwargs):
         """List categories"""
         return super(CategoryViewSet, self).list(request, *args, **kwargs)
@@ -160,7 +276,12 @@ class CategoryViewSet(mixins.CreateModelMixin,
         elif assigned_only == 2:
             queryset = queryset.filter(accounting__isnull=True)
 
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+        queryset = queryset.filter(user=self.request.user).order_by('-name').distinct()
+
+        fields = self.get_requested_fields()
+        if fields is not None:
+            queryset = queryset.only('id', *fields)
+        return queryset
 
     def perform_create(self, serializer):
         """Create a new category"""
@@ -180,13 +301,21 @@ class CategoryViewSet(mixins.CreateModelMixin,
 class MonthTargetViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.MonthTargetSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     queryset = MonthTarget.objects.all()
 
     def get_queryset(self):
         queryset = self.queryset
         return queryset.filter(user=self.request.user).order_by('-year', '-month')
 
+    @conditional_on_data_version()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_on_data_version()
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         user = self.request.user
         year = serializer.validated_data.get('year')
@@ -203,6 +332,7 @@ class MonthTargetViewSet(viewsets.ModelViewSet):
             month_target.save()
 
 @api_view(['GET'])
+@conditional_on_data_version()
 def retrieve_month_target_by_year_month(request, year, month):
     """Retrieve a specific month target by year and month"""
     try:
@@ -219,12 +349,20 @@ def retrieve_month_target_by_year_month(request, year, month):
 class SaveMoneyTargetViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.SaveMoneyTargetSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
 
     def get_queryset(self):
         """Retrieve the save money targets for the authenticated user"""
         return SaveMoneyTarget.objects.filter(user=self.request.user)
 
+    @conditional_on_data_version()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_on_data_version()
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Create a new save money target or update existing one"""
         user = self.request.user
@@ -242,6 +380,7 @@ class SaveMoneyTargetViewSet(viewsets.ModelViewSet):
             serializer.save(user=user)
 
 @api_view(['GET'])
+@conditional_on_data_version()
 def retrieve_save_money_target_by_category(request, category_id):
     """Retrieve a specific save money target by category ID"""
     try:
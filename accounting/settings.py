@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import tempfile
 import environ
 from pathlib import Path
 
@@ -54,11 +55,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.RequestMetricsMiddleware',
+    'core.compression.ResponseCompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.RequestProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -155,11 +159,20 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SWAGGER_SETTINGS = {
@@ -173,4 +186,65 @@ SWAGGER_SETTINGS = {
 }
 
 AWS_STORAGE_BUCKET_NAME = 'accounting-reports-wiry'
-AWS_S3_REGION_NAME = 'us-east-1'
\ No newline at end of file
+AWS_S3_REGION_NAME = 'us-east-1'
+
+# Report storage: reports.storage.S3ReportStorage, or reports.storage.LocalReportStorage
+# to keep reports under REPORT_STORAGE_ROOT and serve them through signed urls
+REPORT_STORAGE_BACKEND = env('REPORT_STORAGE_BACKEND', default='reports.storage.S3ReportStorage')
+REPORT_STORAGE_ROOT = env('REPORT_STORAGE_ROOT', default=str(BASE_DIR / 'report_files'))
+REPORT_S3_MAX_POOL_CONNECTIONS = env.int('REPORT_S3_MAX_POOL_CONNECTIONS', default=10)
+
+# A report job still running REPORT_JOB_TIMEOUT seconds after it was claimed is taken as
+# abandoned by a stopped worker and queued again, up to REPORT_JOB_MAX_ATTEMPTS claims
+REPORT_JOB_TIMEOUT = env.int('REPORT_JOB_TIMEOUT', default=15 * 60)
+REPORT_JOB_MAX_ATTEMPTS = env.int('REPORT_JOB_MAX_ATTEMPTS', default=3)
+
+# Cached token authentication: 'local' keeps tokens in a per-process LRU, 'django' uses
+# the CACHE_ALIAS cache shared by every process; TIMEOUT bounds how long another process
+# may still accept a revoked token with the local backend
+TOKEN_AUTH_CACHE = {
+    'BACKEND': env('TOKEN_AUTH_CACHE_BACKEND', default='local'),
+    'TIMEOUT': env.int('TOKEN_AUTH_CACHE_TIMEOUT', default=60),
+    'MAX_SIZE': 10000,
+    'CACHE_ALIAS': 'default',
+}
+
+# Chart response cache, entries are keyed by the user's data version so writes never
+# need to delete them
+CHART_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': env.int('CHART_CACHE_TIMEOUT', default=60 * 60),
+}
+
+# Request metrics served to staff at /api/dev/metrics; every worker process writes its
+# counters to DIRECTORY at most every FLUSH_INTERVAL seconds so the endpoint covers all
+# uwsgi workers, files of processes silent for RETENTION seconds are removed
+METRICS = {
+    'ENABLED': env.bool('METRICS_ENABLED', default=True),
+    'DIRECTORY': env('METRICS_DIRECTORY', default=os.path.join(tempfile.gettempdir(), 'accounting-metrics')),
+    'FLUSH_INTERVAL': env.int('METRICS_FLUSH_INTERVAL', default=5),
+    'RETENTION': 24 * 60 * 60,
+}
+
+# Request profiling: staff profile a request with the X-Profile: 1 header, other users while
+# their profile_requests_until is set (POST /api/dev/profiling/users/<id>). Statements slower
+# than EXPLAIN_THRESHOLD_MS get their plan stored, and statements of any request slower than
+# SLOW_QUERY_MS are logged as warnings by the core.slow_queries logger
+PROFILING = {
+    'HEADER': 'HTTP_X_PROFILE',
+    'EXPLAIN_THRESHOLD_MS': env.int('PROFILING_EXPLAIN_THRESHOLD_MS', default=10),
+    'SLOW_QUERY_MS': env.int('SLOW_QUERY_MS', default=200),
+    'MAX_QUERIES': 1000,
+    'STATS_LIMIT': 60,
+}
+
+# Response compression: JSON, CSV and plain text bodies of at least MIN_SIZE bytes are sent
+# with brotli or gzip as accepted by the client, nginx leaves the encoded responses as they are
+COMPRESSION = {
+    'ENABLED': env.bool('COMPRESSION_ENABLED', default=True),
+    'MIN_SIZE': env.int('COMPRESSION_MIN_SIZE', default=1024),
+    'GZIP_LEVEL': env.int('COMPRESSION_GZIP_LEVEL', default=6),
+    'BROTLI_QUALITY': env.int('COMPRESSION_BROTLI_QUALITY', default=5),
+    'STREAMING': True,
+    'CONTENT_TYPES': ('application/json', 'text/csv', 'text/plain'),
+}
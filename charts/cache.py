@@ -0,0 +1,94 @@
+"""
+Response cache for the chart views, keyed by the user's data version
+"""
+import threading
+
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.conditional import request_fingerprint
+from core.versions import request_data_version
+
+
+DEFAULT_CHART_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 60 * 60,
+}
+
+CACHE_KEY_PREFIX = 'charts:'
+CACHE_STATUS_HEADER = 'X-Cache'
+
+
+class CacheStats:
+    """Per-process hit and miss counters of the chart cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = {}
+
+    def record(self, view_name, outcome):
+        with self._lock:
+            counts = self._counts.setdefault(view_name, {'hits': 0, 'misses': 0})
+            counts[outcome] += 1
+
+    def snapshot(self):
+        """Return the counters per view and their totals"""
+        with self._lock:
+            views = {name: dict(counts) for name, counts in self._counts.items()}
+
+        return {
+            'hits': sum(counts['hits'] for counts in views.values()),
+            'misses': sum(counts['misses'] for counts in views.values()),
+            'views': views,
+        }
+
+
+cache_stats = CacheStats()
+
+
+def get_chart_cache_config():
+    return {**DEFAULT_CHART_CACHE, **getattr(settings, 'CHART_CACHE', {})}
+
+
+def chart_cache_key(view_name, user_id, version, fingerprint):
+    return f'{CACHE_KEY_PREFIX}{view_name}:{user_id}:{version}:{fingerprint}'
+
+
+def cached_chart_response(get):
+    """Serve a chart view GET from the cache until the user's data changes
+
+    Only successful responses are cached. Writes bump the user's data
+    version, so older entries are never read again and simply expire.
+    """
+    @wraps(get)
+    def wrapper(self, request, *args, **kwargs):
+        config = get_chart_cache_config()
+        cache = caches[config['CACHE_ALIAS']]
+        view_name = type(self).__name__
+        key = chart_cache_key(
+            view_name, request.user.pk, request_data_version(request), request_fingerprint(request, kwargs)
+        )
+
+        data = cache.get(key)
+        if data is not None:
+            cache_stats.record(view_name, 'hits')
+            return Response(data, headers={CACHE_STATUS_HEADER: 'HIT'})
+
+        cache_stats.record(view_name, 'misses')
+        response = get(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, config['TIMEOUT'])
+        response[CACHE_STATUS_HEADER] = 'MISS'
+
+        return response
+
+    return wrapper
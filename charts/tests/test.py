@@ -1,6 +1,7 @@
 """
 Test file for charts app
 """
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
@@ -35,6 +36,7 @@ class PrivateChartsApiTests(TestCase):
     """
     def setUp(self):
         """Create client and user"""
+        cache.clear()
         self.user = create_user(
             account='apiccount',
             password='testpass123',
@@ -257,3 +259,22 @@ class PrivateChartsApiTests(TestCase):
         self.assertEqual(res.data['data'][0]['name'], '住')
         self.assertEqual(res.data['data'][0]['percent'], '57%')
         self.assertEqual(res.data['data'][0]['data'], [57, 43])
+
+    def test_retrieve_type_cost_whole_months(self):
+        """Test retrieving type cost for a month aligned range"""
+        food = Category.objects.create(user=self.user, name='食')
+        rent = Category.objects.create(user=self.user, name='住')
+        accounting = Accounting.objects.create(user=self.user, date='2024-01-31', type='outcome', amount=25000)
+        accounting.category.add(food)
+        accounting = Accounting.objects.create(user=self.user, date='2024-02-01', type='outcome', amount=75000)
+        accounting.category.add(rent)
+        accounting = Accounting.objects.create(user=self.user, date='2024-03-01', type='outcome', amount=99999)
+        accounting.category.add(rent)
+
+        res = self.client.get(reverse('charts:type_cost'), {'from': '2024-01-01', 'end': '2024-02-29'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['data'], [
+            {'name': '住', 'percent': '75%', 'data': [75, 25]},
+            {'name': '食', 'percent': '25%', 'data': [25, 75]},
+        ])
@@ -0,0 +1,156 @@
+"""
+Test the chart response cache
+"""
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from charts.cache import cache_stats
+from core.authentication import reset_token_cache
+from core.models import Accounting, Category, MonthTarget, SaveMoneyTarget
+from core.versions import get_data_version
+
+
+RANGE_COST_URL = reverse('charts:range_cost')
+ACCOUNTING_URL = reverse('accounting:accounting-list')
+ME_URL = reverse('auth:me')
+RANGE = {'from': '2024-03-01', 'end': '2024-03-31'}
+
+
+def create_user(account='testaccount', **params):
+    """Helper function to create a user"""
+    return get_user_model().objects.create_user(account, 'testpass123', **params)
+
+
+class ChartCacheTests(TestCase):
+    """Test chart responses are cached until the user's data changes"""
+
+    def setUp(self):
+        cache.clear()
+        cache_stats.reset()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(user=self.user, name='食')
+        Accounting.objects.create(user=self.user, date=date(2024, 3, 1), type='income', amount=100)
+
+    def test_repeated_request_served_from_cache(self):
+        """Test a repeated request only reads the data version"""
+        first = self.client.get(RANGE_COST_URL, RANGE)
+
+        with self.assertNumQueries(1):
+            second = self.client.get(RANGE_COST_URL, RANGE)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+    def test_write_invalidates_cache(self):
+        """Test writing accounting data bumps the version and refreshes the chart"""
+        self.client.get(RANGE_COST_URL, RANGE)
+        version = get_data_version(self.user)
+
+        Accounting.objects.create(user=self.user, date=date(2024, 3, 1), type='income', amount=50)
+        res = self.client.get(RANGE_COST_URL, RANGE)
+
+        self.assertGreater(get_data_version(self.user), version)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['income'][0], 150)
+
+    def test_profile_update_between_writes(self):
+        """Test updating the user profile does not move the data version back"""
+        reset_token_cache()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        record = {'date': '2024-03-01', 'type': 'income', 'amount': 50, 'title': 'bonus', 'category': []}
+        # Caches the token with the current data version
+        client.get(RANGE_COST_URL, RANGE)
+
+        versions = [get_data_version(self.user)]
+        client.post(ACCOUNTING_URL, record, format='json')
+        versions.append(get_data_version(self.user))
+        self.assertEqual(client.patch(ME_URL, {'name': 'NewName'}).status_code, status.HTTP_200_OK)
+        versions.append(get_data_version(self.user))
+        client.post(ACCOUNTING_URL, record, format='json')
+        versions.append(get_data_version(self.user))
+
+        self.assertEqual(versions, sorted(versions))
+        self.assertGreater(versions[-1], versions[1])
+        res = client.get(RANGE_COST_URL, RANGE)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['income'][0], 200)
+
+    def test_every_user_model_bumps_version(self):
+        """Test accounting, category and target writes all bump the version"""
+        accounting = Accounting.objects.get(user=self.user)
+        writes = [
+            lambda: accounting.category.add(self.category),
+            lambda: Category.objects.create(user=self.user, name='住'),
+            lambda: MonthTarget.objects.create(user=self.user, year=2024, month=3, income=1, outcome=1),
+            lambda: SaveMoneyTarget.objects.create(
+                user=self.user, category=self.category, target=10,
+                from_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+            ),
+            lambda: MonthTarget.objects.filter(user=self.user).delete(),
+            lambda: accounting.delete(),
+        ]
+
+        for write in writes:
+            version = get_data_version(self.user)
+            write()
+            self.assertGreater(get_data_version(self.user), version)
+
+    def test_cache_keyed_by_params_and_user(self):
+        """Test different parameters and users get their own entries"""
+        other_user = create_user(account='testaccount2')
+        self.client.get(RANGE_COST_URL, RANGE)
+
+        res = self.client.get(RANGE_COST_URL, {'from': '2024-03-01', 'end': '2024-03-30'})
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        self.client.force_authenticate(other_user)
+        res = self.client.get(RANGE_COST_URL, RANGE)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['income'][0], 0)
+
+    def test_errors_not_cached(self):
+        """Test error responses are computed every time"""
+        self.client.get(RANGE_COST_URL, {'from': 'bad'})
+        res = self.client.get(RANGE_COST_URL, {'from': 'bad'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_cache_stats_staff_only(self):
+        """Test the hit and miss counters are only shown to staff"""
+        self.client.get(RANGE_COST_URL, RANGE)
+        self.client.get(RANGE_COST_URL, RANGE)
+
+        res = self.client.get(reverse('charts:cache_stats'))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(create_user(account='staff', is_staff=True))
+        res = self.client.get(reverse('charts:cache_stats'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((res.data['hits'], res.data['misses']), (1, 1))
+        self.assertEqual(res.data['views']['ChartsAPIView'], {'hits': 1, 'misses': 1})
+
+    def test_chart_not_modified(self):
+        """Test a chart is answered with 304 while the data is unchanged"""
+        res = self.client.get(RANGE_COST_URL, RANGE)
+
+        with self.assertNumQueries(1):
+            again = self.client.get(RANGE_COST_URL, RANGE, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Accounting.objects.create(user=self.user, date=date(2024, 3, 2), type='income', amount=1)
+        again = self.client.get(RANGE_COST_URL, RANGE, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
@@ -13,4 +13,5 @@ urlpatterns = [
     path('type_cost', views.TypeCostAPIView.as_view(), name='type_cost'),
     path('compare_cost', views.CompareAPIView.as_view(), name='compare_cost'),
     path('save_target/<int:category_id>', views.SaveMoneyAPIView.as_view(), name='save_target'),
+    path('cache_stats', views.ChartCacheStatsAPIView.as_view(), name='cache_stats'),
 ]
@@ -1,14 +1,17 @@
-from django.db.models import Sum, Case, When, IntegerField, Prefetch
-from django.db.models.functions import TruncDay
+from django.db.models import Sum
 from django.utils.timezone import make_aware
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
-from core.models import Accounting, MonthTarget, SaveMoneyTarget , Category
+from core.authentication import CachedTokenAuthentication
+from core.models import Accounting, DailySummary, MonthTarget, SaveMoneyTarget , Category
+from core import summaries
+from core.conditional import conditional_on_data_version
+
+from charts.cache import cache_stats, cached_chart_response
 
 from datetime import datetime, timedelta
 
@@ -20,13 +23,13 @@ class ChartsAPIView(APIView):
     """
     API View for generating accounting charts.
     """
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
-    queryset = Accounting.objects.all()
+    queryset = DailySummary.objects.all()
 
     def get_queryset(self):
-        """Retrieve the accounting for the authenticated user"""
-        return Accounting.objects.filter(user=self.request.user)
+        """Retrieve the daily summaries for the authenticated user"""
+        return DailySummary.objects.filter(user=self.request.user)
 
     @swagger_auto_schema(
         description="Generate accounting charts",
@@ -47,6 +50,8 @@ class ChartsAPIView(APIView):
             )
         ],
     )
+    @conditional_on_data_version()
+    @cached_chart_response
     def get(self, request, *args, **kwargs):
         from_date = request.query_params.get('from')
         end_date = request.query_params.get('end')
@@ -63,12 +68,9 @@ class ChartsAPIView(APIView):
 
         date_range = [from_date + timedelta(days=x) for x in range((end_date - from_date).days + 1)]
 
-        aggregated_data = queryset.filter(date__range=[from_date, end_date]).annotate(
-            day=TruncDay('date')
-        ).values('day').annotate(
-            income=Sum(Case(When(type='income', then='amount'), output_field=IntegerField())),
-            outcome=Sum(Case(When(type='outcome', then='amount'), output_field=IntegerField()))
-        ).order_by('day')
+        aggregated_data = queryset.filter(
+            day__range=[from_date, end_date]
+        ).values('day', 'income', 'outcome').order_by('day')
 
         aggregated_data_dict = {data['day']: data for data in aggregated_data}
 
@@ -91,9 +93,11 @@ class ChartsAPIView(APIView):
 
 
 class TargetAPIView(APIView):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
+    @conditional_on_data_version()
+    @cached_chart_response
     def get(self, request, year, month):
         try:
             target = MonthTarget.objects.get(user=request.user, year=year, month=month)
@@ -107,8 +111,9 @@ class TargetAPIView(APIView):
             target_income = target.income
             target_outcome = target.outcome
 
-        income_achieved = self.calculate_achieved_amount(request.user, year, month, 'income')
-        outcome_achieved = self.calculate_achieved_amount(request.user, year, month, 'outcome')
+        achieved = summaries.month_totals(request.user, year, month)
+        income_achieved = achieved['income']
+        outcome_achieved = achieved['outcome']
 
         response_data = {
             "year": year,
@@ -121,23 +126,9 @@ class TargetAPIView(APIView):
 
         return Response(response_data)
 
-    def calculate_achieved_amount(self, user, year, month, type):
-        start_date = make_aware(datetime(year, month, 1))
-
-        if month == 12:
-            end_year = year + 1
-            end_month = 1
-        else:
-            end_year = year
-            end_month = month + 1
-
-        end_date = make_aware(datetime(end_year, end_month, 1)) - timedelta(days=1)
-
-        return Accounting.objects.filter(user=user, date__range=[start_date, end_date], type=type).aggregate(Sum('amount'))['amount__sum'] or 0
-
 
 class TypeCostAPIView(APIView):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     @swagger_auto_schema(
@@ -159,6 +150,8 @@ class TypeCostAPIView(APIView):
             )
         ],
     )
+    @conditional_on_data_version()
+    @cached_chart_response
     def get(self, request):
         from_date = request.query_params.get('from')
         end_date = request.query_params.get('end')
@@ -169,13 +162,7 @@ class TypeCostAPIView(APIView):
         except (ValueError, TypeError):
             return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
 
-        prefetch = Prefetch('category', queryset=Category.objects.all().annotate(total=Sum('accounting__amount')))
-        queryset = Accounting.objects.filter(user=request.user, date__range=[from_date, end_date], type='outcome').prefetch_related(prefetch)
-
-        category_totals = {}
-        for accounting in queryset:
-            for category in accounting.category.all():
-                category_totals[category.name] = category_totals.get(category.name, 0) + accounting.amount
+        category_totals = summaries.category_totals(request.user, from_date, end_date, 'outcome')
 
         total_outcome_amount = sum(category_totals.values())
 
@@ -220,7 +207,7 @@ class TypeCostAPIView(APIView):
 
 
 class CompareAPIView(APIView):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     @swagger_auto_schema(
@@ -242,6 +229,8 @@ class CompareAPIView(APIView):
             )
         ],
     )
+    @conditional_on_data_version()
+    @cached_chart_response
     def get(self, request):
         from_date = request.query_params.get('from')
         end_date = request.query_params.get('end')
@@ -279,11 +268,7 @@ class CompareAPIView(APIView):
         return Response(response_data)
 
     def aggregate_data(self, user, start_date, end_date):
-        queryset = Accounting.objects.filter(user=user, date__range=[start_date, end_date])
-        total_income = queryset.filter(type='income').aggregate(Sum('amount'))['amount__sum'] or 0
-        total_outcome = queryset.filter(type='outcome').aggregate(Sum('amount'))['amount__sum'] or 0
-
-        return {"income": total_income, "outcome": total_outcome}
+        return summaries.period_totals(user, start_date, end_date)
 
     def calculate_percentage_change(self, old_value, new_value):
         if old_value == 0:
@@ -292,7 +277,7 @@ class CompareAPIView(APIView):
 
 
 class SaveMoneyAPIView(APIView):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     @swagger_auto_schema(
@@ -325,6 +310,8 @@ class SaveMoneyAPIView(APIView):
             status.HTTP_400_BAD_REQUEST: "Bad request",
         }
     )
+    @conditional_on_data_version()
+    @cached_chart_response
     def get(self, request, category_id):
         try:
             category = Category.objects.get(id=category_id, user=request.user)
@@ -360,3 +347,13 @@ class SaveMoneyAPIView(APIView):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+
+class ChartCacheStatsAPIView(APIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    @swagger_auto_schema(
+        description="Get the chart cache hit and miss counters of this process (staff only)",
+    )
+    def get(self, request):
+        return Response(cache_stats.snapshot())
@@ -38,4 +38,6 @@ admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Accounting)
 admin.site.register(models.Category)
 admin.site.register(models.MonthTarget)
-admin.site.register(models.SaveMoneyTarget)
\ No newline at end of file
+admin.site.register(models.SaveMoneyTarget)
+admin.site.register(models.ReportJob)
+admin.site.register(models.RequestProfile)
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Token authentication cached between requests
+"""
+import copy
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+DEFAULT_TOKEN_AUTH_CACHE = {
+    'BACKEND': 'local',
+    'TIMEOUT': 60,
+    'MAX_SIZE': 10000,
+    'CACHE_ALIAS': 'default',
+}
+
+CACHE_KEY_PREFIX = 'token_auth:'
+
+
+class LocalTokenCache:
+    """Thread-safe per-process LRU of authenticated tokens with a TTL
+
+    Entries are dropped explicitly on invalidation. Other processes only
+    drop them when they expire, so TIMEOUT bounds how long a revoked token
+    can still be accepted by another worker process.
+    """
+
+    def __init__(self, timeout, max_size):
+        self.timeout = timeout
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoTokenCache:
+    """Authenticated tokens kept in a Django cache shared by every process"""
+
+    def __init__(self, timeout, cache_alias):
+        self.timeout = timeout
+        self.cache = caches[cache_alias]
+
+    def get(self, key):
+        return self.cache.get(CACHE_KEY_PREFIX + key)
+
+    def set(self, key, value):
+        self.cache.set(CACHE_KEY_PREFIX + key, value, self.timeout)
+
+    def delete_many(self, keys):
+        self.cache.delete_many([CACHE_KEY_PREFIX + key for key in keys])
+
+    def clear(self):
+        # Other entries of a shared cache are left alone, expiry drops the rest
+        pass
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """Return the process-wide token cache configured by TOKEN_AUTH_CACHE"""
+    global _token_cache
+
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                config = {**DEFAULT_TOKEN_AUTH_CACHE, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+                if config['BACKEND'] == 'django':
+                    _token_cache = DjangoTokenCache(config['TIMEOUT'], config['CACHE_ALIAS'])
+                else:
+                    _token_cache = LocalTokenCache(config['TIMEOUT'], config['MAX_SIZE'])
+
+    return _token_cache
+
+
+def reset_token_cache():
+    """Drop the token cache so it is rebuilt from the current settings"""
+    global _token_cache
+
+    with _token_cache_lock:
+        if _token_cache is not None:
+            _token_cache.clear()
+        _token_cache = None
+
+
+@receiver(setting_changed)
+def token_cache_setting_changed(setting, **kwargs):
+    """Rebuild the token cache when its settings are overridden"""
+    if setting in ('TOKEN_AUTH_CACHE', 'CACHES'):
+        reset_token_cache()
+
+
+def invalidate_tokens(keys):
+    """Remove tokens from the cache"""
+    keys = list(keys)
+    if keys:
+        get_token_cache().delete_many(keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that skips the token lookup for recently seen tokens
+
+    Tokens are dropped from the cache when they are deleted (logout, token
+    rotation) and when their user is saved (deactivation, profile changes),
+    see core.signals.
+    """
+
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, (user, token))
+        else:
+            user, token = cached
+            if not user.is_active:
+                raise AuthenticationFailed(_('User inactive or deleted.'))
+
+        # Every request gets its own instances, views may modify request.user
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
@@ -0,0 +1,137 @@
+"""
+Response compression with brotli and gzip
+"""
+import gzip
+import zlib
+
+import brotli
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+
+DEFAULT_COMPRESSION = {
+    'ENABLED': True,
+    # Smaller bodies are sent as they are, a compressed frame would barely save a packet
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    'STREAMING': True,
+    # HTML is left out, compressing pages with CSRF tokens would expose them to BREACH
+    'CONTENT_TYPES': ('application/json', 'text/csv', 'text/plain'),
+}
+
+# Preferred first when the client accepts both with the same weight
+ENCODINGS = ('br', 'gzip')
+
+
+def get_compression_config():
+    return {**DEFAULT_COMPRESSION, **getattr(settings, 'COMPRESSION', {})}
+
+
+def accepted_encoding(header):
+    """Return the best encoding of ENCODINGS accepted by an Accept-Encoding header, None for none"""
+    weights = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding.lower()] = weight
+
+    wildcard = weights.get('*', 0.0)
+    candidates = [(weights.get(encoding, wildcard), encoding) for encoding in ENCODINGS]
+    weight, encoding = max(candidates, key=lambda candidate: candidate[0])
+    return encoding if weight > 0 else None
+
+
+def compress(data, encoding, config):
+    """Return a whole body compressed with an encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['BROTLI_QUALITY'])
+    # A fixed mtime keeps equal bodies compressing to equal bytes
+    return gzip.compress(data, compresslevel=config['GZIP_LEVEL'], mtime=0)
+
+
+def compress_stream(chunks, encoding, config):
+    """Yield the chunks of a streamed body compressed with an encoding
+
+    Every chunk is flushed, so the client can decode what was sent so far.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config['BROTLI_QUALITY'])
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(config['GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def is_compressible(response, config):
+    """Return True for a response whose content type and size are worth compressing"""
+    if response.has_header('Content-Encoding') or response.status_code in (204, 206, 304):
+        return False
+
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type not in config['CONTENT_TYPES']:
+        return False
+
+    if response.streaming:
+        return config['STREAMING']
+    return len(response.content) >= config['MIN_SIZE']
+
+
+class ResponseCompressionMiddleware:
+    """Compress API responses with brotli or gzip, as accepted by the client
+
+    Only CONTENT_TYPES are compressed, bodies smaller than MIN_SIZE are
+    sent as they are and streamed bodies are compressed chunk by chunk
+    unless STREAMING is off. A strong ETag is made weak as the encoded
+    bytes differ from the ones it was computed for.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        config = get_compression_config()
+        if not config['ENABLED'] or not is_compressible(response, config):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding, config)
+            # The length of the compressed stream is not known in advance
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding, config)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+
+        return response
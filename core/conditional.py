@@ -0,0 +1,78 @@
+"""
+Conditional GET support for views reading a user's accounting data
+"""
+import hashlib
+
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from core.versions import request_data_version
+
+
+def request_fingerprint(request, kwargs):
+    """Return a digest of the query parameters and URL arguments of a request"""
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    raw = repr((params, sorted(kwargs.items())))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def data_etag(request, view_name, kwargs, extra=None):
+    """Return a strong ETag for a response derived from the user's data version"""
+    raw = repr((
+        view_name,
+        request.user.pk,
+        request_data_version(request),
+        request_fingerprint(request, kwargs),
+        getattr(request, 'accepted_media_type', None),
+        extra,
+    ))
+    return '"%s"' % hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def etag_matches(request, etag):
+    """Return True when If-None-Match names the ETag (weak comparison, RFC 9110)"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+
+    tags = parse_etags(header)
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+def conditional_on_data_version(extra=None):
+    """Answer GET requests with 304 Not Modified while the user's data is unchanged
+
+    The ETag covers the view, the user, the user's data version, the query
+    parameters and URL arguments, plus `extra(request)` for views whose output
+    depends on anything else. On a match the view itself is not run. Works for
+    view methods and function based api views.
+    """
+    def decorator(view):
+        view_name = view.__qualname__
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            etag = data_etag(request, view_name, kwargs, extra(request) if extra else None)
+
+            if etag_matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = view(*args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+
+            response['ETag'] = etag
+            # Per-user data, clients may keep it but must revalidate before use
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,35 @@
+"""
+Shared base for the summary rebuild commands
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+
+class RebuildSummariesCommand(BaseCommand):
+    """Base command rebuilding one summary table for all or some accounts"""
+    summary_name = None
+
+    def rebuild(self, user_ids):
+        """Rebuild the summaries and return the number of rows created"""
+        raise NotImplementedError
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account',
+            action='append',
+            dest='accounts',
+            help='Only rebuild the summaries of this account (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        user_ids = None
+        if options['accounts']:
+            users = get_user_model().objects.filter(account__in=options['accounts'])
+            user_ids = list(users.values_list('id', flat=True))
+            if len(user_ids) != len(set(options['accounts'])):
+                raise CommandError('Unknown account in --account')
+
+        created = self.rebuild(user_ids)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} {self.summary_name} summaries'))
@@ -0,0 +1,14 @@
+"""
+Django command to rebuild the category summaries from accounting records
+"""
+from core.management.base import RebuildSummariesCommand
+from core.summaries import rebuild_category_summaries
+
+
+class Command(RebuildSummariesCommand):
+    """Django command to rebuild the category summaries"""
+    help = 'Recompute the per-user monthly totals by category and type'
+    summary_name = 'category'
+
+    def rebuild(self, user_ids):
+        return rebuild_category_summaries(user_ids)
@@ -0,0 +1,14 @@
+"""
+Django command to rebuild the daily summaries from accounting records
+"""
+from core.management.base import RebuildSummariesCommand
+from core.summaries import rebuild_daily_summaries
+
+
+class Command(RebuildSummariesCommand):
+    """Django command to rebuild the daily summaries"""
+    help = 'Recompute the per-user daily income/outcome summaries'
+    summary_name = 'daily'
+
+    def rebuild(self, user_ids):
+        return rebuild_daily_summaries(user_ids)
@@ -0,0 +1,17 @@
+"""
+Django command to rebuild the monthly summaries from the daily summaries
+"""
+from core.management.base import RebuildSummariesCommand
+from core.summaries import rebuild_monthly_summaries
+
+
+class Command(RebuildSummariesCommand):
+    """Django command to rebuild the monthly summaries"""
+    help = (
+        'Recompute the per-user monthly income/outcome summaries '
+        '(run rebuild_daily_summaries first if the daily summaries are stale)'
+    )
+    summary_name = 'monthly'
+
+    def rebuild(self, user_ids):
+        return rebuild_monthly_summaries(user_ids)
@@ -0,0 +1,330 @@
+"""
+Request metrics per route, exposed in the Prometheus text format
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+
+
+DEFAULT_METRICS = {
+    'ENABLED': True,
+    'DIRECTORY': None,
+    'FLUSH_INTERVAL': 5,
+    'RETENTION': 24 * 60 * 60,
+}
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+HTTP_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+UNMATCHED_ROUTE = 'unmatched'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def empty_route_metrics():
+    return {
+        'statuses': {},
+        'buckets': [0] * len(LATENCY_BUCKETS),
+        'count': 0,
+        'duration_seconds': 0.0,
+        'sql_queries': 0,
+        'sql_seconds': 0.0,
+        'response_bytes': 0,
+    }
+
+
+def merge_route_metrics(total, metrics):
+    """Add the metrics of a route to a running total in place"""
+    for status, count in metrics['statuses'].items():
+        total['statuses'][status] = total['statuses'].get(status, 0) + count
+    total['buckets'] = [a + b for a, b in zip(total['buckets'], metrics['buckets'])]
+    for name in ('count', 'duration_seconds', 'sql_queries', 'sql_seconds', 'response_bytes'):
+        total[name] += metrics[name]
+
+
+class MetricsFileStore:
+    """Snapshots of every worker process, one JSON file per process in a shared directory
+
+    Each process only writes its own file, so no locking between processes
+    is needed. Files of processes which stopped writing for `retention`
+    seconds are removed.
+    """
+
+    def __init__(self, directory, retention):
+        self.directory = Path(directory)
+        self.retention = retention
+        # The start time keeps a reused pid from overwriting an older worker's counters
+        self.path = self.directory / f'{os.getpid()}-{time.time_ns()}.json'
+
+    def write(self, snapshot):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as temp_file:
+                json.dump(snapshot, temp_file)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def read_others(self):
+        """Return the snapshots written by the other processes"""
+        snapshots = []
+        expired_before = time.time() - self.retention
+        for path in self.directory.glob('*.json'):
+            if path == self.path:
+                continue
+            try:
+                if path.stat().st_mtime < expired_before:
+                    path.unlink()
+                    continue
+                with open(path) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                # Removed or replaced while being read
+                continue
+        return snapshots
+
+
+class MetricsRegistry:
+    """Thread-safe metrics of the current process, keyed by route and method"""
+
+    def __init__(self, store=None, flush_interval=5):
+        self.pid = os.getpid()
+        self.store = store
+        self.flush_interval = flush_interval
+        self._routes = {}
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def _route(self, route, method):
+        key = (route, method)
+        if key not in self._routes:
+            self._routes[key] = empty_route_metrics()
+        return self._routes[key]
+
+    def record(self, route, method, status, seconds, sql_queries=0, sql_seconds=0.0, response_bytes=0):
+        """Record a finished request"""
+        with self._lock:
+            metrics = self._route(route, method)
+            status = str(status)
+            metrics['statuses'][status] = metrics['statuses'].get(status, 0) + 1
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    metrics['buckets'][index] += 1
+            metrics['count'] += 1
+            metrics['duration_seconds'] += seconds
+            metrics['sql_queries'] += sql_queries
+            metrics['sql_seconds'] += sql_seconds
+            metrics['response_bytes'] += response_bytes
+        self.maybe_flush()
+
+    def add_response_bytes(self, route, method, size):
+        with self._lock:
+            self._route(route, method)['response_bytes'] += size
+
+    def count_stream(self, chunks, route, method):
+        """Yield the chunks of a streamed response, adding their size once it is sent"""
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.add_response_bytes(route, method, size)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'routes': [
+                    {**metrics, 'route': route, 'method': method, 'statuses': dict(metrics['statuses']),
+                     'buckets': list(metrics['buckets'])}
+                    for (route, method), metrics in self._routes.items()
+                ],
+            }
+
+    def flush(self):
+        """Write the snapshot of this process to the shared store"""
+        if self.store is not None:
+            self.store.write(self.snapshot())
+            self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        if self.store is not None and time.monotonic() - self._flushed_at >= self.flush_interval:
+            try:
+                self.flush()
+            except OSError:
+                # Metrics must never fail a request, the next flush retries
+                pass
+
+    def collect(self):
+        """Return the merged snapshots of every process and the number of processes"""
+        # The live counters of this process, its own file may be older
+        snapshots = [self.snapshot()]
+        if self.store is not None:
+            snapshots += self.store.read_others()
+
+        routes = {}
+        for snapshot in snapshots:
+            for metrics in snapshot['routes']:
+                key = (metrics['route'], metrics['method'])
+                merge_route_metrics(routes.setdefault(key, empty_route_metrics()), metrics)
+        return routes, len(snapshots)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics_config():
+    return {**DEFAULT_METRICS, **getattr(settings, 'METRICS', {})}
+
+
+def get_metrics_registry():
+    """Return the metrics registry of the current process, None when metrics are disabled
+
+    A registry inherited through fork is replaced, so every uwsgi worker
+    counts and writes its own metrics.
+    """
+    global _registry
+
+    config = get_metrics_config()
+    if not config['ENABLED']:
+        return None
+
+    if _registry is None or _registry.pid != os.getpid():
+        with _registry_lock:
+            if _registry is None or _registry.pid != os.getpid():
+                store = MetricsFileStore(config['DIRECTORY'], config['RETENTION']) if config['DIRECTORY'] else None
+                _registry = MetricsRegistry(store, config['FLUSH_INTERVAL'])
+
+    return _registry
+
+
+def reset_metrics_registry():
+    """Drop the metrics of the current process"""
+    global _registry
+
+    with _registry_lock:
+        _registry = None
+
+
+@receiver(setting_changed)
+def metrics_setting_changed(setting, **kwargs):
+    """Rebuild the registry when the metrics settings are overridden"""
+    if setting == 'METRICS':
+        reset_metrics_registry()
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_prometheus(routes, processes):
+    """Return merged route metrics in the Prometheus text exposition format"""
+    lines = [
+        '# HELP http_metrics_processes Worker processes included in these metrics',
+        '# TYPE http_metrics_processes gauge',
+        f'http_metrics_processes {processes}',
+    ]
+    items = sorted(routes.items())
+
+    lines += [
+        '# HELP http_requests_total Requests by route, method and status code',
+        '# TYPE http_requests_total counter',
+    ]
+    for (route, method), metrics in items:
+        for status, count in sorted(metrics['statuses'].items()):
+            lines.append(f'http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Time spent in Django to produce a response',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for (route, method), metrics in items:
+        for bound, count in zip(LATENCY_BUCKETS, metrics['buckets']):
+            lines.append(
+                f'http_request_duration_seconds_bucket{_labels(route=route, method=method, le=bound)} {count}'
+            )
+        lines.append(
+            f'http_request_duration_seconds_bucket{_labels(route=route, method=method, le="+Inf")} {metrics["count"]}'
+        )
+        lines.append(f'http_request_duration_seconds_sum{_labels(route=route, method=method)} '
+                     f'{metrics["duration_seconds"]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{_labels(route=route, method=method)} {metrics["count"]}')
+
+    for name, key, kind, description in (
+        ('http_request_sql_queries_total', 'sql_queries', 'counter', 'SQL queries run by requests'),
+        ('http_request_sql_seconds_total', 'sql_seconds', 'counter', 'Time spent in SQL queries by requests'),
+        ('http_response_size_bytes_total', 'response_bytes', 'counter', 'Bytes of response bodies'),
+    ):
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for (route, method), metrics in items:
+            value = metrics[key]
+            value = f'{value:.6f}' if isinstance(value, float) else value
+            lines.append(f'{name}{_labels(route=route, method=method)} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetricsMiddleware:
+    """Record latency, SQL queries, response size and status code of every request
+
+    Requests are grouped by the name of the matched URL pattern. The SQL of
+    a streamed response which runs while the body is sent is not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        registry = get_metrics_registry()
+        if registry is None:
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        seconds = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else UNMATCHED_ROUTE
+        # Arbitrary methods would grow the number of series without bound
+        method = request.method if request.method in HTTP_METHODS else 'OTHER'
+
+        if response.streaming:
+            response_bytes = 0
+            response.streaming_content = registry.count_stream(response.streaming_content, route, method)
+        else:
+            response_bytes = len(response.content)
+
+        registry.record(route, method, response.status_code, seconds, timer.count, timer.seconds, response_bytes)
+        return response
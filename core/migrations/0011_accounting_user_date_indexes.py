@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_alter_savemoneytarget_end_date_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accounting',
+            index=models.Index(fields=['user', 'date'], name='accounting_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accounting',
+            index=models.Index(fields=['user', 'type', 'date'], name='accounting_user_type_date_idx'),
+        ),
+    ]
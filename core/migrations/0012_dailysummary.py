@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:04
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+
+def populate_daily_summaries(apps, schema_editor):
+    Accounting = apps.get_model('core', 'Accounting')
+    DailySummary = apps.get_model('core', 'DailySummary')
+
+    rows = Accounting.objects.values('user_id', 'date').annotate(
+        income=Sum('amount', filter=Q(type='income'), default=0),
+        outcome=Sum('amount', filter=Q(type='outcome'), default=0),
+        count=Count('id'),
+    ).order_by()
+    DailySummary.objects.bulk_create(
+        (
+            DailySummary(
+                user_id=row['user_id'],
+                day=row['date'],
+                income=row['income'],
+                outcome=row['outcome'],
+                count=row['count'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_accounting_user_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('income', models.IntegerField(default=0)),
+                ('outcome', models.IntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailysummary',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='dailysummary_user_day_uniq'),
+        ),
+        migrations.RunPython(populate_daily_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+import django.db.models.deletion
+
+
+def populate_monthly_summaries(apps, schema_editor):
+    DailySummary = apps.get_model('core', 'DailySummary')
+    MonthlySummary = apps.get_model('core', 'MonthlySummary')
+
+    rows = DailySummary.objects.annotate(
+        year=ExtractYear('day'),
+        month=ExtractMonth('day'),
+    ).values('user_id', 'year', 'month').annotate(
+        total_income=Sum('income'),
+        total_outcome=Sum('outcome'),
+    ).order_by()
+    MonthlySummary.objects.bulk_create(
+        (
+            MonthlySummary(
+                user_id=row['user_id'],
+                year=row['year'],
+                month=row['month'],
+                income=row['total_income'],
+                outcome=row['total_outcome'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_dailysummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('income', models.IntegerField(default=0)),
+                ('outcome', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='monthlysummary',
+            constraint=models.UniqueConstraint(fields=('user', 'year', 'month'), name='monthlysummary_user_month_uniq'),
+        ),
+        migrations.RunPython(populate_monthly_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+import django.db.models.deletion
+
+
+def populate_category_monthly_summaries(apps, schema_editor):
+    Accounting = apps.get_model('core', 'Accounting')
+    CategoryMonthlySummary = apps.get_model('core', 'CategoryMonthlySummary')
+
+    rows = Accounting.category.through.objects.annotate(
+        user_id=models.F('accounting__user_id'),
+        year=ExtractYear('accounting__date'),
+        month=ExtractMonth('accounting__date'),
+        type=models.F('accounting__type'),
+    ).values('user_id', 'category_id', 'year', 'month', 'type').annotate(
+        total=Sum('accounting__amount'),
+    ).order_by()
+    CategoryMonthlySummary.objects.bulk_create(
+        (
+            CategoryMonthlySummary(
+                user_id=row['user_id'],
+                category_id=row['category_id'],
+                year=row['year'],
+                month=row['month'],
+                type=row['type'],
+                amount=row['total'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_monthlysummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('type', models.CharField(choices=[('income', 'income'), ('outcome', 'outcome')], max_length=255)),
+                ('amount', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='categorymonthlysummary',
+            constraint=models.UniqueConstraint(fields=('user', 'type', 'year', 'month', 'category'), name='categorymonthlysummary_uniq'),
+        ),
+        migrations.RunPython(populate_category_monthly_summaries, migrations.RunPython.noop),
+    ]
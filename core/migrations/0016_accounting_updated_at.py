@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accounting',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
@@ -3,7 +3,8 @@ Database models
 """
 from typing import Any
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import (AbstractBaseUser, BaseUserManager, PermissionsMixin)
 
 
@@ -43,11 +44,77 @@ class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Bumped on every change to the user's accounting data, see core.versions
+    data_version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Requests of the user are profiled until then, see core.profiling
+    profile_requests_until = models.DateTimeField(null=True, blank=True)
 
     objects = UserManager()
 
     USERNAME_FIELD = 'account'
 
+    # Written by their own updates only, see save
+    SEPARATELY_SAVED_FIELDS = ('data_version', 'profile_requests_until')
+
+    def save(self, *args, **kwargs):
+        """Save the user, leaving SEPARATELY_SAVED_FIELDS alone unless listed in update_fields
+
+        A user read earlier, e.g. from the token cache, would otherwise write
+        an older data version back.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SEPARATELY_SAVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class AccountingQuerySet(models.QuerySet):
+    """QuerySet keeping the summary tables current on bulk writes"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Bulk create accountings and refresh the touched summaries"""
+        from core import summaries
+        from core.versions import lock_data_versions
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db), summaries.batch():
+            # Before the insert, see lock_data_versions
+            lock_data_versions(obj.user_id for obj in objs)
+            objs = super().bulk_create(objs, *args, **kwargs)
+            for obj in objs:
+                summaries.touch(obj.user_id, obj.date)
+
+        return objs
+
+    def update(self, **kwargs):
+        """Update accountings and refresh the summaries of old and new dates"""
+        from core import summaries
+        from core.versions import lock_data_versions
+
+        kwargs.setdefault('updated_at', timezone.now())
+        with transaction.atomic(using=self.db), summaries.batch():
+            rows = list(self.values_list('pk', 'user_id', 'date'))
+            new_user = kwargs.get('user_id', getattr(kwargs.get('user'), 'pk', None))
+            lock_data_versions({user_id for _, user_id, _ in rows} | ({new_user} if new_user else set()))
+            updated = super().update(**kwargs)
+            for _, user_id, day in rows:
+                summaries.touch(user_id, day)
+            if rows and ('date' in kwargs or 'user' in kwargs or 'user_id' in kwargs):
+                moved = Accounting.objects.filter(pk__in=[pk for pk, _, _ in rows])
+                for user_id, day in moved.values_list('user_id', 'date').distinct():
+                    summaries.touch(user_id, day)
+
+        return updated
+
+    def delete(self):
+        """Delete accountings and refresh each touched summary once"""
+        from core import summaries
+
+        with transaction.atomic(using=self.db), summaries.batch():
+            return super().delete()
+
 
 class Accounting(models.Model):
     """Accounting object"""
@@ -66,10 +133,94 @@ class Accounting(models.Model):
     category = models.ManyToManyField('Category')
     title = models.CharField(max_length=255, blank=True)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    objects = AccountingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='accounting_user_date_idx'),
+            models.Index(fields=['user', 'type', 'date'], name='accounting_user_type_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded values so summaries of the old date can be refreshed"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save the accounting and refresh its summaries in one transaction"""
+        from core.versions import lock_data_versions
+
+        with transaction.atomic(using=kwargs.get('using')):
+            # Before the write, see lock_data_versions; a moved accounting also locks its old user
+            old_user_id = getattr(self, '_loaded_values', {}).get('user_id')
+            lock_data_versions(user_id for user_id in (self.user_id, old_user_id) if user_id is not None)
+            super().save(*args, **kwargs)
+
+
+class DailySummary(models.Model):
+    """Per-user daily totals of accounting records"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    day = models.DateField()
+    income = models.IntegerField(default=0)
+    outcome = models.IntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='dailysummary_user_day_uniq'),
+        ]
+
+
+class MonthlySummary(models.Model):
+    """Per-user monthly totals of accounting records"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    year = models.IntegerField()
+    month = models.IntegerField()
+    income = models.IntegerField(default=0)
+    outcome = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year', 'month'], name='monthlysummary_user_month_uniq'),
+        ]
+
+
+class CategoryMonthlySummary(models.Model):
+    """Per-user monthly totals of accounting records by category and type"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    category = models.ForeignKey(
+        'Category',
+        on_delete=models.CASCADE,
+    )
+    year = models.IntegerField()
+    month = models.IntegerField()
+    type = models.CharField(max_length=255, choices=Accounting.TYPE_CHOICES)
+    amount = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'type', 'year', 'month', 'category'],
+                name='categorymonthlysummary_uniq',
+            ),
+        ]
+
 
 class Category(models.Model):
     """Category for accounting"""
@@ -103,4 +254,58 @@ class SaveMoneyTarget(models.Model):
     )
     target = models.IntegerField()
     from_date = models.DateField(null=False)
-    end_date = models.DateField(null=False)
\ No newline at end of file
+    end_date = models.DateField(null=False)
+
+class ReportJob(models.Model):
+    """Report generation request processed by the report worker"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'pending'),
+        (STATUS_RUNNING, 'running'),
+        (STATUS_DONE, 'done'),
+        (STATUS_FAILED, 'failed'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    year = models.IntegerField()
+    month = models.IntegerField(null=True, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    file_key = models.CharField(max_length=1024, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Times the job was claimed, see reports.jobs.requeue_expired_jobs
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='reportjob_status_created_idx'),
+        ]
+
+
+class RequestProfile(models.Model):
+    """Profile of a request recorded in profiling mode, see core.profiling"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    route = models.CharField(max_length=255)
+    method = models.CharField(max_length=16)
+    path = models.CharField(max_length=2048)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    sql_ms = models.FloatField()
+    # Statements with their timings, and the plan of the slow ones
+    queries = models.JSONField(default=list)
+    # cProfile statistics in the pstats file format
+    stats = models.BinaryField()
+    summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,33 @@
+"""
+JSON parser backed by orjson
+"""
+import io
+
+import orjson
+
+from django.conf import settings
+
+from rest_framework.parsers import JSONParser
+
+from core.renderers import ORJSONRenderer
+
+
+class ORJSONParser(JSONParser):
+    """Parse UTF-8 JSON request bodies with orjson
+
+    Bodies in other encodings, and bodies orjson rejects, are parsed by
+    JSONParser, so errors and non-strict constants behave the same.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,255 @@
+"""
+Staff-triggered request profiling and the slow query log
+"""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from core.authentication import get_token_cache
+from core.metrics import UNMATCHED_ROUTE
+from core.models import RequestProfile
+
+
+DEFAULT_PROFILING = {
+    'HEADER': 'HTTP_X_PROFILE',
+    'EXPLAIN_THRESHOLD_MS': 10,
+    'SLOW_QUERY_MS': 200,
+    'MAX_QUERIES': 1000,
+    'STATS_LIMIT': 60,
+}
+
+# Users being profiled, refreshed when a profile_requests_until is saved and
+# by the other processes once it expires
+PROFILED_USERS_CACHE_KEY = 'profiling:users'
+PROFILED_USERS_TIMEOUT = 60
+
+slow_query_logger = logging.getLogger('core.slow_queries')
+
+
+def get_profiling_config():
+    return {**DEFAULT_PROFILING, **getattr(settings, 'PROFILING', {})}
+
+
+class QueryLog:
+    """Database execute wrapper keeping the statements of a request
+
+    While profiling every statement is kept (up to `max_queries`),
+    otherwise only the ones slower than `slow_seconds`.
+    """
+
+    def __init__(self, slow_seconds, capture_all=False, max_queries=0):
+        self.slow_seconds = slow_seconds
+        self.capture_all = capture_all
+        self.max_queries = max_queries
+        self.queries = []
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.seconds += duration
+            if (self.capture_all and len(self.queries) < self.max_queries) or duration >= self.slow_seconds:
+                self.queries.append({'sql': sql, 'params': params, 'many': many, 'seconds': duration})
+
+    def slow_queries(self):
+        return [query for query in self.queries if query['seconds'] >= self.slow_seconds]
+
+
+def explain(sql, params):
+    """Return the plan of a SELECT statement as text, None for other statements"""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+
+    try:
+        # A failed EXPLAIN must not break the transaction of the request
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+    except DatabaseError as e:
+        return f'EXPLAIN failed: {e}'
+
+
+def profiled_users(refresh=False):
+    """Return the profile_requests_until of the users being profiled, by user id"""
+    users = None if refresh else cache.get(PROFILED_USERS_CACHE_KEY)
+    if users is None:
+        users = dict(
+            get_user_model().objects
+            .filter(profile_requests_until__gt=timezone.now())
+            .values_list('id', 'profile_requests_until')
+        )
+        cache.set(PROFILED_USERS_CACHE_KEY, users, PROFILED_USERS_TIMEOUT)
+    return users
+
+
+def token_user(request):
+    """Return the id and staff flag of the active user of a request's token, None without one
+
+    DRF only authenticates inside the view, so the user is read from the
+    token cache when the token was seen recently, otherwise with one query.
+    """
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return None
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        return None
+
+    cached = get_token_cache().get(key)
+    if cached is not None:
+        user = cached[0]
+        return (user.pk, user.is_staff) if user.is_active else None
+    return Token.objects.filter(key=key, user__is_active=True).values_list('user_id', 'user__is_staff').first()
+
+
+def may_profile(request, config):
+    """Return True when a request is to be profiled, before the view runs
+
+    Only requests of staff with the profiling header and of users being
+    profiled are, profiling_user checks the user DRF authenticated afterwards.
+    """
+    header = request.META.get(config['HEADER']) == '1'
+    users = profiled_users()
+    if not header and not users:
+        return False
+
+    user = token_user(request)
+    if user is None:
+        return False
+    user_id, is_staff = user
+    until = users.get(user_id)
+    return (header and is_staff) or (until is not None and until > timezone.now())
+
+
+def profiling_user(request, config):
+    """Return the user whose request was profiled, None to drop the profile
+
+    Staff profile their own requests with the profiling header, other
+    users are profiled while their profile_requests_until is in the future.
+    Called once the view has run, request.user is then the user DRF
+    authenticated.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+
+    if user.is_staff and request.META.get(config['HEADER']) == '1':
+        return user
+    until = profiled_users().get(user.pk)
+    if until and until > timezone.now():
+        return user
+    return None
+
+
+def request_route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else UNMATCHED_ROUTE
+
+
+def save_profile(user, request, response, profiler, query_log, seconds, config):
+    """Store the profile of a request with the plans of its slow statements"""
+    profiler.create_stats()
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(config['STATS_LIMIT'])
+
+    threshold = config['EXPLAIN_THRESHOLD_MS'] / 1000
+    queries = [
+        {
+            'sql': query['sql'],
+            'params': [str(param) for param in query['params'] or ()] if not query['many'] else None,
+            'duration_ms': round(query['seconds'] * 1000, 3),
+            'explain': explain(query['sql'], query['params'])
+            if query['seconds'] >= threshold and not query['many'] else None,
+        }
+        for query in query_log.queries
+    ]
+
+    return RequestProfile.objects.create(
+        user=user,
+        route=request_route(request),
+        method=request.method,
+        path=request.get_full_path()[:2048],
+        status_code=response.status_code,
+        duration_ms=round(seconds * 1000, 3),
+        query_count=query_log.count,
+        sql_ms=round(query_log.seconds * 1000, 3),
+        queries=queries,
+        stats=marshal.dumps(profiler.stats),
+        summary=summary.getvalue(),
+    )
+
+
+def log_slow_queries(request, queries):
+    """Log the statements of a request which took longer than SLOW_QUERY_MS"""
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    route = request_route(request)
+
+    for query in queries:
+        slow_query_logger.warning(
+            'Slow query %.1fms on %s (user %s): %s',
+            query['seconds'] * 1000, route, user_id, query['sql'],
+            extra={'route': route, 'user_id': user_id, 'duration_ms': query['seconds'] * 1000, 'sql': query['sql']},
+        )
+
+
+class RequestProfilingMiddleware:
+    """Profile the requests selected by may_profile and log slow queries of every request
+
+    A profiled request runs under cProfile with every SQL statement captured,
+    its profile is stored as a RequestProfile whose id is returned in the
+    X-Profile-Id header. Statements of streamed response bodies run after
+    the view and are not captured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_profiling_config()
+        profiling = may_profile(request, config)
+        query_log = QueryLog(
+            config['SLOW_QUERY_MS'] / 1000,
+            capture_all=profiling,
+            max_queries=config['MAX_QUERIES'],
+        )
+        profiler = cProfile.Profile() if profiling else None
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(query_log):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        seconds = time.perf_counter() - started
+
+        slow_queries = query_log.slow_queries()
+        if slow_queries:
+            log_slow_queries(request, slow_queries)
+        user = profiling_user(request, config) if profiling else None
+        if user is not None:
+            profile = save_profile(user, request, response, profiler, query_log, seconds, config)
+            response['X-Profile-Id'] = str(profile.id)
+
+        return response
@@ -0,0 +1,88 @@
+"""
+Signal handlers keeping the summary tables, data versions, the token cache and the profiled users current
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core import summaries
+from core.authentication import invalidate_tokens
+from core.models import Accounting, Category, MonthTarget, SaveMoneyTarget
+from core.profiling import profiled_users
+from core.versions import bump_data_versions
+
+
+def _deleted_with_user(origin):
+    """Return True when a delete cascades from deleting the user itself"""
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is get_user_model()
+
+
+@receiver(post_save, sender=Accounting)
+def accounting_saved(sender, instance, raw=False, **kwargs):
+    """Refresh the summaries touched by a saved accounting"""
+    if not raw:
+        summaries.touch_accounting(instance)
+
+
+@receiver(post_delete, sender=Accounting)
+def accounting_deleted(sender, instance, origin=None, **kwargs):
+    """Refresh the summaries touched by a deleted accounting"""
+    if not _deleted_with_user(origin):
+        summaries.touch_accounting(instance)
+
+
+@receiver(m2m_changed, sender=Accounting.category.through)
+def accounting_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mark accountings whose categories changed as updated and refresh their summaries"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Accounting.objects.filter(pk=instance.pk).update()
+        return
+
+    # Reverse changes start from a category, so look up the accountings it affects
+    if action == 'pre_clear':
+        instance._cleared_accounting_ids = list(instance.accounting_set.values_list('id', flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_accounting_ids', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    Accounting.objects.filter(pk__in=pk_set).update()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=MonthTarget)
+@receiver(post_save, sender=SaveMoneyTarget)
+def user_data_saved(sender, instance, raw=False, **kwargs):
+    """Bump the data version of the owner of a saved category or target"""
+    if not raw:
+        bump_data_versions([instance.user_id])
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=MonthTarget)
+@receiver(post_delete, sender=SaveMoneyTarget)
+def user_data_deleted(sender, instance, origin=None, **kwargs):
+    """Bump the data version of the owner of a deleted category or target"""
+    if not _deleted_with_user(origin):
+        bump_data_versions([instance.user_id])
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Stop accepting a deleted token (logout, token rotation)"""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Drop the cached tokens of a saved user and refresh the profiled users so changes apply at once"""
+    if not raw:
+        invalidate_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
+        if update_fields is None or 'profile_requests_until' in update_fields:
+            profiled_users(refresh=True)
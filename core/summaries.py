@@ -0,0 +1,352 @@
+"""
+Rollup tables kept current on every accounting write
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from core.models import Accounting, CategoryMonthlySummary, DailySummary, MonthlySummary
+from core.versions import bump_data_versions, lock_data_versions
+
+
+REFRESH_CHUNK_SIZE = 500
+REBUILD_BATCH_SIZE = 1000
+
+_state = threading.local()
+
+
+def _totals():
+    """Return the aggregates stored in a summary row"""
+    return {
+        'income': Sum('amount', filter=Q(type='income'), default=0),
+        'outcome': Sum('amount', filter=Q(type='outcome'), default=0),
+        'count': Count('id'),
+    }
+
+
+def _as_date(value):
+    """Normalize a date, datetime or ISO string to a date"""
+    return Accounting._meta.get_field('date').to_python(value)
+
+
+def _chunks(values, size=REFRESH_CHUNK_SIZE):
+    """Split a sorted list of values into chunks of at most size items"""
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _month_range(year, month):
+    """Return the lookups selecting the days of a month"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return {'day__gte': start, 'day__lt': end}
+
+
+def _months_q(start_date, end_date):
+    """Return a filter selecting the (year, month) rows between two dates"""
+    return (
+        (Q(year__gt=start_date.year) | Q(year=start_date.year, month__gte=start_date.month))
+        & (Q(year__lt=end_date.year) | Q(year=end_date.year, month__lte=end_date.month))
+    )
+
+
+@contextmanager
+def batch():
+    """Collect touched buckets and refresh each of them once when the block exits"""
+    if getattr(_state, 'buckets', None) is not None:
+        yield
+        return
+
+    _state.buckets = set()
+    try:
+        yield
+        buckets = _state.buckets
+    finally:
+        _state.buckets = None
+
+    refresh(buckets)
+
+
+def touch(user_id, day):
+    """Mark the (user, day) bucket as changed"""
+    bucket = (user_id, _as_date(day))
+    buckets = getattr(_state, 'buckets', None)
+    if buckets is not None:
+        buckets.add(bucket)
+    else:
+        refresh({bucket})
+
+
+def touch_accounting(accounting):
+    """Mark the buckets an accounting belongs to, before and after its change"""
+    with batch():
+        touch(accounting.user_id, accounting.date)
+        loaded = getattr(accounting, '_loaded_values', {})
+        if loaded.get('user_id') is not None and loaded.get('date') is not None:
+            touch(loaded['user_id'], loaded['date'])
+
+    accounting._loaded_values = {
+        **getattr(accounting, '_loaded_values', {}),
+        'user_id': accounting.user_id,
+        'date': _as_date(accounting.date),
+    }
+
+
+def refresh(buckets):
+    """Recompute every summary row derived from the given (user, day) buckets
+
+    The users are locked first, so the totals are read once the writes of
+    other transactions for the same users are committed.
+    """
+    if not buckets:
+        return
+
+    user_ids = {user_id for user_id, _ in buckets}
+    with transaction.atomic():
+        # Concurrent writes of a user would read each other's totals before they commit
+        lock_data_versions(user_ids)
+        refresh_daily_summaries(buckets)
+        refresh_monthly_summaries(buckets)
+        refresh_category_summaries(buckets)
+        bump_data_versions(user_ids)
+
+
+def refresh_daily_summaries(buckets):
+    """Recompute the daily summaries of the given (user, day) buckets"""
+    days_by_user = defaultdict(set)
+    for user_id, day in buckets:
+        days_by_user[user_id].add(day)
+
+    for user_id, days in days_by_user.items():
+        for chunk in _chunks(days):
+            rows = Accounting.objects.filter(
+                user_id=user_id, date__in=chunk
+            ).values('date').annotate(**_totals()).order_by()
+
+            DailySummary.objects.filter(user_id=user_id, day__in=chunk).delete()
+            DailySummary.objects.bulk_create([
+                DailySummary(
+                    user_id=user_id,
+                    day=row['date'],
+                    income=row['income'],
+                    outcome=row['outcome'],
+                    count=row['count'],
+                )
+                for row in rows
+            ])
+
+
+def refresh_monthly_summaries(buckets):
+    """Recompute the monthly summaries of the months containing the given buckets
+
+    Monthly totals are summed from the daily summaries, so this must run after
+    refresh_daily_summaries() for the same buckets.
+    """
+    months = {(user_id, day.year, day.month) for user_id, day in buckets}
+
+    for user_id, year, month in sorted(months):
+        totals = DailySummary.objects.filter(
+            user_id=user_id, **_month_range(year, month)
+        ).aggregate(
+            income=Sum('income', default=0),
+            outcome=Sum('outcome', default=0),
+            count=Count('id'),
+        )
+
+        if totals['count']:
+            MonthlySummary.objects.update_or_create(
+                user_id=user_id, year=year, month=month,
+                defaults={'income': totals['income'], 'outcome': totals['outcome']},
+            )
+        else:
+            MonthlySummary.objects.filter(user_id=user_id, year=year, month=month).delete()
+
+
+def refresh_category_summaries(buckets):
+    """Recompute the category summaries of the months containing the given buckets"""
+    months = {(user_id, day.year, day.month) for user_id, day in buckets}
+
+    for user_id, year, month in sorted(months):
+        date_range = _month_range(year, month)
+        rows = Accounting.category.through.objects.filter(
+            accounting__user_id=user_id,
+            accounting__date__gte=date_range['day__gte'],
+            accounting__date__lt=date_range['day__lt'],
+        ).values('category_id', 'accounting__type').annotate(
+            total=Sum('accounting__amount'),
+        ).order_by()
+
+        CategoryMonthlySummary.objects.filter(user_id=user_id, year=year, month=month).delete()
+        CategoryMonthlySummary.objects.bulk_create([
+            CategoryMonthlySummary(
+                user_id=user_id,
+                category_id=row['category_id'],
+                year=year,
+                month=month,
+                type=row['accounting__type'],
+                amount=row['total'],
+            )
+            for row in rows
+        ])
+
+
+def is_month_aligned(start_date, end_date):
+    """Return True when an inclusive date range covers whole months only"""
+    return start_date.day == 1 and (end_date + timedelta(days=1)).day == 1
+
+
+def month_totals(user, year, month):
+    """Return the income and outcome totals of a user for one month"""
+    summary = MonthlySummary.objects.filter(
+        user=user, year=year, month=month
+    ).values('income', 'outcome').first()
+
+    return summary or {'income': 0, 'outcome': 0}
+
+
+def period_totals(user, start_date, end_date):
+    """Return the income and outcome totals of a user for an inclusive date range
+
+    Month aligned ranges read one monthly summary per month, other ranges
+    read one daily summary per day.
+    """
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    if is_month_aligned(start_date, end_date):
+        queryset = MonthlySummary.objects.filter(_months_q(start_date, end_date), user=user)
+    else:
+        queryset = DailySummary.objects.filter(user=user, day__range=[start_date, end_date])
+
+    return queryset.aggregate(
+        income=Sum('income', default=0),
+        outcome=Sum('outcome', default=0),
+    )
+
+
+def category_totals(user, start_date, end_date, type='outcome'):
+    """Return the totals of a user by category name for an inclusive date range
+
+    Month aligned ranges read the category summaries, other ranges group the
+    accounting/category relation directly.
+    """
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    if is_month_aligned(start_date, end_date):
+        rows = CategoryMonthlySummary.objects.filter(
+            _months_q(start_date, end_date), user=user, type=type,
+        ).values('category__name').annotate(total=Sum('amount'))
+    else:
+        rows = Accounting.category.through.objects.filter(
+            accounting__user=user,
+            accounting__type=type,
+            accounting__date__range=[start_date, end_date],
+        ).values('category__name').annotate(total=Sum('accounting__amount'))
+
+    return {row['category__name']: row['total'] for row in rows.order_by()}
+
+
+def rebuild_daily_summaries(user_ids=None):
+    """Drop and recompute the daily summaries of the given users (default: all)"""
+    accountings = Accounting.objects.all()
+    daily_summaries = DailySummary.objects.all()
+    if user_ids is not None:
+        accountings = accountings.filter(user_id__in=user_ids)
+        daily_summaries = daily_summaries.filter(user_id__in=user_ids)
+
+    rows = accountings.values('user_id', 'date').annotate(**_totals()).order_by()
+
+    created = 0
+    with transaction.atomic():
+        daily_summaries.delete()
+        pending = []
+        for row in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+            pending.append(DailySummary(
+                user_id=row['user_id'],
+                day=row['date'],
+                income=row['income'],
+                outcome=row['outcome'],
+                count=row['count'],
+            ))
+            if len(pending) >= REBUILD_BATCH_SIZE:
+                created += len(DailySummary.objects.bulk_create(pending))
+                pending = []
+        created += len(DailySummary.objects.bulk_create(pending))
+
+    return created
+
+
+def rebuild_monthly_summaries(user_ids=None):
+    """Drop and recompute the monthly summaries of the given users from their daily summaries"""
+    daily_summaries = DailySummary.objects.all()
+    monthly_summaries = MonthlySummary.objects.all()
+    if user_ids is not None:
+        daily_summaries = daily_summaries.filter(user_id__in=user_ids)
+        monthly_summaries = monthly_summaries.filter(user_id__in=user_ids)
+
+    rows = daily_summaries.annotate(
+        year=ExtractYear('day'),
+        month=ExtractMonth('day'),
+    ).values('user_id', 'year', 'month').annotate(
+        total_income=Sum('income'),
+        total_outcome=Sum('outcome'),
+    ).order_by()
+
+    with transaction.atomic():
+        monthly_summaries.delete()
+        created = MonthlySummary.objects.bulk_create(
+            [
+                MonthlySummary(
+                    user_id=row['user_id'],
+                    year=row['year'],
+                    month=row['month'],
+                    income=row['total_income'],
+                    outcome=row['total_outcome'],
+                )
+                for row in rows
+            ],
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+
+    return len(created)
+
+
+def rebuild_category_summaries(user_ids=None):
+    """Drop and recompute the category summaries of the given users (default: all)"""
+    relations = Accounting.category.through.objects.all()
+    category_summaries = CategoryMonthlySummary.objects.all()
+    if user_ids is not None:
+        relations = relations.filter(accounting__user_id__in=user_ids)
+        category_summaries = category_summaries.filter(user_id__in=user_ids)
+
+    rows = relations.annotate(
+        user_id=F('accounting__user_id'),
+        year=ExtractYear('accounting__date'),
+        month=ExtractMonth('accounting__date'),
+        type=F('accounting__type'),
+    ).values('user_id', 'category_id', 'year', 'month', 'type').annotate(
+        total=Sum('accounting__amount'),
+    ).order_by()
+
+    created = 0
+    with transaction.atomic():
+        category_summaries.delete()
+        pending = []
+        for row in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+            pending.append(CategoryMonthlySummary(
+                user_id=row['user_id'],
+                category_id=row['category_id'],
+                year=row['year'],
+                month=row['month'],
+                type=row['type'],
+                amount=row['total'],
+            ))
+            if len(pending) >= REBUILD_BATCH_SIZE:
+                created += len(CategoryMonthlySummary.objects.bulk_create(pending))
+                pending = []
+        created += len(CategoryMonthlySummary.objects.bulk_create(pending))
+
+    return created
@@ -0,0 +1,124 @@
+"""
+Test the cached token authentication
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import LocalTokenCache, get_token_cache, reset_token_cache
+
+
+ME_URL = reverse('auth:me')
+LOGIN_URL = reverse('auth:login')
+LOGOUT_URL = reverse('auth:logout')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test tokens are cached and invalidated"""
+
+    def setUp(self):
+        reset_token_cache()
+        self.user = get_user_model().objects.create_user('testaccount', 'testpass123', name='testuser')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_skips_lookup(self):
+        """Test a repeated request does not query the token"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['account'], 'testaccount')
+
+    def test_logout_invalidates_token(self):
+        """Test a logged out token is rejected right away"""
+        self.client.get(ME_URL)
+
+        self.client.post(LOGOUT_URL)
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_rotation_invalidates_token(self):
+        """Test logging in again revokes the previous token"""
+        self.client.get(ME_URL)
+
+        res = APIClient().post(LOGIN_URL, {'account': 'testaccount', 'password': 'testpass123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {res.data['token']}")
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+    def test_deactivation_invalidates_token(self):
+        """Test a deactivated user is rejected right away"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_changes_are_visible(self):
+        """Test the cached user does not hide profile updates"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'newname'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'newname')
+
+    @override_settings(TOKEN_AUTH_CACHE={
+        'BACKEND': 'django',
+        'CACHE_ALIAS': 'default',
+        'TIMEOUT': 60,
+    })
+    def test_django_cache_backend(self):
+        """Test tokens can be cached in the Django cache framework"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            self.client.get(ME_URL)
+
+        self.client.post(LOGOUT_URL)
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class LocalTokenCacheTests(TestCase):
+    """Test the per-process token cache"""
+
+    def test_least_recently_used_evicted(self):
+        """Test the cache keeps at most max_size tokens"""
+        cache = LocalTokenCache(timeout=60, max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_entries_expire(self):
+        """Test cached tokens expire after the timeout"""
+        cache = LocalTokenCache(timeout=60, max_size=10)
+        with patch('core.authentication.time.monotonic', return_value=1000):
+            cache.set('a', 1)
+        with patch('core.authentication.time.monotonic', return_value=1059):
+            self.assertEqual(cache.get('a'), 1)
+        with patch('core.authentication.time.monotonic', return_value=1061):
+            self.assertIsNone(cache.get('a'))
+
+    def test_default_backend_is_local(self):
+        """Test the token cache is per process by default"""
+        reset_token_cache()
+
+        self.assertIsInstance(get_token_cache(), LocalTokenCache)
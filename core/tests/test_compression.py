@@ -0,0 +1,180 @@
+"""
+Test the response compression middleware
+"""
+import gzip
+import os
+import zlib
+
+from datetime import date
+
+import brotli
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.compression import ResponseCompressionMiddleware, accepted_encoding
+from core.models import Accounting
+
+
+BODY = b'{"id":1,"date":"2021-01-01","type":"outcome","amount":120,"title":"lunch"},' * 100
+
+
+def compressed_response(response, accept_encoding='gzip, deflate, br'):
+    """Return a response after the middleware, as sent to a client with an Accept-Encoding"""
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+    return ResponseCompressionMiddleware(lambda request: response)(request)
+
+
+class AcceptedEncodingTests(SimpleTestCase):
+    """Test Accept-Encoding negotiation"""
+
+    def test_accepted_encoding(self):
+        """Test brotli is preferred and weights are honoured"""
+        self.assertEqual(accepted_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(accepted_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(accepted_encoding('br;q=0.5, gzip'), 'gzip')
+        self.assertEqual(accepted_encoding('GZIP;q=0.8'), 'gzip')
+        self.assertEqual(accepted_encoding('*'), 'br')
+        self.assertEqual(accepted_encoding('*, br;q=0'), 'gzip')
+        self.assertIsNone(accepted_encoding('gzip;q=0, br;q=0'))
+        self.assertIsNone(accepted_encoding('gzip;q=invalid'))
+        self.assertIsNone(accepted_encoding('identity'))
+        self.assertIsNone(accepted_encoding(''))
+
+
+class ResponseCompressionMiddlewareTests(SimpleTestCase):
+    """Test which responses are compressed and how"""
+
+    def json_response(self, body=BODY, **kwargs):
+        return HttpResponse(body, content_type='application/json', **kwargs)
+
+    def test_brotli(self):
+        """Test a large JSON body is compressed with brotli"""
+        response = compressed_response(self.json_response())
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(BODY) / 10)
+        self.assertEqual(brotli.decompress(response.content), BODY)
+
+    def test_gzip(self):
+        """Test gzip is used for clients without brotli"""
+        response = compressed_response(self.json_response(), 'gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), BODY)
+
+    def test_levels(self):
+        """Test the configured level is used"""
+        with override_settings(COMPRESSION={'GZIP_LEVEL': 1}):
+            fast = compressed_response(self.json_response(), 'gzip').content
+        with override_settings(COMPRESSION={'GZIP_LEVEL': 9}):
+            small = compressed_response(self.json_response(), 'gzip').content
+
+        self.assertEqual(fast, gzip.compress(BODY, compresslevel=1, mtime=0))
+        self.assertEqual(small, gzip.compress(BODY, compresslevel=9, mtime=0))
+
+    def test_not_accepted(self):
+        """Test a client without a supported encoding gets the body as it is"""
+        response = compressed_response(self.json_response(), 'identity')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, BODY)
+
+    def test_skipped_responses(self):
+        """Test small bodies, HTML, encoded and disabled responses are left as they are"""
+        small = compressed_response(self.json_response(BODY[:1000]))
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertFalse(small.has_header('Vary'))
+
+        html = compressed_response(HttpResponse(BODY, content_type='text/html'))
+        self.assertFalse(html.has_header('Content-Encoding'))
+
+        response = self.json_response(headers={'Content-Encoding': 'identity'})
+        self.assertEqual(compressed_response(response)['Content-Encoding'], 'identity')
+
+        with override_settings(COMPRESSION={'ENABLED': False}):
+            self.assertFalse(compressed_response(self.json_response()).has_header('Content-Encoding'))
+
+        with override_settings(COMPRESSION={'MIN_SIZE': 100}):
+            self.assertEqual(compressed_response(self.json_response(BODY[:1000]))['Content-Encoding'], 'br')
+
+    def test_incompressible_body(self):
+        """Test a body which would grow is sent as it is"""
+        body = os.urandom(2048)
+        response = compressed_response(HttpResponse(body, content_type='text/plain'), 'gzip')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, body)
+
+    def test_weak_etag(self):
+        """Test a strong ETag becomes weak"""
+        response = compressed_response(self.json_response(headers={'ETag': '"abc"'}))
+
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    def test_streaming(self):
+        """Test every streamed chunk can be decoded as soon as it is received"""
+        chunks = [BODY[:3000], BODY[3000:6000], BODY[6000:]]
+        for encoding in ('br', 'gzip'):
+            response = StreamingHttpResponse(iter(chunks), content_type='text/csv; charset=utf-8')
+            response = compressed_response(response, encoding)
+
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertFalse(response.has_header('Content-Length'))
+
+            if encoding == 'br':
+                decompressor = brotli.Decompressor()
+                decompress = decompressor.process
+            else:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                decompress = decompressor.decompress
+            decoded = []
+            for chunk, compressed in zip(chunks, response.streaming_content):
+                decoded.append(decompress(compressed))
+                self.assertEqual(decoded[-1], chunk)
+            self.assertEqual(b''.join(decoded), BODY)
+
+    def test_streaming_disabled(self):
+        """Test streamed bodies are left as they are without STREAMING"""
+        response = StreamingHttpResponse(iter([BODY]), content_type='application/json')
+        with override_settings(COMPRESSION={'STREAMING': False}):
+            response = compressed_response(response)
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class CompressedApiTests(TestCase):
+    """Test compression of API responses"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('testaccount', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Accounting.objects.bulk_create(
+            Accounting(user=self.user, date=date(2021, 1, day % 28 + 1), type='outcome', amount=day, title='lunch')
+            for day in range(100)
+        )
+
+    def test_accounting_list(self):
+        """Test the accounting list is compressed and revalidated with its weak ETag"""
+        url = reverse('accounting:accounting-list')
+        params = {'from': '2021-01-01', 'end': '2021-01-31'}
+        plain = self.client.get(url, params)
+
+        res = self.client.get(url, params, HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(res.content), plain.content)
+
+        res = self.client.get(url, params, HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+        streamed = self.client.get(url, {**params, 'stream': '1'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(streamed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(streamed.streaming_content)), plain.content)
@@ -0,0 +1,125 @@
+"""
+Test the request metrics
+"""
+import json
+import tempfile
+
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.metrics import MetricsFileStore, empty_route_metrics, get_metrics_registry, render_prometheus
+
+
+METRICS_URL = reverse('dev:metrics')
+CATEGORY_URL = reverse('accounting:category-list')
+
+
+class RequestMetricsTests(TestCase):
+    """Test the middleware and the metrics endpoint"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.enterContext(override_settings(METRICS={'DIRECTORY': self.directory.name, 'FLUSH_INTERVAL': 0}))
+
+        self.user = get_user_model().objects.create_user('testaccount', 'testpass123', name='testuser')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.staff = get_user_model().objects.create_user('staff', 'testpass123', is_staff=True)
+        self.staff_client = APIClient()
+        self.staff_client.force_authenticate(self.staff)
+
+    def route_metrics(self, route, method='GET'):
+        routes, _ = get_metrics_registry().collect()
+        return routes[(route, method)]
+
+    def test_request_is_recorded(self):
+        """Test latency, SQL, size and status are recorded per route"""
+        res = self.client.get(CATEGORY_URL)
+
+        metrics = self.route_metrics('accounting:category-list')
+        self.assertEqual(metrics['count'], 1)
+        self.assertEqual(metrics['statuses'], {'200': 1})
+        self.assertGreater(metrics['sql_queries'], 0)
+        self.assertGreater(metrics['duration_seconds'], 0)
+        self.assertEqual(metrics['response_bytes'], len(res.content))
+        self.assertEqual(metrics['buckets'][-1], 1)
+
+    def test_unmatched_route(self):
+        """Test requests without a route share one label"""
+        self.client.get('/api/no-such-route')
+
+        self.assertEqual(self.route_metrics('unmatched')['statuses'], {'404': 1})
+
+    def test_streamed_response_size(self):
+        """Test the size of a streamed response is added once it is sent"""
+        res = self.client.get(reverse('reports:get_year_reports', args=[2023]), {'download': 1})
+        size = len(b''.join(res.streaming_content))
+
+        self.assertEqual(self.route_metrics('reports:get_year_reports')['response_bytes'], size)
+
+    def test_flush_writes_process_file(self):
+        """Test every process writes its counters to its own file"""
+        self.client.get(CATEGORY_URL)
+
+        files = list(Path(self.directory.name).glob('*.json'))
+        self.assertEqual(len(files), 1)
+        routes = json.loads(files[0].read_text())['routes']
+        self.assertIn('accounting:category-list', [metrics['route'] for metrics in routes])
+
+    def test_collect_merges_other_processes(self):
+        """Test the counters written by other worker processes are added"""
+        self.client.get(CATEGORY_URL)
+        registry = get_metrics_registry()
+        other = MetricsFileStore(self.directory.name, retention=60)
+        other.path = Path(self.directory.name) / 'other-worker.json'
+        other.write(registry.snapshot())
+
+        routes, processes = registry.collect()
+
+        self.assertEqual(processes, 2)
+        self.assertEqual(routes[('accounting:category-list', 'GET')]['count'], 2)
+
+    def test_prometheus_endpoint(self):
+        """Test staff read the metrics in the Prometheus text format"""
+        self.client.get(CATEGORY_URL)
+
+        res = self.staff_client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = res.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_requests_total{route="accounting:category-list",method="GET",status="200"} 1', body)
+        self.assertIn(
+            'http_request_duration_seconds_bucket{route="accounting:category-list",method="GET",le="+Inf"} 1', body
+        )
+        self.assertIn('http_request_sql_queries_total{route="accounting:category-list",method="GET"}', body)
+        self.assertIn('http_response_size_bytes_total{route="accounting:category-list",method="GET"}', body)
+
+    def test_endpoint_is_staff_only(self):
+        """Test other users cannot read the metrics"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_disabled(self):
+        """Test nothing is recorded when metrics are disabled"""
+        with override_settings(METRICS={'ENABLED': False}):
+            self.client.get(CATEGORY_URL)
+            res = self.staff_client.get(METRICS_URL)
+
+            self.assertIsNone(get_metrics_registry())
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_label_escaping(self):
+        """Test label values are escaped"""
+        routes = {('a"b\\c', 'GET'): empty_route_metrics()}
+
+        self.assertIn('route="a\\"b\\\\c"', render_prometheus(routes, 1))
@@ -3,8 +3,10 @@ Test for models
 """
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from core import models
+from core.versions import bump_data_versions, get_data_version
 
 
 def create_user(account='testaccount', password='testpass123'):
@@ -72,4 +74,24 @@ class ModelTests(TestCase):
         )
 
         self.assertEqual(category.user, user)
-        self.assertEqual(str(category), category.name)
\ No newline at end of file
+        self.assertEqual(str(category), category.name)
+
+    def test_user_save_keeps_separately_saved_fields(self):
+        """Test saving a user read earlier keeps the current data version and profiling time"""
+        user = create_user()
+        bump_data_versions([user.pk])
+        until = timezone.now()
+        get_user_model().objects.filter(pk=user.pk).update(profile_requests_until=until)
+
+        user.name = 'new name'
+        user.save()
+
+        user.refresh_from_db()
+        self.assertEqual(user.name, 'new name')
+        self.assertEqual(get_data_version(user), 1)
+        self.assertEqual(user.profile_requests_until, until)
+
+        user.profile_requests_until = None
+        user.save(update_fields=['profile_requests_until'])
+        user.refresh_from_db()
+        self.assertIsNone(user.profile_requests_until)
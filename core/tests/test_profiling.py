@@ -0,0 +1,212 @@
+"""
+Test request profiling and the slow query log
+"""
+import marshal
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import CachedTokenAuthentication, reset_token_cache
+from core.models import Accounting, Category, RequestProfile
+from core.profiling import profiled_users
+
+
+TYPE_COST_URL = reverse('charts:type_cost')
+CATEGORY_URL = reverse('accounting:category-list')
+PROFILES_URL = reverse('dev:profiles')
+
+
+def profile_url(profile_id):
+    return reverse('dev:profile', args=[profile_id])
+
+
+def token_client(user):
+    """Return a client sending the user's token, the profiling middleware reads tokens only"""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+    return client
+
+
+class RequestProfilingTests(TestCase):
+    """Test profiled requests are stored"""
+
+    def setUp(self):
+        reset_token_cache()
+        self.user = get_user_model().objects.create_user('testaccount', 'testpass123', name='testuser')
+        self.staff = get_user_model().objects.create_user('staff', 'testpass123', is_staff=True)
+        self.client = token_client(self.user)
+        self.staff_client = token_client(self.staff)
+        accounting = Accounting.objects.create(
+            user=self.user, date=timezone.now().date(), type='outcome', amount=100, title='午餐',
+        )
+        accounting.category.add(Category.objects.create(user=self.user, name='食'))
+
+    def test_requests_are_not_profiled_by_default(self):
+        """Test no profile is stored without the header or the user flag"""
+        res = self.staff_client.get(CATEGORY_URL)
+
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_header_profiles_staff_request(self):
+        """Test staff profile their requests with the header"""
+        res = self.staff_client.get(CATEGORY_URL, HTTP_X_PROFILE='1')
+
+        profile = RequestProfile.objects.get(pk=res['X-Profile-Id'])
+        self.assertEqual(profile.user, self.staff)
+        self.assertEqual(profile.route, 'accounting:category-list')
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.query_count, len(profile.queries))
+        self.assertTrue(any('core_category' in query['sql'] for query in profile.queries))
+        self.assertIn('function calls', profile.summary)
+        self.assertIsInstance(marshal.loads(bytes(profile.stats)), dict)
+
+    def test_header_is_ignored_for_other_users(self):
+        """Test users and anonymous clients cannot profile their own requests"""
+        with mock.patch('core.profiling.cProfile.Profile') as profile:
+            res = self.client.get(CATEGORY_URL, HTTP_X_PROFILE='1')
+            APIClient().get(CATEGORY_URL, HTTP_X_PROFILE='1')
+            APIClient().get(CATEGORY_URL, HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Token invalid')
+
+        self.assertNotIn('X-Profile-Id', res)
+        profile.assert_not_called()
+
+    @override_settings(PROFILING={'EXPLAIN_THRESHOLD_MS': 0})
+    def test_slow_statements_are_explained(self):
+        """Test statements over the threshold get their plan"""
+        res = self.staff_client.get(CATEGORY_URL, HTTP_X_PROFILE='1')
+
+        queries = RequestProfile.objects.get(pk=res['X-Profile-Id']).queries
+        selects = [query for query in queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        self.assertTrue(all(query['explain'] for query in selects))
+
+    def test_profile_user(self):
+        """Test staff profile the requests of a user for a while"""
+        res = self.staff_client.post(reverse('dev:profile_user', args=[self.user.id]), {'minutes': 5})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(TYPE_COST_URL, {'from': '2000-01-01', 'end': '2099-12-31'})
+
+        profile = RequestProfile.objects.get(pk=res['X-Profile-Id'])
+        self.assertEqual(profile.user, self.user)
+        self.assertEqual(profile.route, 'charts:type_cost')
+
+        res = self.staff_client.delete(reverse('dev:profile_user', args=[self.user.id]))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        res = self.client.get(CATEGORY_URL)
+        self.assertNotIn('X-Profile-Id', res)
+
+    def test_expired_profiling(self):
+        """Test users are not profiled once their profiling time is over"""
+        self.user.profile_requests_until = timezone.now() - timedelta(minutes=1)
+        self.user.save()
+
+        res = self.client.get(CATEGORY_URL)
+
+        self.assertNotIn('X-Profile-Id', res)
+
+    def test_token_is_authenticated_once(self):
+        """Test profiling reads the user DRF authenticated instead of authenticating again"""
+        self.staff_client.get(CATEGORY_URL)
+        self.user.profile_requests_until = timezone.now() + timedelta(minutes=5)
+        self.user.save(update_fields=['profile_requests_until'])
+
+        authenticate = CachedTokenAuthentication.authenticate_credentials
+        with mock.patch.object(
+            CachedTokenAuthentication, 'authenticate_credentials', autospec=True, side_effect=authenticate,
+        ) as authenticate_credentials:
+            res = self.client.get(CATEGORY_URL)
+
+        self.assertIn('X-Profile-Id', res)
+        self.assertEqual(authenticate_credentials.call_count, 1)
+
+    def test_profiled_users_are_cached(self):
+        """Test the profiled users are cached and refreshed when the flag is saved"""
+        with self.assertNumQueries(0):
+            self.assertEqual(profiled_users(), {})
+
+        self.user.profile_requests_until = timezone.now() + timedelta(minutes=5)
+        self.user.save(update_fields=['profile_requests_until'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(profiled_users(), {self.user.id: self.user.profile_requests_until})
+
+    def test_other_users_are_not_profiled(self):
+        """Test requests of other users are not profiled while a user is"""
+        self.user.profile_requests_until = timezone.now() + timedelta(minutes=5)
+        self.user.save(update_fields=['profile_requests_until'])
+
+        with mock.patch('core.profiling.cProfile.Profile') as profile:
+            res = self.staff_client.get(CATEGORY_URL)
+            APIClient().get(CATEGORY_URL)
+
+        self.assertNotIn('X-Profile-Id', res)
+        profile.assert_not_called()
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_uncached_token_is_profiled(self):
+        """Test the first request of a profiled user is profiled before its token is cached"""
+        self.user.profile_requests_until = timezone.now() + timedelta(minutes=5)
+        self.user.save(update_fields=['profile_requests_until'])
+        reset_token_cache()
+
+        res = self.client.get(CATEGORY_URL)
+
+        self.assertEqual(RequestProfile.objects.get(pk=res['X-Profile-Id']).user, self.user)
+
+    def test_list_and_download_profiles(self):
+        """Test staff list, read and download profiles"""
+        profile_id = self.staff_client.get(CATEGORY_URL, HTTP_X_PROFILE='1')['X-Profile-Id']
+
+        res = self.staff_client.get(PROFILES_URL, {'user': self.staff.id})
+        self.assertEqual([profile['id'] for profile in res.data], [int(profile_id)])
+
+        res = self.staff_client.get(profile_url(profile_id))
+        self.assertIn('queries', res.data)
+        self.assertIn('summary', res.data)
+
+        res = self.staff_client.get(profile_url(profile_id), {'download': 1})
+        self.assertEqual(res['Content-Type'], 'application/octet-stream')
+        self.assertIn('profile-', res['Content-Disposition'])
+        self.assertIsInstance(marshal.loads(res.content), dict)
+
+    def test_profiles_are_staff_only(self):
+        """Test other users cannot read profiles or profile users"""
+        self.assertEqual(self.client.get(PROFILES_URL).status_code, status.HTTP_403_FORBIDDEN)
+        res = self.client.post(reverse('dev:profile_user', args=[self.user.id]))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SlowQueryLogTests(TestCase):
+    """Test slow statements are logged"""
+
+    def setUp(self):
+        reset_token_cache()
+        self.user = get_user_model().objects.create_user('testaccount', 'testpass123', name='testuser')
+        self.client = token_client(self.user)
+
+    @override_settings(PROFILING={'SLOW_QUERY_MS': 0})
+    def test_slow_queries_are_logged(self):
+        """Test the route, user and SQL of slow statements are logged"""
+        with self.assertLogs('core.slow_queries', level='WARNING') as logs:
+            self.client.get(CATEGORY_URL)
+
+        record = logs.records[-1]
+        self.assertEqual(record.route, 'accounting:category-list')
+        self.assertEqual(record.user_id, self.user.id)
+        self.assertIn('SELECT', record.sql)
+
+    def test_fast_queries_are_not_logged(self):
+        """Test statements under the threshold are not logged"""
+        with self.assertNoLogs('core.slow_queries', level='WARNING'):
+            self.client.get(CATEGORY_URL)
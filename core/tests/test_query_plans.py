@@ -0,0 +1,136 @@
+"""
+Test that the accounting read paths are served by index range scans
+"""
+import re
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Accounting
+from reports.exports import generate_csv
+
+
+ACCOUNTING_INDEXES = ('accounting_user_date_idx', 'accounting_user_type_date_idx')
+# SQLite backs unique constraints created with the table by an autoindex
+DAILY_SUMMARY_INDEXES = ('dailysummary_user_day_uniq', 'sqlite_autoindex_core_dailysummary')
+MONTHLY_SUMMARY_INDEXES = ('monthlysummary_user_month_uniq', 'sqlite_autoindex_core_monthlysummary')
+
+
+def table_re(table):
+    """Return a pattern matching queries reading from the given table"""
+    return re.compile(rf'FROM [`"]?{table}[`"]?(\s|$)')
+
+
+def explain(sql):
+    """Return the backend query plan for a captured SQL statement as text"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+
+class AccountingQueryPlanTests(TestCase):
+    """Test the main query of each read endpoint uses an index range scan"""
+
+    def setUp(self):
+        # Chart responses cached by earlier tests would hide the queries
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('testaccount', 'testpass123')
+        self.other_user = get_user_model().objects.create_user('testaccount2', 'testpass123')
+        self.client.force_authenticate(self.user)
+
+        start = date(2023, 1, 1)
+        records = []
+        for offset in range(0, 730, 3):
+            for user in (self.user, self.other_user):
+                records.append(Accounting(
+                    user=user,
+                    date=start + timedelta(days=offset),
+                    type='income' if offset % 2 else 'outcome',
+                    amount=100 + offset,
+                    title='test title',
+                ))
+        Accounting.objects.bulk_create(records)
+
+    def assertUsesIndex(self, captured, table='core_accounting', indexes=ACCOUNTING_INDEXES):
+        """Assert every captured query on the table uses one of the indexes"""
+        pattern = table_re(table)
+        statements = [
+            query['sql'] for query in captured.captured_queries
+            if pattern.search(query['sql'])
+        ]
+        self.assertTrue(statements, f'No query on {table} was executed')
+
+        for sql in statements:
+            plan = explain(sql)
+            self.assertTrue(
+                any(index in plan for index in indexes),
+                f'Query does not use an index of {table}:\n{sql}\n{plan}',
+            )
+            if connection.vendor == 'mysql':
+                self.assertNotRegex(plan, r'\bALL\b')
+            elif connection.vendor == 'sqlite':
+                self.assertNotIn(f'SCAN {table}', plan)
+
+    def test_accounting_list_uses_index(self):
+        """Test the accounting list query is an index range scan"""
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('accounting:accounting-list'), {'from': '2024-03-01', 'end': '2024-03-31'})
+
+        self.assertUsesIndex(captured)
+
+    def test_accounting_cursor_page_uses_index(self):
+        """Test a deep cursor page is an index range scan without a sort"""
+        url = reverse('accounting:accounting-list')
+        params = {'from': '2023-01-01', 'end': '2024-12-31', 'page_size': 20}
+        for _ in range(5):
+            res = self.client.get(url, params)
+            params['cursor'] = parse_qs(urlparse(res.data['next']).query)['cursor'][0]
+
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(url, params)
+
+        self.assertUsesIndex(captured)
+        plan = explain(captured.captured_queries[0]['sql'])
+        self.assertNotIn('filesort', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_range_cost_uses_index(self):
+        """Test the range cost chart reads the daily summaries by index range"""
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('charts:range_cost'), {'from': '2024-03-01', 'end': '2024-03-31'})
+
+        self.assertUsesIndex(captured, 'core_dailysummary', DAILY_SUMMARY_INDEXES)
+
+    def test_target_uses_index(self):
+        """Test the month target achieved amounts are an indexed monthly summary lookup"""
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('charts:target', args=[2024, 3]))
+
+        self.assertUsesIndex(captured, 'core_monthlysummary', MONTHLY_SUMMARY_INDEXES)
+
+    def test_compare_cost_uses_index(self):
+        """Test the compare cost totals are indexed summary reads"""
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('charts:compare_cost'), {'from': '2024-03-01', 'end': '2024-03-31'})
+
+        self.assertUsesIndex(captured, 'core_monthlysummary', MONTHLY_SUMMARY_INDEXES)
+        self.assertUsesIndex(captured, 'core_dailysummary', DAILY_SUMMARY_INDEXES)
+
+    def test_generate_csv_uses_index(self):
+        """Test the report query is an index range scan for month and year reports"""
+        with CaptureQueriesContext(connection) as captured:
+            generate_csv(self.user, 2024, 3)
+            generate_csv(self.user, 2023)
+
+        self.assertUsesIndex(captured)
+        # The totals are added up from the streamed rows
+        self.assertFalse([query for query in captured if 'core_monthlysummary' in query['sql']])
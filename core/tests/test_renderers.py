@@ -0,0 +1,137 @@
+"""
+Test the orjson renderer and parser
+"""
+import io
+
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+
+
+PAYLOAD = {
+    'from': '2023-01-01',
+    'data': [
+        {
+            'id': 1,
+            'date': date(2023, 1, 5),
+            'created': datetime(2023, 1, 5, 12, 30, 15, 123456, tzinfo=timezone.utc),
+            'naive': datetime(2023, 1, 5, 12, 30),
+            'time': time(8, 15, 30, 250000),
+            'duration': timedelta(hours=1, seconds=5),
+            'amount': Decimal('120.50'),
+            'uuid': UUID('12345678-1234-5678-1234-567812345678'),
+            'title': '午餐 "便當"\n',
+            'category': [{'id': 1, 'name': '食'}, {'id': 2, 'name': '衣'}, {'id': 3, 'name': '住'}],
+            'ratio': 0.1,
+            'flags': (True, False, None),
+        },
+    ],
+    'label': gettext_lazy('Invalid date format'),
+    1: 'integer key',
+    'separators': 'line\u2028paragraph\u2029',
+}
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test the renderer output matches JSONRenderer"""
+
+    def assertSameRendering(self, data, accepted_media_type=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_same_bytes(self):
+        """Test dates, decimals, non-ASCII and lazy strings render the same bytes"""
+        self.assertSameRendering(PAYLOAD)
+
+    def test_non_ascii_is_not_escaped(self):
+        """Test category names are written as UTF-8"""
+        self.assertIn('食'.encode(), ORJSONRenderer().render({'name': '食'}))
+
+    def test_line_separators_are_escaped(self):
+        """Test U+2028 and U+2029 are escaped like JSONRenderer"""
+        rendered = ORJSONRenderer().render({'text': '\u2028\u2029'})
+
+        self.assertEqual(rendered, b'{"text":"\\u2028\\u2029"}')
+
+    def test_indent(self):
+        """Test an indent requested by the client is honoured"""
+        self.assertSameRendering(PAYLOAD, 'application/json; indent=4')
+
+    def test_large_integer(self):
+        """Test integers orjson cannot encode fall back to JSONRenderer"""
+        self.assertSameRendering({'amount': 2 ** 70})
+
+    def test_none(self):
+        """Test None renders an empty body"""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test the parser matches JSONParser"""
+
+    def parse(self, parser, body, encoding='utf-8'):
+        return parser().parse(io.BytesIO(body), 'application/json', {'encoding': encoding})
+
+    def test_same_data(self):
+        """Test bodies parse to the same data"""
+        body = '[{"date":"2023-01-05","amount":120,"title":"午餐","category":[{"name":"食"}],"rate":1.5}]'.encode()
+
+        self.assertEqual(self.parse(ORJSONParser, body), self.parse(JSONParser, body))
+
+    def test_other_encoding(self):
+        """Test bodies in other encodings are decoded"""
+        body = '{"name":"食"}'.encode('utf-16')
+
+        self.assertEqual(self.parse(ORJSONParser, body, 'utf-16'), {'name': '食'})
+
+    def test_invalid_body(self):
+        """Test invalid bodies raise the same parse error"""
+        for body in (b'{"name": ', b'', b'{"amount": NaN}'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    self.parse(JSONParser, body)
+                with self.assertRaises(ParseError) as raised:
+                    self.parse(ORJSONParser, body)
+                self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_large_integer(self):
+        """Test integers orjson cannot decode fall back to JSONParser"""
+        self.assertEqual(self.parse(ORJSONParser, b'{"amount": 1180591620717411303424}'), {'amount': 2 ** 70})
+
+
+class ORJSONApiTests(TestCase):
+    """Test the API renders and parses with orjson"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('testaccount', 'testpass123', name='testuser')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_and_list(self):
+        """Test records round trip through the orjson parser and renderer"""
+        payload = {'date': '2023-01-05', 'type': 'outcome', 'amount': 120, 'title': '午餐',
+                   'category': [{'name': '食'}]}
+        res = self.client.post(reverse('accounting:accounting-list'), payload, format='json')
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client.get(reverse('accounting:accounting-list'), {'from': '2023-01-01', 'end': '2023-01-31'})
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertIsInstance(res.accepted_renderer, ORJSONRenderer)
+        self.assertIn('"name":"食"'.encode(), res.content)
+        self.assertEqual(res.json()['data'][0]['title'], '午餐')
@@ -0,0 +1,371 @@
+"""
+Test the summary tables are kept current on accounting writes
+"""
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import pre_save
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Accounting, Category, CategoryMonthlySummary, DailySummary, MonthlySummary
+from core import summaries, versions
+from core.summaries import category_totals, period_totals
+
+
+def create_user(account='testaccount', password='testpass123'):
+    """Helper function to create a user"""
+    return get_user_model().objects.create_user(account, password)
+
+
+def create_accounting(user, **params):
+    """Helper function to create an accounting object"""
+    default = {
+        'date': date(2024, 3, 1),
+        'type': 'income',
+        'amount': 1000,
+        'title': 'test title',
+    }
+    default.update(params)
+
+    return Accounting.objects.create(user=user, **default)
+
+
+class DailySummaryTests(TestCase):
+    """Test the daily summaries follow accounting writes"""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def assertDaily(self, day, income, outcome, count, user=None):
+        """Assert the stored daily summary of a day"""
+        summary = DailySummary.objects.get(user=user or self.user, day=day)
+        self.assertEqual(
+            (summary.income, summary.outcome, summary.count),
+            (income, outcome, count),
+        )
+
+    def test_create_accounting_updates_summary(self):
+        """Test creating accountings adds them to the daily summary"""
+        create_accounting(self.user, amount=1000)
+        create_accounting(self.user, type='outcome', amount=300)
+        create_accounting(self.user, date='2024-03-02', amount=50)
+
+        self.assertDaily(date(2024, 3, 1), 1000, 300, 2)
+        self.assertDaily(date(2024, 3, 2), 50, 0, 1)
+
+    def test_update_accounting_moves_between_days(self):
+        """Test changing the date of an accounting updates both days"""
+        create_accounting(self.user, amount=1000)
+        accounting = create_accounting(self.user, amount=200)
+
+        accounting = Accounting.objects.get(id=accounting.id)
+        accounting.date = date(2024, 3, 5)
+        accounting.type = 'outcome'
+        accounting.save()
+
+        self.assertDaily(date(2024, 3, 1), 1000, 0, 1)
+        self.assertDaily(date(2024, 3, 5), 0, 200, 1)
+
+    def test_delete_accounting_removes_empty_day(self):
+        """Test deleting the last accounting of a day removes its summary"""
+        accounting = create_accounting(self.user)
+
+        accounting.delete()
+
+        self.assertFalse(DailySummary.objects.filter(user=self.user).exists())
+
+    def test_bulk_create_updates_summary(self):
+        """Test bulk creating accountings updates the daily summaries"""
+        Accounting.objects.bulk_create([
+            Accounting(user=self.user, date=date(2024, 3, 1), type='income', amount=100),
+            Accounting(user=self.user, date=date(2024, 3, 1), type='outcome', amount=40),
+            Accounting(user=self.user, date=date(2024, 3, 2), type='income', amount=10),
+        ])
+
+        self.assertDaily(date(2024, 3, 1), 100, 40, 2)
+        self.assertDaily(date(2024, 3, 2), 10, 0, 1)
+
+    def test_queryset_update_and_delete_update_summary(self):
+        """Test queryset update and delete refresh the touched days"""
+        create_accounting(self.user, amount=100)
+        create_accounting(self.user, date='2024-03-02', amount=200)
+
+        Accounting.objects.filter(user=self.user).update(date=date(2024, 3, 3))
+
+        self.assertEqual(DailySummary.objects.filter(user=self.user).count(), 1)
+        self.assertDaily(date(2024, 3, 3), 300, 0, 2)
+
+        Accounting.objects.filter(user=self.user).delete()
+
+        self.assertFalse(DailySummary.objects.filter(user=self.user).exists())
+
+    def test_summary_limited_to_user(self):
+        """Test the summaries of one user ignore other users' accountings"""
+        other_user = create_user(account='testaccount2')
+        create_accounting(self.user, amount=100)
+        create_accounting(other_user, amount=999)
+
+        self.assertDaily(date(2024, 3, 1), 100, 0, 1)
+        self.assertDaily(date(2024, 3, 1), 999, 0, 1, user=other_user)
+
+    def test_delete_user_deletes_summaries(self):
+        """Test deleting a user removes its accountings and summaries"""
+        create_accounting(self.user)
+
+        self.user.delete()
+
+        self.assertFalse(DailySummary.objects.exists())
+
+    def test_rebuild_daily_summaries(self):
+        """Test the rebuild command recomputes the daily summaries"""
+        create_accounting(self.user, amount=100)
+        create_accounting(self.user, type='outcome', amount=30)
+        DailySummary.objects.all().delete()
+        DailySummary.objects.create(user=self.user, day=date(2020, 1, 1), income=1)
+
+        call_command('rebuild_daily_summaries', account=['testaccount'])
+
+        self.assertEqual(DailySummary.objects.filter(user=self.user).count(), 1)
+        self.assertDaily(date(2024, 3, 1), 100, 30, 2)
+
+
+class MonthlySummaryTests(TestCase):
+    """Test the monthly summaries follow accounting writes"""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def assertMonthly(self, year, month, income, outcome):
+        """Assert the stored monthly summary of a month"""
+        summary = MonthlySummary.objects.get(user=self.user, year=year, month=month)
+        self.assertEqual((summary.income, summary.outcome), (income, outcome))
+
+    def test_create_accounting_updates_summary(self):
+        """Test creating accountings adds them to the monthly summary"""
+        create_accounting(self.user, date='2024-03-01', amount=1000)
+        create_accounting(self.user, date='2024-03-31', type='outcome', amount=300)
+        create_accounting(self.user, date='2024-04-01', amount=50)
+
+        self.assertMonthly(2024, 3, 1000, 300)
+        self.assertMonthly(2024, 4, 50, 0)
+
+    def test_update_accounting_moves_between_months(self):
+        """Test changing the date of an accounting updates both months"""
+        accounting = create_accounting(self.user, date='2024-03-10', amount=200)
+
+        accounting.date = date(2024, 5, 10)
+        accounting.save()
+
+        self.assertFalse(MonthlySummary.objects.filter(user=self.user, month=3).exists())
+        self.assertMonthly(2024, 5, 200, 0)
+
+    def test_bulk_create_updates_summary(self):
+        """Test bulk creating accountings updates the monthly summaries"""
+        Accounting.objects.bulk_create([
+            Accounting(user=self.user, date=date(2023, 12, 31), type='outcome', amount=100),
+            Accounting(user=self.user, date=date(2024, 1, 1), type='income', amount=40),
+            Accounting(user=self.user, date=date(2024, 1, 20), type='income', amount=10),
+        ])
+
+        self.assertMonthly(2023, 12, 0, 100)
+        self.assertMonthly(2024, 1, 50, 0)
+
+    def test_period_totals(self):
+        """Test period totals for month aligned and unaligned ranges"""
+        create_accounting(self.user, date='2023-12-31', amount=1)
+        create_accounting(self.user, date='2024-01-01', amount=10)
+        create_accounting(self.user, date='2024-02-29', type='outcome', amount=100)
+        create_accounting(self.user, date='2024-03-01', amount=1000)
+
+        self.assertEqual(
+            period_totals(self.user, date(2024, 1, 1), date(2024, 2, 29)),
+            {'income': 10, 'outcome': 100},
+        )
+        self.assertEqual(
+            period_totals(self.user, date(2023, 12, 31), date(2024, 1, 1)),
+            {'income': 11, 'outcome': 0},
+        )
+        self.assertEqual(
+            period_totals(self.user, date(2025, 1, 1), date(2025, 1, 31)),
+            {'income': 0, 'outcome': 0},
+        )
+
+    def test_rebuild_monthly_summaries(self):
+        """Test the rebuild command recomputes the monthly summaries"""
+        create_accounting(self.user, date='2024-03-01', amount=100)
+        create_accounting(self.user, date='2024-03-02', type='outcome', amount=30)
+        MonthlySummary.objects.all().delete()
+
+        call_command('rebuild_monthly_summaries')
+
+        self.assertMonthly(2024, 3, 100, 30)
+
+
+class CategoryMonthlySummaryTests(TestCase):
+    """Test the category summaries follow accounting and category writes"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.food = Category.objects.create(user=self.user, name='食')
+        self.rent = Category.objects.create(user=self.user, name='住')
+
+    def amounts(self, year=2024, month=3, type='outcome'):
+        """Return the stored category amounts of a month by category name"""
+        rows = CategoryMonthlySummary.objects.filter(
+            user=self.user, year=year, month=month, type=type,
+        )
+        return {row.category.name: row.amount for row in rows}
+
+    def test_add_and_remove_categories(self):
+        """Test adding and removing categories updates the category summary"""
+        accounting = create_accounting(self.user, type='outcome', amount=100)
+        accounting.category.add(self.food, self.rent)
+
+        self.assertEqual(self.amounts(), {'食': 100, '住': 100})
+
+        accounting.category.remove(self.rent)
+        self.assertEqual(self.amounts(), {'食': 100})
+
+        accounting.category.clear()
+        self.assertEqual(self.amounts(), {})
+
+    def test_reverse_category_changes(self):
+        """Test changing accountings from the category side updates the summary"""
+        first = create_accounting(self.user, type='outcome', amount=100)
+        second = create_accounting(self.user, date='2024-04-01', type='outcome', amount=50)
+
+        self.food.accounting_set.add(first, second)
+        self.assertEqual(self.amounts(), {'食': 100})
+        self.assertEqual(self.amounts(month=4), {'食': 50})
+
+        self.food.accounting_set.clear()
+        self.assertEqual(self.amounts(), {})
+        self.assertEqual(self.amounts(month=4), {})
+
+    def test_update_accounting_amount(self):
+        """Test changing the amount or type of an accounting updates the summary"""
+        accounting = create_accounting(self.user, type='outcome', amount=100)
+        accounting.category.add(self.food)
+
+        accounting.amount = 70
+        accounting.save()
+        self.assertEqual(self.amounts(), {'食': 70})
+
+        accounting.type = 'income'
+        accounting.save()
+        self.assertEqual(self.amounts(), {})
+        self.assertEqual(self.amounts(type='income'), {'食': 70})
+
+    def test_delete_category_deletes_summary(self):
+        """Test deleting a category removes its summaries"""
+        accounting = create_accounting(self.user, type='outcome', amount=100)
+        accounting.category.add(self.food)
+
+        self.food.delete()
+
+        self.assertEqual(self.amounts(), {})
+
+    def test_category_totals(self):
+        """Test category totals for month aligned and unaligned ranges"""
+        march = create_accounting(self.user, date='2024-03-05', type='outcome', amount=100)
+        march.category.add(self.food)
+        april = create_accounting(self.user, date='2024-04-05', type='outcome', amount=30)
+        april.category.add(self.food, self.rent)
+        income = create_accounting(self.user, date='2024-03-06', type='income', amount=999)
+        income.category.add(self.rent)
+
+        self.assertEqual(
+            category_totals(self.user, date(2024, 3, 1), date(2024, 4, 30)),
+            {'食': 130, '住': 30},
+        )
+        self.assertEqual(
+            category_totals(self.user, date(2024, 3, 2), date(2024, 4, 4)),
+            {'食': 100},
+        )
+
+    def test_rebuild_category_summaries(self):
+        """Test the rebuild command recomputes the category summaries"""
+        accounting = create_accounting(self.user, type='outcome', amount=100)
+        accounting.category.add(self.food)
+        CategoryMonthlySummary.objects.all().delete()
+
+        call_command('rebuild_category_summaries')
+
+        self.assertEqual(self.amounts(), {'食': 100})
+
+
+class SummaryLockTests(TestCase):
+    """Test concurrent writes of a user are serialized before the summaries are read"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.events = []
+
+    def record(self, name, function):
+        """Return a mock of a function recording its calls in self.events"""
+        def wrapper(*args, **kwargs):
+            self.events.append(name)
+            return function(*args, **kwargs)
+
+        return mock.Mock(side_effect=wrapper)
+
+    def test_refresh_locks_users_first(self):
+        """Test the users are locked before the summaries are recomputed"""
+        other = create_user('otheraccount')
+        lock = self.record('lock', versions.lock_data_versions)
+        daily = self.record('daily', summaries.refresh_daily_summaries)
+
+        with mock.patch('core.summaries.lock_data_versions', lock), \
+                mock.patch('core.summaries.refresh_daily_summaries', daily):
+            summaries.refresh({(other.pk, date(2024, 3, 1)), (self.user.pk, date(2024, 3, 2))})
+
+        self.assertEqual(self.events, ['lock', 'daily'])
+        self.assertEqual(sorted(lock.call_args.args[0]), sorted([self.user.pk, other.pk]))
+
+    def test_api_writes_lock_before_insert(self):
+        """Test creating and updating through the API locks the user before writing"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        lock = self.record('lock', versions.lock_data_versions)
+
+        def saving(sender, **kwargs):
+            self.events.append('save')
+
+        pre_save.connect(saving, sender=Accounting)
+        self.addCleanup(pre_save.disconnect, saving, sender=Accounting)
+        payload = {'date': '2024-03-01', 'type': 'income', 'amount': 100, 'title': 'salary'}
+        with mock.patch('account.serializers.lock_data_versions', lock):
+            res = client.post(reverse('accounting:accounting-list'), payload, format='json')
+            self.assertEqual(self.events, ['lock', 'save'])
+
+            self.events.clear()
+            client.patch(reverse('accounting:accounting-detail', args=[res.data['id']]), {'amount': 50})
+            self.assertEqual(self.events, ['lock', 'save'])
+
+        lock.assert_called_with([self.user.pk])
+        self.assertEqual(DailySummary.objects.get(user=self.user).income, 50)
+
+    def test_orm_writes_lock_before_insert(self):
+        """Test saves and bulk writes outside the API lock the user before writing"""
+        lock = self.record('lock', versions.lock_data_versions)
+
+        def writes(execute, sql, params, many, context):
+            if sql.startswith(('INSERT INTO "core_accounting"', 'UPDATE "core_accounting"')):
+                self.events.append('write')
+            return execute(sql, params, many, context)
+
+        with mock.patch('core.versions.lock_data_versions', lock), connection.execute_wrapper(writes):
+            accounting = Accounting.objects.create(user=self.user, date=date(2024, 3, 1), type='income', amount=100)
+            Accounting.objects.bulk_create([
+                Accounting(user=self.user, date=date(2024, 3, 2), type='income', amount=10),
+            ])
+            Accounting.objects.filter(pk=accounting.pk).update(amount=50)
+
+        self.assertEqual(self.events, ['lock', 'write'] * 3)
+        self.assertEqual(list(lock.call_args.args[0]), [self.user.pk])
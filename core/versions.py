@@ -0,0 +1,44 @@
+"""
+Per-user data versions, bumped whenever a user's accounting data changes
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import F
+
+
+def bump_data_versions(user_ids):
+    """Increment the data version of the given users"""
+    user_ids = set(user_ids)
+    if user_ids:
+        get_user_model().objects.filter(pk__in=user_ids).update(data_version=F('data_version') + 1)
+
+
+def lock_data_versions(user_ids):
+    """Lock the rows of the given users until the end of the transaction
+
+    Serializes the accounting writes of a user: a transaction refreshing the
+    summaries waits here for another one to commit, then reads its rows.
+    Writers lock before inserting, on InnoDB the foreign key check of an
+    insert holds a shared lock on the user row which would otherwise
+    deadlock with this one. Must run inside a transaction.
+    """
+    user_ids = sorted(set(user_ids))
+    if user_ids:
+        # Always in the same order, so two transactions never wait on each other
+        list(get_user_model().objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('pk'))
+
+
+def get_data_version(user):
+    """Return the current data version of a user
+
+    Read from the database on every call, request.user may come from the
+    token cache and carry an older value.
+    """
+    return get_user_model().objects.filter(pk=user.pk).values_list('data_version', flat=True).first() or 0
+
+
+def request_data_version(request):
+    """Return the data version of the request user, read once per request"""
+    if not hasattr(request, '_data_version'):
+        request._data_version = get_data_version(request.user)
+
+    return request._data_version
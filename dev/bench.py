@@ -0,0 +1,321 @@
+"""
+In-process endpoint benchmarks through the Django test client
+"""
+import importlib
+import math
+import statistics
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLResolver, reverse
+
+from rest_framework.authtoken.models import Token
+
+from charts.cache import get_chart_cache_config
+from core.metrics import QueryTimer
+from core.models import Accounting, Category, MonthTarget, SaveMoneyTarget
+from dev.seed import seed_user
+from reports.exports import store_report
+from reports.jobs import enqueue_report_job
+from reports.storage import get_report_storage
+
+
+BENCH_ITERATIONS = 20
+BENCH_WARMUP = 2
+PERCENTILES = (50, 95, 99)
+
+# URL modules covered by the benchmark
+BENCH_URL_MODULES = ('account.urls', 'charts.urls', 'reports.urls')
+
+# Routes without a scenario, with the reason
+SKIPPED_ROUTES = {
+    'reports:get_monthly_analysis': 'calls an external chat completion provider',
+}
+
+IMPORT_CSV_ROWS = 20
+
+
+class Scenario:
+    """One request sent to a route, `expected` is the status of a successful response"""
+
+    def __init__(self, name, route, method, path, data=None, expected=200, **extra):
+        self.name = name
+        self.route = route
+        self.method = method
+        self.path = path
+        self.data = data
+        self.expected = expected
+        self.extra = extra
+
+    def send(self, client):
+        """Send the request and return the response with its content fully read"""
+        data = self.data() if callable(self.data) else self.data
+        response = getattr(client, self.method)(self.path, data, **self.extra)
+        if response.streaming:
+            # Streamed reports are produced while the body is consumed
+            response.content_length = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            response.content_length = len(response.content)
+        return response
+
+
+def iter_route_names(urlconf_module):
+    """Yield the namespaced names of the routes of a URL module"""
+    module = importlib.import_module(urlconf_module)
+    namespace = getattr(module, 'app_name', None)
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns)
+            elif pattern.name:
+                yield f'{namespace}:{pattern.name}' if namespace else pattern.name
+
+    yield from dict.fromkeys(walk(module.urlpatterns))
+
+
+def bench_routes():
+    """Return the names of every route the benchmark should cover"""
+    return [name for module in BENCH_URL_MODULES for name in iter_route_names(module)]
+
+
+def import_csv_file(year, month):
+    """Return a small CSV upload in the report layout"""
+    rows = ['年,月,日,類別,類型,標題,收入,支出']
+    rows += [f'{year},{month},{day % 28 + 1},食,支出,匯入 {day},,{day * 10}' for day in range(IMPORT_CSV_ROWS)]
+    return ('\n'.join(rows) + '\n').encode('utf-8')
+
+
+def prepare_fixture(user, year, month):
+    """Create the objects the scenarios refer to and return them by name"""
+    category = Category.objects.filter(user=user).order_by('id').first()
+    if category is None:
+        category = Category.objects.create(user=user, name='食')
+    accounting = Accounting.objects.filter(user=user).order_by('id').first()
+    if accounting is None:
+        accounting = Accounting.objects.create(
+            user=user, date=date(year, month, 1), type='outcome', amount=100, title='bench',
+        )
+    month_target, _ = MonthTarget.objects.get_or_create(
+        user=user, year=year, month=month, defaults={'income': 50000, 'outcome': 30000},
+    )
+    save_target, _ = SaveMoneyTarget.objects.get_or_create(
+        user=user, category=category,
+        defaults={'target': 10000, 'from_date': date(year, 1, 1), 'end_date': date(year, 12, 31)},
+    )
+    # Stored first, so the job is done and the report routes read the stored copy
+    report_key = store_report(user, year, month)
+
+    return {
+        'category': category,
+        'accounting': accounting,
+        'month_target': month_target,
+        'save_target': save_target,
+        'job': enqueue_report_job(user, year, month),
+        'report_path': get_report_storage().url(report_key),
+    }
+
+
+def build_scenarios(user, year, month):
+    """Return the benchmark scenarios for a seeded user
+
+    Reads come before writes, so the writes do not invalidate the cached
+    responses of the reads while they are measured.
+    """
+    fixture = prepare_fixture(user, year, month)
+    category_id = fixture['category'].id
+    month_range = {'from': date(year, month, 1).isoformat(), 'end': date(year, month, 28).isoformat()}
+    year_range = {'from': date(year, 1, 1).isoformat(), 'end': date(year, 12, 31).isoformat()}
+    record = {
+        'date': date(year, month, 15).isoformat(), 'type': 'outcome', 'amount': 120,
+        'title': 'bench', 'category': [{'name': fixture['category'].name}],
+    }
+
+    def upload():
+        return {'file': SimpleUploadedFile('bench.csv', import_csv_file(year, month), content_type='text/csv')}
+
+    return [
+        Scenario('api_root', 'accounting:api-root', 'get', reverse('accounting:api-root')),
+        Scenario('accounting_list_month', 'accounting:accounting-list', 'get',
+                 reverse('accounting:accounting-list'), month_range),
+        Scenario('accounting_list_year', 'accounting:accounting-list', 'get',
+                 reverse('accounting:accounting-list'), year_range),
+        Scenario('accounting_detail', 'accounting:accounting-detail', 'get',
+                 reverse('accounting:accounting-detail', args=[fixture['accounting'].id])),
+        Scenario('category_list', 'accounting:category-list', 'get', reverse('accounting:category-list')),
+        Scenario('category_detail', 'accounting:category-detail', 'get',
+                 reverse('accounting:category-detail', args=[category_id])),
+        Scenario('month_target_list', 'accounting:month_target-list', 'get',
+                 reverse('accounting:month_target-list')),
+        Scenario('month_target_detail', 'accounting:month_target-detail', 'get',
+                 reverse('accounting:month_target-detail', args=[fixture['month_target'].id])),
+        Scenario('month_target_by_year_month', 'accounting:month-target-by-year-month', 'get',
+                 reverse('accounting:month-target-by-year-month', args=[year, month])),
+        Scenario('save_money_target_list', 'accounting:save_money_target-list', 'get',
+                 reverse('accounting:save_money_target-list')),
+        Scenario('save_money_target_detail', 'accounting:save_money_target-detail', 'get',
+                 reverse('accounting:save_money_target-detail', args=[fixture['save_target'].id])),
+        Scenario('save_money_target_by_category', 'accounting:save-money-target-by-category', 'get',
+                 reverse('accounting:save-money-target-by-category', args=[category_id])),
+        Scenario('charts_range_cost', 'charts:range_cost', 'get', reverse('charts:range_cost'), year_range),
+        Scenario('charts_target', 'charts:target', 'get', reverse('charts:target', args=[year, month])),
+        Scenario('charts_type_cost', 'charts:type_cost', 'get', reverse('charts:type_cost'), year_range),
+        Scenario('charts_compare_cost', 'charts:compare_cost', 'get', reverse('charts:compare_cost'), month_range),
+        Scenario('charts_save_target', 'charts:save_target', 'get', reverse('charts:save_target', args=[category_id])),
+        Scenario('charts_cache_stats', 'charts:cache_stats', 'get', reverse('charts:cache_stats')),
+        Scenario('report_month', 'reports:get_month_reports', 'get',
+                 reverse('reports:get_month_reports', args=[year, month])),
+        Scenario('report_month_download', 'reports:get_month_reports', 'get',
+                 reverse('reports:get_month_reports', args=[year, month]), {'download': 1}),
+        Scenario('report_year_download', 'reports:get_year_reports', 'get',
+                 reverse('reports:get_year_reports', args=[year]), {'download': 1}),
+        Scenario('report_job', 'reports:report_job', 'get', reverse('reports:report_job', args=[fixture['job'].id])),
+        Scenario('report_file', 'reports:report_file', 'get', fixture['report_path']),
+        Scenario('accounting_create', 'accounting:accounting-list', 'post',
+                 reverse('accounting:accounting-list'), record, expected=201, content_type='application/json'),
+        Scenario('accounting_update', 'accounting:accounting-detail', 'patch',
+                 reverse('accounting:accounting-detail', args=[fixture['accounting'].id]),
+                 {'amount': 150}, content_type='application/json'),
+        Scenario('accounting_bulk', 'accounting:accounting-bulk', 'post',
+                 reverse('accounting:accounting-bulk'), [record] * 100, expected=201,
+                 content_type='application/json'),
+        Scenario('category_create', 'accounting:category-list', 'post', reverse('accounting:category-list'),
+                 lambda: {'name': f'bench-{time.perf_counter_ns()}'}, expected=201, content_type='application/json'),
+        Scenario('report_import', 'reports:import_csv', 'post', reverse('reports:import_csv'), upload, expected=201),
+    ]
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def best_time(function, repeat, clock=time.perf_counter):
+    """Return the best time of `repeat` calls in seconds and the result of the last call"""
+    best = None
+    for _ in range(repeat):
+        started = clock()
+        result = function()
+        elapsed = clock() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_memory(function):
+    """Return the peak of memory allocated while calling `function`, in bytes"""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def token_client(user):
+    """Return a test client sending the token of a user"""
+    token, _ = Token.objects.get_or_create(user=user)
+    return Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+@contextmanager
+def bench_user(account, start_year=None, years=0, per_day=0):
+    """Create a benchmark user with `years` of seeded records from `start_year`
+
+    Everything written inside the block, the user included, is rolled back
+    at the end, and the test client host is allowed meanwhile.
+    """
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), transaction.atomic():
+        user = get_user_model().objects.create_user(account, 'benchpass123', name=account)
+        if years:
+            seed_user(user, start_year, years, per_day, seed=0)
+        yield user
+        transaction.set_rollback(True)
+
+
+def measure(client, scenario, iterations=BENCH_ITERATIONS, warmup=BENCH_WARMUP, cold=False):
+    """Run a scenario and return its latency, SQL and memory statistics
+
+    Latency and SQL are measured on `iterations` requests after `warmup`
+    unmeasured ones. Peak memory is measured on one extra request, since
+    tracemalloc slows down everything it traces. With `cold` the chart
+    cache is cleared before every request.
+    """
+    cache = caches[get_chart_cache_config()['CACHE_ALIAS']]
+
+    def send():
+        if cold:
+            cache.clear()
+        return scenario.send(client)
+
+    for _ in range(warmup):
+        send()
+
+    latencies, queries, sql_times, statuses, sizes = [], [], [], {}, []
+    for _ in range(iterations):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = send()
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(timer.count)
+        sql_times.append(timer.seconds * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        sizes.append(response.content_length)
+
+    tracemalloc.start()
+    try:
+        send()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'route': scenario.route,
+        'method': scenario.method.upper(),
+        'path': scenario.path,
+        'requests': iterations,
+        'errors': iterations - statuses.get(scenario.expected, 0),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'latency_ms': {
+            **{f'p{percent}': round(percentile(latencies, percent), 3) for percent in PERCENTILES},
+            'mean': round(statistics.fmean(latencies), 3),
+        },
+        'queries': round(statistics.fmean(queries), 2),
+        'sql_ms': round(statistics.fmean(sql_times), 3),
+        'response_bytes': round(statistics.fmean(sizes)),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmark(user, year, month, iterations=BENCH_ITERATIONS, warmup=BENCH_WARMUP, cold=False, only=None):
+    """Benchmark every covered route as a seeded user and return the report
+
+    `only` limits the run to the scenarios whose name contains it. Routes of
+    BENCH_URL_MODULES without a scenario are listed under "skipped".
+    """
+    client = token_client(user)
+    scenarios = build_scenarios(user, year, month)
+
+    covered = {scenario.route for scenario in scenarios}
+    skipped = {
+        route: SKIPPED_ROUTES.get(route, 'no benchmark scenario')
+        for route in bench_routes() if route not in covered
+    }
+
+    endpoints = {
+        scenario.name: measure(client, scenario, iterations, warmup, cold)
+        for scenario in scenarios if not only or only in scenario.name
+    }
+
+    return {'endpoints': endpoints, 'skipped': skipped}
@@ -0,0 +1,371 @@
+"""
+Asyncio load generator replaying a mix of API calls over HTTP
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.urls import reverse
+
+from dev.bench import PERCENTILES, percentile
+
+
+# Relative weight of each kind of call
+LOAD_MIX = {'list': 40, 'chart': 35, 'create': 10, 'report': 10, 'category': 5}
+# Upper bounds of the latency histogram buckets in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+CHART_ROUTES = ('charts:range_cost', 'charts:type_cost', 'charts:compare_cost')
+CREATE_CATEGORIES = ('食', '行', '樂')
+SERVER_START_TIMEOUT = 30
+
+
+class HttpConnection:
+    """A keep-alive HTTP/1.1 client connection"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    @classmethod
+    async def open(cls, host, port, ssl=False):
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl or None)
+        return cls(reader, writer)
+
+    def close(self):
+        self.reusable = False
+        self.writer.close()
+
+    async def request(self, method, target, headers, body=b''):
+        """Send a request and return the status code and body of the response
+
+        Raises ConnectionResetError when the server closed the connection
+        before answering.
+        """
+        lines = [f'{method} {target} HTTP/1.1', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by the server')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = await self.read_chunked()
+        elif status in (204, 304) or method == 'HEAD':
+            content = b''
+        else:
+            # Without a length the body ends with the connection
+            content = await self.reader.read()
+            self.reusable = False
+
+        if response_headers.get('connection', '').lower() == 'close':
+            self.reusable = False
+        return status, content
+
+    async def read_chunked(self):
+        """Return the body of a response sent with chunked transfer encoding"""
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # Skip the trailer
+                while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+
+class ConnectionPool:
+    """Keep-alive connections to a server, at most `size` requests in flight"""
+
+    def __init__(self, base_url, size, timeout):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f'Unsupported URL {base_url!r}, expected http:// or https://')
+        self.ssl = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.host_header = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(size)
+        self.idle = []
+
+    async def request(self, method, path, token=None, data=None):
+        """Send a JSON request and return the status code and body of the response"""
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        headers = {'Host': self.host_header, 'Accept': 'application/json'}
+        if body:
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Token {token}'
+
+        async with self.semaphore:
+            return await asyncio.wait_for(self.send(method, self.prefix + path, headers, body), self.timeout)
+
+    async def send(self, method, target, headers, body):
+        """Send a request on an idle connection, or a new one when the server closed the idle ones"""
+        while self.idle:
+            connection = self.idle.pop()
+            try:
+                return self.release(connection, await connection.request(method, target, headers, body))
+            except (ConnectionResetError, asyncio.IncompleteReadError):
+                # The server dropped the idle connection, try the next one
+                connection.close()
+            except BaseException:
+                connection.close()
+                raise
+
+        connection = await HttpConnection.open(self.host, self.port, self.ssl)
+        try:
+            return self.release(connection, await connection.request(method, target, headers, body))
+        except BaseException:
+            connection.close()
+            raise
+
+    def release(self, connection, result):
+        """Keep a connection for the next request if the server allows it"""
+        if connection.reusable:
+            self.idle.append(connection)
+        else:
+            connection.close()
+        return result
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().close()
+
+
+class LatencyHistogram:
+    """Latencies of a kind of call with their status codes and errors"""
+
+    def __init__(self):
+        self.latencies = []
+        self.status_codes = {}
+        self.errors = 0
+
+    def record(self, milliseconds, status=None):
+        """Record a response, or a failed request when status is None"""
+        self.latencies.append(milliseconds)
+        key = str(status) if status is not None else 'error'
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+        if status is None or status >= 400:
+            self.errors += 1
+
+    def merge(self, other):
+        self.latencies += other.latencies
+        self.errors += other.errors
+        for key, count in other.status_codes.items():
+            self.status_codes[key] = self.status_codes.get(key, 0) + count
+
+    def snapshot(self):
+        """Return the counts, percentiles and cumulative bucket counts"""
+        count = len(self.latencies)
+        data = {
+            'requests': count,
+            'errors': self.errors,
+            'error_rate': round(self.errors / count, 4) if count else 0.0,
+            'status_codes': dict(sorted(self.status_codes.items())),
+        }
+        if not count:
+            return data
+
+        buckets = {str(bound): sum(latency <= bound for latency in self.latencies) for bound in LATENCY_BUCKETS_MS}
+        buckets['+Inf'] = count
+        data['latency_ms'] = {
+            **{f'p{percent}': round(percentile(self.latencies, percent), 3) for percent in PERCENTILES},
+            'mean': round(statistics.fmean(self.latencies), 3),
+            'max': round(max(self.latencies), 3),
+            'buckets': buckets,
+        }
+        return data
+
+
+def parse_mix(value):
+    """Return the weights of a 'kind=weight,...' mix"""
+    mix = {}
+    for item in value.split(','):
+        kind, _, weight = item.partition('=')
+        kind = kind.strip()
+        if kind not in LOAD_MIX:
+            raise ValueError(f'Unknown call {kind!r}, expected one of {", ".join(LOAD_MIX)}')
+        try:
+            mix[kind] = int(weight)
+        except ValueError:
+            raise ValueError(f'Invalid weight {weight!r} for {kind}')
+        if mix[kind] < 0:
+            raise ValueError(f'Negative weight for {kind}')
+    if not any(mix.values()):
+        raise ValueError('The mix needs a positive weight')
+    return mix
+
+
+def mix_request(kind, rng, year):
+    """Return the method, path and JSON body of a call of a kind"""
+    month = rng.randint(1, 12)
+    month_range = {'from': f'{year}-{month:02d}-01', 'end': f'{year}-{month:02d}-28'}
+
+    if kind == 'list':
+        return 'GET', f"{reverse('accounting:accounting-list')}?{urlencode(month_range)}", None
+    if kind == 'chart':
+        return 'GET', f'{reverse(rng.choice(CHART_ROUTES))}?{urlencode(month_range)}', None
+    if kind == 'create':
+        record = {
+            'date': f'{year}-{month:02d}-{rng.randint(1, 28):02d}',
+            'type': 'outcome',
+            'amount': rng.randint(50, 2000),
+            'title': 'load test',
+            'category': [{'name': rng.choice(CREATE_CATEGORIES)}],
+        }
+        return 'POST', reverse('accounting:accounting-list'), record
+    if kind == 'report':
+        return 'GET', reverse('reports:get_month_reports', args=[year, month]), None
+    return 'GET', reverse('accounting:category-list'), None
+
+
+async def login(pool, accounts, password):
+    """Log in every account and return their tokens
+
+    Raises ValueError listing the accounts which could not log in.
+    """
+    async def token(account):
+        status, content = await pool.request('POST', reverse('auth:login'), data={
+            'account': account,
+            'password': password,
+        })
+        return json.loads(content)['token'] if status == 200 else None
+
+    tokens = await asyncio.gather(*(token(account) for account in accounts))
+    failed = [account for account, key in zip(accounts, tokens) if key is None]
+    if failed:
+        raise ValueError(f'Could not log in {", ".join(failed)}')
+    return tokens
+
+
+async def run_load(base_url, accounts, password, rps, duration, year, mix=LOAD_MIX, concurrency=64,
+                   seed=0, timeout=30):
+    """Replay the call mix at `rps` requests per second for `duration` seconds
+
+    Requests are sent on a fixed schedule whether or not earlier ones have
+    completed, and latency is measured from the scheduled time, so a slow
+    server shows up as latency instead of a lower request rate. At most
+    `concurrency` requests are in flight, later ones wait for a connection.
+    """
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    histograms = {kind: LatencyHistogram() for kind in kinds if mix[kind]}
+    pool = ConnectionPool(base_url, concurrency, timeout)
+
+    try:
+        login_started = time.perf_counter()
+        tokens = await login(pool, accounts, password)
+        login_seconds = time.perf_counter() - login_started
+
+        async def call(scheduled, kind, token, method, path, data):
+            try:
+                status, _ = await pool.request(method, path, token, data)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                status = None
+            histograms[kind].record((time.perf_counter() - scheduled) * 1000, status)
+
+        tasks = []
+        started = time.perf_counter()
+        for index in range(max(int(rps * duration), 1)):
+            scheduled = started + index / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind = rng.choices(kinds, weights)[0]
+            tasks.append(asyncio.create_task(
+                call(scheduled, kind, rng.choice(tokens), *mix_request(kind, rng, year))
+            ))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.close()
+
+    total = LatencyHistogram()
+    for histogram in histograms.values():
+        total.merge(histogram)
+
+    return {
+        'target_rps': rps,
+        'duration_s': round(elapsed, 3),
+        'users': len(accounts),
+        'login_s': round(login_seconds, 3),
+        'throughput_rps': round(len(total.latencies) / elapsed, 2),
+        **total.snapshot(),
+        'calls': {kind: histogram.snapshot() for kind, histogram in histograms.items()},
+    }
+
+
+def free_port(host):
+    """Return a TCP port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, host, port, processes):
+    """Start runserver or uwsgi on host:port and return the process once it accepts connections
+
+    Raises RuntimeError when the server exits or does not start listening
+    within SERVER_START_TIMEOUT seconds.
+    """
+    if kind == 'uwsgi':
+        # Same worker model as Accounting_uwsgi.ini, with an HTTP socket
+        command = [
+            'uwsgi', '--http', f'{host}:{port}', '--module', 'accounting.wsgi', '--master',
+            '--processes', str(processes), '--chdir', str(settings.BASE_DIR), '--disable-logging',
+        ]
+    else:
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', f'{host}:{port}', '--noreload']
+
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{kind} exited with code {process.returncode}')
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+
+    stop_server(process)
+    raise RuntimeError(f'{kind} did not listen on {host}:{port} within {SERVER_START_TIMEOUT}s')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
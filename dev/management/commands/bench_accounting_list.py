@@ -0,0 +1,69 @@
+"""
+Django command to compare the serializer and the values read path of the accounting list
+"""
+import json
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.reads import ACCOUNTING_LIST_FIELDS, accounting_list_data, stream_accounting_list
+from account.serializers import AccountingSerializer
+from core.models import Accounting
+from core.renderers import ORJSONRenderer
+from dev.bench import best_time, bench_user, peak_memory
+
+
+class Command(BaseCommand):
+    """Django command to measure rows/sec of the accounting list representations"""
+    help = (
+        'Compare rows/sec of AccountingSerializer and account.reads on a seeded accounting list, '
+        'and the peak memory of a rendered and a streamed response'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=1, help='Years of seeded records')
+        parser.add_argument('--per-day', type=int, default=10, help='Seeded records per day')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per read path, the best is kept')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        if min(options['years'], options['per_day'], options['repeat']) < 1:
+            raise CommandError('--years, --per-day and --repeat must be positive')
+
+        start_year = date.today().year - options['years']
+        # The dataset is rolled back at the end
+        with bench_user('bench-list', start_year, options['years'], options['per_day']) as user:
+            queryset = Accounting.objects.filter(user=user).order_by('-date', '-id')
+
+            # Both paths include their queries, as the list endpoint does
+            paths = {
+                'serializer': lambda: AccountingSerializer(queryset.prefetch_related('category'), many=True).data,
+                'values': lambda: accounting_list_data(queryset.values(*ACCOUNTING_LIST_FIELDS)),
+            }
+            results = {name: best_time(function, options['repeat']) for name, function in paths.items()}
+
+            envelope = {'from': f'{start_year}-01-01', 'end': f'{start_year + options["years"] - 1}-12-31'}
+            rows = queryset.values(*ACCOUNTING_LIST_FIELDS)
+            responses = {
+                'rendered': lambda: ORJSONRenderer().render({**envelope, 'data': accounting_list_data(rows)}),
+                # Chunks are dropped once counted, as once sent to the client
+                'streamed': lambda: sum(len(chunk) for chunk in stream_accounting_list(envelope, rows)),
+            }
+            memory = {name: peak_memory(function) for name, function in responses.items()}
+
+        (_, expected), (_, data) = results.values()
+        if data != expected:
+            raise CommandError('The read paths do not return the same data')
+
+        rows = len(data)
+        report = {
+            'rows': rows,
+            **{
+                name: {'ms': round(seconds * 1000, 3), 'rows_per_s': round(rows / seconds)}
+                for name, (seconds, _) in results.items()
+            },
+            'speedup': round(results['serializer'][0] / results['values'][0], 2),
+            'peak_memory_kb': {name: round(peak / 1024) for name, peak in memory.items()},
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,112 @@
+"""
+Django command to benchmark the API endpoints in process
+"""
+import json
+import platform
+import tempfile
+
+from datetime import date
+
+import django
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from dev.bench import BENCH_ITERATIONS, BENCH_WARMUP, run_benchmark
+from dev.seed import seed_user
+
+
+class Command(BaseCommand):
+    """Django command to measure latency, SQL and memory of every API route"""
+    help = (
+        'Seed a dataset, request every route of the accounting, charts and reports APIs through '
+        'the test client and print p50/p95/p99 latency, SQL and peak memory per endpoint as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1, help='Seeded users, requests are sent as the first')
+        parser.add_argument('--years', type=int, default=1, help='Years of records per user')
+        parser.add_argument('--per-day', type=int, default=3, help='Records per day')
+        parser.add_argument('--start-year', type=int, default=date.today().year - 1, help='First year of records')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the dataset')
+        parser.add_argument('--iterations', type=int, default=BENCH_ITERATIONS, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=BENCH_WARMUP, help='Unmeasured requests per endpoint')
+        parser.add_argument('--cold', action='store_true', help='Clear the chart cache before every request')
+        parser.add_argument('--only', help='Only run the endpoints whose name contains this')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        if min(options['users'], options['years'], options['per_day'], options['iterations']) < 1:
+            raise CommandError('--users, --years, --per-day and --iterations must be positive')
+        if options['warmup'] < 0:
+            raise CommandError('--warmup must not be negative')
+
+        year = options['start_year'] + options['years'] - 1
+        # Reports are kept in a scratch directory instead of the configured storage
+        with tempfile.TemporaryDirectory() as report_root, override_settings(
+            REPORT_STORAGE_BACKEND='reports.storage.LocalReportStorage',
+            REPORT_STORAGE_ROOT=report_root,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        ):
+            # The dataset and everything the requests write are rolled back at the end
+            with transaction.atomic():
+                users = self.seed(options)
+                result = run_benchmark(
+                    users[0],
+                    year=year,
+                    month=6,
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    cold=options['cold'],
+                    only=options['only'],
+                )
+                transaction.set_rollback(True)
+
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'dataset': {
+                'users': options['users'],
+                'years': options['years'],
+                'records_per_day': options['per_day'],
+                'records': sum(user.records for user in users),
+                'seed': options['seed'],
+            },
+            'iterations': options['iterations'],
+            'warmup': options['warmup'],
+            'cache': 'cold' if options['cold'] else 'warm',
+            **result,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+            self.stderr.write(f"Wrote {len(result['endpoints'])} endpoints to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def seed(self, options):
+        """Create the benchmark users with their records"""
+        users = []
+        for index in range(options['users']):
+            account = f'bench-api-{index}'
+            # The first user also reads the staff-only routes
+            user = get_user_model().objects.create_user(account, 'benchpass123', name=account, is_staff=index == 0)
+            user.records = seed_user(
+                user,
+                start_year=options['start_year'],
+                years=options['years'],
+                records_per_day=options['per_day'],
+                seed=f"{options['seed']}:{index}",
+            )
+            users.append(user)
+            self.stderr.write(f'{account}: {user.records} records')
+
+        return users
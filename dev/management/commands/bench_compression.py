@@ -0,0 +1,86 @@
+"""
+Django command to measure response compression per endpoint
+"""
+import json
+import time
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.compression import compress
+from dev.bench import best_time, bench_user, token_client
+
+
+# (encoding, gzip level or brotli quality) pairs compared on every payload
+LEVELS = (('gzip', 1), ('gzip', 6), ('gzip', 9), ('br', 1), ('br', 5), ('br', 11))
+
+
+class Command(BaseCommand):
+    """Django command to measure compressed size and CPU time of API responses"""
+    help = 'Compare payload size and CPU time of gzip and brotli levels on the largest API responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=1, help='Years of seeded records')
+        parser.add_argument('--per-day', type=int, default=5, help='Seeded records per day')
+        parser.add_argument('--repeat', type=int, default=5, help='Compressions per payload and level')
+
+    def payloads(self, user, start_year, end_year):
+        """Return the uncompressed bodies of the measured endpoints, by name"""
+        client = token_client(user)
+        year_range = {'from': f'{end_year}-01-01', 'end': f'{end_year}-12-31'}
+        all_range = {'from': f'{start_year}-01-01', 'end': f'{end_year}-12-31'}
+        month_range = {'from': f'{end_year}-06-01', 'end': f'{end_year}-06-30'}
+        requests = {
+            'accounting_list_month': (reverse('accounting:accounting-list'), month_range),
+            'accounting_list_year': (reverse('accounting:accounting-list'), year_range),
+            'accounting_list_all': (reverse('accounting:accounting-list'), all_range),
+            'category_list': (reverse('accounting:category-list'), {}),
+            'charts_range_cost_all': (reverse('charts:range_cost'), all_range),
+            'charts_type_cost_all': (reverse('charts:type_cost'), all_range),
+            'charts_compare_cost_year': (reverse('charts:compare_cost'), year_range),
+        }
+
+        payloads = {}
+        for name, (path, params) in requests.items():
+            response = client.get(path, params)
+            if response.status_code != 200:
+                raise CommandError(f'{name} answered {response.status_code}')
+            payloads[name] = response.content
+        return payloads
+
+    def measure(self, body, encoding, level, repeat):
+        """Return the compressed size and the best CPU time of compressing a body"""
+        config = {'GZIP_LEVEL': level, 'BROTLI_QUALITY': level}
+        best, compressed = best_time(lambda: compress(body, encoding, config), repeat, clock=time.process_time)
+
+        return {
+            'bytes': len(compressed),
+            'ratio': round(len(body) / len(compressed), 2),
+            'cpu_ms': round(best * 1000, 3),
+        }
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        if min(options['years'], options['per_day'], options['repeat']) < 1:
+            raise CommandError('--years, --per-day and --repeat must be positive')
+
+        end_year = date.today().year - 1
+        start_year = end_year - options['years'] + 1
+
+        # The dataset is rolled back at the end
+        with bench_user('bench-compression', start_year, options['years'], options['per_day']) as user:
+            payloads = self.payloads(user, start_year, end_year)
+
+        report = {
+            name: {
+                'bytes': len(body),
+                **{
+                    f'{encoding}-{level}': self.measure(body, encoding, level, options['repeat'])
+                    for encoding, level in LEVELS
+                },
+            }
+            for name, body in payloads.items()
+        }
+        self.stdout.write(json.dumps(report, indent=2))
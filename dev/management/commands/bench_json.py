@@ -0,0 +1,108 @@
+"""
+Django command to compare the JSON renderers and parsers on API payloads
+"""
+import io
+import json
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+from dev.bench import best_time, bench_user, token_client
+
+
+RENDERERS = (JSONRenderer, ORJSONRenderer)
+PARSERS = (JSONParser, ORJSONParser)
+
+
+class Command(BaseCommand):
+    """Django command to measure JSON rendering and parsing throughput"""
+    help = 'Compare bytes/sec of JSONRenderer and ORJSONRenderer on the list and chart payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=3, help='Years of seeded records')
+        parser.add_argument('--per-day', type=int, default=5, help='Seeded records per day')
+        parser.add_argument('--repeat', type=int, default=20, help='Renders per payload and class')
+
+    def payloads(self, user, start_year, end_year):
+        """Return the response data of the list and chart endpoints, by name"""
+        client = token_client(user)
+        year_range = {'from': f'{end_year}-01-01', 'end': f'{end_year}-12-31'}
+        all_range = {'from': f'{start_year}-01-01', 'end': f'{end_year}-12-31'}
+        requests = {
+            'accounting_list_year': (reverse('accounting:accounting-list'), year_range),
+            'accounting_list_all': (reverse('accounting:accounting-list'), all_range),
+            'charts_range_cost_all': (reverse('charts:range_cost'), all_range),
+            'charts_type_cost_all': (reverse('charts:type_cost'), all_range),
+            'charts_compare_cost_year': (reverse('charts:compare_cost'), year_range),
+        }
+
+        payloads = {}
+        for name, (path, params) in requests.items():
+            response = client.get(path, params)
+            if response.status_code != 200:
+                raise CommandError(f'{name} answered {response.status_code}')
+            payloads[name] = response.data
+        return payloads
+
+    def compare(self, callables, size, repeat):
+        """Return the time and throughput of each class and the speedup of the last over the first"""
+        seconds = {name: best_time(function, repeat)[0] for name, function in callables.items()}
+        first, *_, last = seconds.values()
+        return {
+            'bytes': size,
+            **{
+                name: {'ms': round(value * 1000, 3), 'mb_per_s': round(size / value / 1e6, 1)}
+                for name, value in seconds.items()
+            },
+            'speedup': round(first / last, 2),
+        }
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        if min(options['years'], options['per_day'], options['repeat']) < 1:
+            raise CommandError('--years, --per-day and --repeat must be positive')
+
+        end_year = date.today().year - 1
+        start_year = end_year - options['years'] + 1
+        report = {'rendering': {}, 'parsing': {}}
+
+        # The dataset is rolled back at the end
+        with bench_user('bench-json', start_year, options['years'], options['per_day']) as user:
+            payloads = self.payloads(user, start_year, end_year)
+
+        for name, data in payloads.items():
+            rendered = [renderer().render(data, 'application/json') for renderer in RENDERERS]
+            if rendered[0] != rendered[1]:
+                raise CommandError(f'{name}: the renderers do not produce the same bytes')
+            report['rendering'][name] = self.compare(
+                {
+                    renderer.__name__: lambda renderer=renderer, data=data: renderer().render(data, 'application/json')
+                    for renderer in RENDERERS
+                },
+                len(rendered[0]),
+                options['repeat'],
+            )
+
+        # Request bodies of the bulk create endpoint
+        body = JSONRenderer().render([
+            {'date': row['date'], 'type': row['type'], 'amount': row['amount'], 'title': row['title'],
+             'category': [{'name': category['name']} for category in row['category']]}
+            for row in payloads['accounting_list_year']['data'][:1000]
+        ])
+        report['parsing']['accounting_bulk'] = self.compare(
+            {
+                parser.__name__: lambda parser=parser: parser().parse(io.BytesIO(body))
+                for parser in PARSERS
+            },
+            len(body),
+            options['repeat'],
+        )
+
+        self.stdout.write(json.dumps(report, indent=2))
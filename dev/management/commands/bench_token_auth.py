@@ -0,0 +1,55 @@
+"""
+Django command to measure the token authentication overhead per request
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.authentication import CachedTokenAuthentication, reset_token_cache
+from dev.bench import bench_user
+
+
+BENCH_ACCOUNT = 'bench-token-auth'
+
+
+class Command(BaseCommand):
+    """Django command to compare uncached and cached token authentication"""
+    help = 'Measure the per-request cost of TokenAuthentication and CachedTokenAuthentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Authenticated requests per class')
+
+    def measure(self, authentication, request, requests):
+        """Return the mean time in microseconds and queries per request"""
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            for _ in range(requests):
+                authentication.authenticate(request)
+            elapsed = time.perf_counter() - started
+
+        return elapsed / requests * 1e6, len(captured.captured_queries) / requests
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        requests = options['requests']
+        if requests < 1:
+            raise CommandError('--requests must be positive')
+
+        # The benchmark user and token are rolled back at the end
+        with bench_user(BENCH_ACCOUNT) as user:
+            token = Token.objects.create(user=user)
+            request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token.key}'))
+            reset_token_cache()
+
+            for authentication in (TokenAuthentication(), CachedTokenAuthentication()):
+                micros, queries = self.measure(authentication, request, requests)
+                self.stdout.write(
+                    f'{type(authentication).__name__}: {micros:.1f} us/request, {queries:.2f} queries/request'
+                )
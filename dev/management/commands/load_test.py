@@ -0,0 +1,89 @@
+"""
+Django command to load test the API over HTTP
+"""
+import asyncio
+import json
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dev.load import LOAD_MIX, free_port, parse_mix, run_load, start_server, stop_server
+
+
+class Command(BaseCommand):
+    """Django command to replay a mix of API calls from many users at a target rate"""
+    help = (
+        'Log in seeded users and replay a mix of list, create, chart and report calls at a target '
+        'rate against a server, then print throughput, error rate and latency histograms as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server, by default a local server is started')
+        parser.add_argument('--server', choices=('runserver', 'uwsgi'), default='runserver',
+                            help='Local server started without --url')
+        parser.add_argument('--processes', type=int, default=4, help='uwsgi worker processes')
+        parser.add_argument('--users', type=int, default=10, help='Users logged in, named <prefix>-<n>')
+        parser.add_argument('--prefix', default='seed', help='Account prefix of the seed_accounting users')
+        parser.add_argument('--password', default='seedpass123', help='Password of the users')
+        parser.add_argument('--rps', type=float, default=20, help='Target requests per second')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds of load')
+        parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight at most')
+        parser.add_argument('--mix', default=','.join(f'{kind}={weight}' for kind, weight in LOAD_MIX.items()),
+                            help='Weights of the calls, as kind=weight,...')
+        parser.add_argument('--year', type=int, default=date.today().year, help='Year the calls read and write')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the call sequence')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request fails')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        if min(options['users'], options['rps'], options['duration'], options['concurrency']) <= 0:
+            raise CommandError('--users, --rps, --duration and --concurrency must be positive')
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        process = None
+        base_url = options['url']
+        if not base_url:
+            port = free_port('127.0.0.1')
+            try:
+                process = start_server(options['server'], '127.0.0.1', port, options['processes'])
+            except (OSError, RuntimeError) as e:
+                raise CommandError(f"Could not start {options['server']}: {e}")
+            base_url = f'http://127.0.0.1:{port}'
+            self.stderr.write(f"Started {options['server']} on {base_url}")
+
+        accounts = [f"{options['prefix']}-{index}" for index in range(options['users'])]
+        try:
+            report = asyncio.run(run_load(
+                base_url,
+                accounts,
+                options['password'],
+                rps=options['rps'],
+                duration=options['duration'],
+                year=options['year'],
+                mix=mix,
+                concurrency=options['concurrency'],
+                seed=options['seed'],
+                timeout=options['timeout'],
+            ))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if process is not None:
+                stop_server(process)
+
+        report = {'url': base_url, 'server': options['server'] if process else None, **report}
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+            self.stderr.write(
+                f"{report['requests']} requests, {report['throughput_rps']} req/s, "
+                f"error rate {report['error_rate']}, written to {options['output']}"
+            )
+        else:
+            self.stdout.write(output)
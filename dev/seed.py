@@ -0,0 +1,96 @@
+"""
+Synthetic accounting data for development and load testing
+"""
+import random
+
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from account.bulk import bulk_create_accountings
+from core import summaries
+
+
+SEED_CHUNK_SIZE = 5000
+
+# (category, weight, median amount) of everyday spending
+OUTCOME_CATEGORIES = (
+    ('食', 50, 120),
+    ('行', 20, 60),
+    ('衣', 8, 800),
+    ('育', 6, 500),
+    ('樂', 12, 600),
+    ('醫療', 4, 400),
+)
+RENT_CATEGORY = '住'
+SALARY_CATEGORY = '薪水'
+BONUS_CATEGORY = '獎金'
+SIDE_INCOME_CATEGORY = '其他收入'
+
+
+def _amount(rng, median):
+    """Return a positive amount drawn around a median with a long right tail"""
+    return max(1, int(rng.lognormvariate(0, 0.6) * median))
+
+
+def iter_seed_records(rng, start, end, records_per_day):
+    """Yield the records of a user from start to end (inclusive)
+
+    Every month has a salary on the 5th and the rent on the 1st, the other
+    records of a day are mostly small outcomes with an occasional side income.
+    """
+    names, weights, medians = zip(*OUTCOME_CATEGORIES)
+    salary = rng.randrange(35000, 90000, 1000)
+    rent = rng.randrange(8000, 25000, 500)
+
+    day = start
+    while day <= end:
+        count = records_per_day
+        if day.day == 1:
+            yield {'date': day, 'type': 'outcome', 'amount': rent, 'title': '房租',
+                   'category': [{'name': RENT_CATEGORY}]}
+            count -= 1
+        if day.day == 5:
+            yield {'date': day, 'type': 'income', 'amount': salary, 'title': '薪水',
+                   'category': [{'name': SALARY_CATEGORY}]}
+            count -= 1
+            if day.month in (1, 7) and rng.random() < 0.8:
+                yield {'date': day, 'type': 'income', 'amount': salary * rng.choice((1, 2)), 'title': '獎金',
+                       'category': [{'name': BONUS_CATEGORY}]}
+
+        for _ in range(max(count, 0)):
+            if rng.random() < 0.05:
+                yield {'date': day, 'type': 'income', 'amount': _amount(rng, 1500), 'title': '副業收入',
+                       'category': [{'name': SIDE_INCOME_CATEGORY}]}
+                continue
+
+            index = rng.choices(range(len(names)), weights=weights)[0]
+            yield {'date': day, 'type': 'outcome', 'amount': _amount(rng, medians[index]),
+                   'title': f'{names[index]}支出', 'category': [{'name': names[index]}]}
+
+        day += timedelta(days=1)
+
+
+def seed_user(user, start_year, years, records_per_day, seed, chunk_size=SEED_CHUNK_SIZE):
+    """Generate records for a user and return how many were created
+
+    The same seed always produces the same records. Records are inserted in
+    chunks and the summaries are refreshed once at the end.
+    """
+    rng = random.Random(seed)
+    start = date(start_year, 1, 1)
+    end = date(start_year + years, 1, 1) - timedelta(days=1)
+
+    created = 0
+    categories = {}
+    chunk = []
+    with transaction.atomic(), summaries.batch():
+        for record in iter_seed_records(rng, start, end, records_per_day):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                created += len(bulk_create_accountings(user, chunk, categories, prefetch=False))
+                chunk = []
+        if chunk:
+            created += len(bulk_create_accountings(user, chunk, categories, prefetch=False))
+
+    return created
@@ -0,0 +1,135 @@
+"""
+Test the API benchmark command
+"""
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Accounting
+from dev.bench import SKIPPED_ROUTES, bench_routes, percentile
+
+
+class BenchApiCommandTests(TestCase):
+    """Test the bench_api command"""
+
+    def bench(self, **options):
+        """Run the command on a small dataset and return its JSON report"""
+        out = io.StringIO()
+        options = {'start_year': 2023, 'per_day': 1, 'iterations': 2, 'warmup': 0, **options}
+        call_command('bench_api', stdout=out, stderr=io.StringIO(), **options)
+        return json.loads(out.getvalue())
+
+    def test_every_route_is_benchmarked(self):
+        """Test every route answers its scenario and only known routes are skipped"""
+        report = self.bench()
+
+        self.assertEqual(report['skipped'], SKIPPED_ROUTES)
+        self.assertGreaterEqual(report['dataset']['records'], 365)
+        covered = {endpoint['route'] for endpoint in report['endpoints'].values()}
+        self.assertEqual(covered | SKIPPED_ROUTES.keys(), set(bench_routes()))
+        for name, endpoint in report['endpoints'].items():
+            self.assertEqual(endpoint['errors'], 0, f'{name}: {endpoint["status_codes"]}')
+            self.assertEqual(endpoint['requests'], 2)
+            self.assertEqual(set(endpoint['latency_ms']), {'p50', 'p95', 'p99', 'mean'})
+            self.assertGreaterEqual(endpoint['peak_memory_kb'], 0)
+
+        self.assertGreater(report['endpoints']['accounting_list_year']['queries'], 0)
+
+    def test_benchmark_data_is_rolled_back(self):
+        """Test the seeded users and the records the requests create are removed"""
+        self.bench(only='accounting_create')
+
+        self.assertFalse(get_user_model().objects.filter(account__startswith='bench-api-').exists())
+        self.assertFalse(Accounting.objects.exists())
+
+    def test_only_filters_endpoints(self):
+        """Test --only runs the matching endpoints"""
+        report = self.bench(only='charts_')
+
+        self.assertTrue(report['endpoints'])
+        self.assertTrue(all(name.startswith('charts_') for name in report['endpoints']))
+
+    def test_invalid_options(self):
+        """Test non-positive sizes are rejected"""
+        with self.assertRaises(CommandError):
+            self.bench(iterations=0)
+
+    def test_percentile(self):
+        """Test the nearest-rank percentile"""
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3, 1, 2], 95), 3)
+
+
+class BenchJsonCommandTests(TestCase):
+    """Test the bench_json command"""
+
+    def test_bench_json(self):
+        """Test every payload is timed for both renderers"""
+        out = io.StringIO()
+        call_command('bench_json', years=1, per_day=1, repeat=1, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertIn('accounting_list_year', report['rendering'])
+        self.assertIn('charts_range_cost_all', report['rendering'])
+        for result in [*report['rendering'].values(), *report['parsing'].values()]:
+            self.assertGreater(result['bytes'], 0)
+            self.assertGreater(result['speedup'], 0)
+        self.assertIn('ORJSONRenderer', report['rendering']['accounting_list_year'])
+        self.assertIn('ORJSONParser', report['parsing']['accounting_bulk'])
+
+
+class BenchAccountingListCommandTests(TestCase):
+    """Test the bench_accounting_list command"""
+
+    def test_bench_accounting_list(self):
+        """Test both read paths are timed on the same rows"""
+        out = io.StringIO()
+        call_command('bench_accounting_list', years=1, per_day=1, repeat=1, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertGreater(report['rows'], 0)
+        self.assertIn('rows_per_s', report['serializer'])
+        self.assertIn('rows_per_s', report['values'])
+        self.assertIn('streamed', report['peak_memory_kb'])
+        self.assertFalse(get_user_model().objects.filter(account='bench-list').exists())
+
+
+class BenchCompressionCommandTests(TestCase):
+    """Test the bench_compression command"""
+
+    def test_bench_compression(self):
+        """Test every payload is measured at every level"""
+        out = io.StringIO()
+        call_command('bench_compression', years=1, per_day=1, repeat=1, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertIn('accounting_list_year', report)
+        self.assertIn('charts_range_cost_all', report)
+        self.assertLess(report['accounting_list_year']['br-5']['bytes'], report['accounting_list_year']['bytes'])
+        self.assertIn('cpu_ms', report['accounting_list_year']['gzip-6'])
+
+
+class BenchTokenAuthCommandTests(TestCase):
+    """Test the bench_token_auth command"""
+
+    def test_bench_token_auth(self):
+        """Test the benchmark command reports both authentication classes"""
+        out = io.StringIO()
+
+        call_command('bench_token_auth', requests=5, stdout=out)
+
+        self.assertIn('TokenAuthentication:', out.getvalue())
+        self.assertIn('CachedTokenAuthentication:', out.getvalue())
+        self.assertFalse(get_user_model().objects.filter(account='bench-token-auth').exists())
+
+    def test_invalid_requests(self):
+        """Test a non-positive number of requests is rejected"""
+        with self.assertRaises(CommandError):
+            call_command('bench_token_auth', requests=0, stdout=io.StringIO())
@@ -0,0 +1,100 @@
+"""
+Test the HTTP load generator
+"""
+import asyncio
+import io
+import json
+import random
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+
+from core.models import Accounting
+from dev.load import LatencyHistogram, mix_request, parse_mix, run_load
+from dev.seed import seed_user
+
+
+class LoadHelperTests(SimpleTestCase):
+    """Test the mix and histogram helpers"""
+
+    def test_parse_mix(self):
+        """Test a mix is parsed into weights"""
+        self.assertEqual(parse_mix('list=3, chart=1'), {'list': 3, 'chart': 1})
+
+    def test_parse_invalid_mix(self):
+        """Test unknown calls and invalid weights are rejected"""
+        for value in ('download=1', 'list=a', 'list=-1', 'list=0'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_mix(value)
+
+    def test_mix_request(self):
+        """Test every kind of call builds a request for the year"""
+        rng = random.Random(1)
+        self.assertEqual(mix_request('create', rng, 2023)[0], 'POST')
+        self.assertTrue(mix_request('create', rng, 2023)[2]['date'].startswith('2023-'))
+        self.assertIn('/2023/', mix_request('report', rng, 2023)[1])
+        self.assertIn('from=2023-', mix_request('list', rng, 2023)[1])
+
+    def test_histogram(self):
+        """Test buckets are cumulative and failures count as errors"""
+        histogram = LatencyHistogram()
+        for latency, status in ((3, 200), (40, 200), (700, 500), (20000, None)):
+            histogram.record(latency, status)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['errors'], 2)
+        self.assertEqual(snapshot['status_codes'], {'200': 2, '500': 1, 'error': 1})
+        self.assertEqual(snapshot['latency_ms']['buckets']['5'], 1)
+        self.assertEqual(snapshot['latency_ms']['buckets']['50'], 2)
+        self.assertEqual(snapshot['latency_ms']['buckets']['10000'], 3)
+        self.assertEqual(snapshot['latency_ms']['buckets']['+Inf'], 4)
+
+
+@override_settings(REPORT_STORAGE_BACKEND='reports.storage.LocalReportStorage')
+class LoadTestCommandTests(LiveServerTestCase):
+    """Test the load_test command against a live server"""
+
+    def setUp(self):
+        self.storage_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.storage_root.cleanup)
+        self.enterContext(override_settings(REPORT_STORAGE_ROOT=self.storage_root.name))
+        for index in range(2):
+            user = get_user_model().objects.create_user(f'load-{index}', 'loadpass123')
+            seed_user(user, start_year=2023, years=1, records_per_day=1, seed=index)
+
+    def load(self, **options):
+        """Run the command against the live server and return its JSON report"""
+        out = io.StringIO()
+        options = {
+            'url': self.live_server_url, 'users': 2, 'prefix': 'load', 'password': 'loadpass123',
+            # The live server shares one in-memory database between its threads
+            'rps': 40, 'duration': 0.5, 'year': 2023, 'concurrency': 1, **options,
+        }
+        call_command('load_test', stdout=out, stderr=io.StringIO(), **options)
+        return json.loads(out.getvalue())
+
+    def test_load(self):
+        """Test the mix is replayed without errors"""
+        report = self.load(mix='list=1,chart=1,create=1,report=1,category=1')
+
+        self.assertEqual(report['requests'], 20)
+        self.assertEqual(report['errors'], 0, report['calls'])
+        self.assertEqual(report['latency_ms']['buckets']['+Inf'], 20)
+        self.assertEqual(sum(call['requests'] for call in report['calls'].values()), 20)
+        self.assertEqual(
+            Accounting.objects.filter(user__account__startswith='load-', title='load test').count(),
+            report['calls']['create']['status_codes']['201'],
+        )
+
+    def test_invalid_login(self):
+        """Test the command fails when a user cannot log in"""
+        with self.assertRaises(CommandError):
+            self.load(password='wrong')
+
+    def test_unsupported_url(self):
+        """Test only http and https URLs are accepted"""
+        with self.assertRaises(ValueError):
+            asyncio.run(run_load('ftp://localhost', ['load-0'], 'loadpass123', rps=1, duration=1, year=2023))
@@ -0,0 +1,115 @@
+"""
+Test the synthetic data generators
+"""
+import io
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Accounting, Category, DailySummary
+
+
+def seeded_records(account):
+    """Return the records of an account in a comparable form"""
+    return list(
+        Accounting.objects.filter(user__account=account)
+        .order_by('date', 'id')
+        .values_list('date', 'type', 'amount', 'title', 'category__name')
+    )
+
+
+class SeedAccountingCommandTests(TestCase):
+    """Test the seed_accounting command"""
+
+    def seed(self, **options):
+        """Run the command for 2023 with 4 records per day unless overridden"""
+        options = {'start_year': 2023, 'per_day': 4, 'seed': 7, **options}
+        call_command('seed_accounting', stdout=io.StringIO(), **options)
+
+    def test_seed_users(self):
+        """Test every seed user gets a year of records and summaries"""
+        self.seed(users=2)
+
+        for account in ('seed-0', 'seed-1'):
+            user = get_user_model().objects.get(account=account)
+            self.assertEqual(Accounting.objects.filter(user=user).count(), 365 * 4 + self.bonus_count(user))
+            self.assertEqual(DailySummary.objects.filter(user=user).count(), 365)
+            self.assertTrue(Category.objects.filter(user=user, name='食').exists())
+            self.assertEqual(
+                Accounting.objects.filter(user=user, category__name='薪水').count(), 12
+            )
+
+    def bonus_count(self, user):
+        """Return the number of bonus records, which are drawn at random"""
+        return Accounting.objects.filter(user=user, category__name='獎金').count()
+
+    def test_seed_is_reproducible(self):
+        """Test the same seed generates the same records"""
+        self.seed()
+        first = seeded_records('seed-0')
+
+        self.seed(reset=True)
+
+        self.assertEqual(seeded_records('seed-0'), first)
+
+    def test_existing_records_need_reset(self):
+        """Test seeding a user with records requires --reset"""
+        self.seed()
+
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_queries_do_not_grow_with_records(self):
+        """Test the records are inserted in bulk instead of one by one"""
+        with CaptureQueriesContext(connection) as captured:
+            self.seed(per_day=10)
+
+        self.assertGreater(Accounting.objects.count(), 3650)
+        self.assertLess(len(captured.captured_queries), 200)
+
+    def test_queries_do_not_grow_without_returned_keys(self):
+        """Test the records are inserted in bulk on backends which cannot return their keys (MySQL)"""
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock,
+            return_value=False,
+        ), CaptureQueriesContext(connection) as captured:
+            self.seed(per_day=3)
+
+        user = get_user_model().objects.get(account='seed-0')
+        self.assertEqual(Accounting.objects.filter(user=user).count(), 365 * 3 + self.bonus_count(user))
+        self.assertEqual(Accounting.category.through.objects.filter(accounting__user=user).count(),
+                         Accounting.objects.filter(user=user).count())
+        self.assertLess(len(captured.captured_queries), 200)
+
+
+class GenerateAccountingApiTests(TestCase):
+    """Test the dev data generation endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('testaccount', 'testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_generate_records(self):
+        """Test the endpoint generates records for the current user"""
+        res = self.client.post(reverse('dev:generate_accounting'), {'records_per_day': 2, 'seed': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], Accounting.objects.filter(user=self.user).count())
+        self.assertGreater(res.data['created'], 700)
+
+    def test_generate_limits(self):
+        """Test oversized requests are rejected"""
+        res = self.client.post(reverse('dev:generate_accounting'), {'years': 50})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -9,4 +9,8 @@ app_name = "dev"
 
 urlpatterns = [
     path("generate_accounting", views.GenerateAccountingRecordsView.as_view(), name="generate_accounting"),
+    path("metrics", views.MetricsView.as_view(), name="metrics"),
+    path("profiling/users/<int:user_id>", views.ProfileUserView.as_view(), name="profile_user"),
+    path("profiles", views.RequestProfileListView.as_view(), name="profiles"),
+    path("profiles/<int:profile_id>", views.RequestProfileDetailView.as_view(), name="profile"),
 ]
@@ -1,32 +1,124 @@
-import random
 from datetime import date, timedelta
-from core.models import Category, Accounting
 
-def generate_random_accounting_records(user):
-    start_date = date(year=date.today().year, month=1, day=1)
-    end_date = date(year=date.today().year, month=12, day=31)
-    current_date = start_date
-
-    while current_date <= end_date:
-        for _ in range(3):
-            Accounting.objects.create(
-                user=user,
-                date=current_date,
-                type=random.choice(['income', 'outcome']),
-                amount=random.uniform(1000, 10000),
-                title='隨機生成的記帳紀錄'
-            ).category.add(random.choice(Category.objects.filter(user=user)))
-
-        current_date += timedelta(days=1)
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.http import content_disposition_header
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework import serializers, status
+
+from core.authentication import CachedTokenAuthentication
+from core.metrics import PROMETHEUS_CONTENT_TYPE, get_metrics_registry, render_prometheus
+from core.models import RequestProfile
+from dev.seed import seed_user
+
+
+class GenerateAccountingSerializer(serializers.Serializer):
+    years = serializers.IntegerField(min_value=1, max_value=5, default=1)
+    records_per_day = serializers.IntegerField(min_value=1, max_value=20, default=3)
+    seed = serializers.IntegerField(required=False)
+
 
 class GenerateAccountingRecordsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        generate_random_accounting_records(request.user)
-        return Response({'message': '隨機記帳紀錄已生成'}, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        serializer = GenerateAccountingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        options = serializer.validated_data
+
+        # Generate up to the current year, reproducible when a seed is given
+        created = seed_user(
+            request.user,
+            start_year=date.today().year - options['years'] + 1,
+            years=options['years'],
+            records_per_day=options['records_per_day'],
+            seed=options.get('seed'),
+        )
+        return Response({'message': '隨機記帳紀錄已生成', 'created': created}, status=status.HTTP_201_CREATED)
+
+
+class MetricsView(APIView):
+    """Request metrics of every worker process in the Prometheus text format"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        registry = get_metrics_registry()
+        if registry is None:
+            return Response({'error': 'Metrics are disabled'}, status=status.HTTP_404_NOT_FOUND)
+
+        routes, processes = registry.collect()
+        return HttpResponse(render_prometheus(routes, processes), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+class ProfileUserSerializer(serializers.Serializer):
+    minutes = serializers.IntegerField(min_value=1, max_value=24 * 60, default=15)
+
+
+class RequestProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RequestProfile
+        fields = ('id', 'user', 'route', 'method', 'path', 'status_code', 'duration_ms',
+                  'query_count', 'sql_ms', 'created_at')
+
+
+class RequestProfileDetailSerializer(RequestProfileSerializer):
+    class Meta(RequestProfileSerializer.Meta):
+        fields = RequestProfileSerializer.Meta.fields + ('queries', 'summary')
+
+
+class ProfileUserView(APIView):
+    """Profile every request of a user for a while"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def post(self, request, user_id):
+        user = get_object_or_404(get_user_model(), pk=user_id)
+        serializer = ProfileUserSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user.profile_requests_until = timezone.now() + timedelta(minutes=serializer.validated_data['minutes'])
+        user.save(update_fields=['profile_requests_until'])
+        return Response({'user': user.id, 'profile_requests_until': user.profile_requests_until})
+
+    def delete(self, request, user_id):
+        user = get_object_or_404(get_user_model(), pk=user_id)
+        user.profile_requests_until = None
+        user.save(update_fields=['profile_requests_until'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RequestProfileListView(APIView):
+    """The latest stored request profiles, optionally of one user"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        profiles = RequestProfile.objects.defer('queries', 'stats', 'summary').order_by('-id')
+        user_id = request.query_params.get('user')
+        if user_id:
+            if not user_id.isdigit():
+                return Response({'error': 'Invalid user'}, status=status.HTTP_400_BAD_REQUEST)
+            profiles = profiles.filter(user_id=user_id)
+
+        return Response(RequestProfileSerializer(profiles[:100], many=True).data)
+
+
+class RequestProfileDetailView(APIView):
+    """A stored request profile, ?download=1 returns the cProfile statistics as a .prof file"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, profile_id):
+        profile = get_object_or_404(RequestProfile, pk=profile_id)
+        if request.query_params.get('download') == '1':
+            response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+            response['Content-Disposition'] = content_disposition_header(True, f'profile-{profile.id}.prof')
+            return response
+
+        return Response(RequestProfileDetailSerializer(profile).data)
@@ -0,0 +1,201 @@
+"""
+CSV report generation and storage
+"""
+import codecs
+import csv
+import hashlib
+import json
+
+from datetime import date
+
+from django.db.models import Count, Max, Q, Sum
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from core.models import Accounting, Category, MonthTarget
+from reports.storage import get_report_storage
+
+
+# Rows fetched per database round trip while writing a report
+CSV_QUERY_CHUNK_SIZE = 2000
+# Encoded bytes buffered before a chunk is handed to the response or upload
+CSV_OUTPUT_CHUNK_SIZE = 64 * 1024
+
+# Bump when the report layout changes so stored reports are regenerated
+REPORT_FORMAT_VERSION = 1
+FINGERPRINT_METADATA_KEY = 'fingerprint'
+
+CSV_HEADER = ['年份', '月份', '日期', '項目', '類別', '名稱', '收入金額', '支出金額', '小計餘額']
+
+
+def report_period(year, month=None):
+    """Return the half-open [start, end) date range covered by a report"""
+    if month:
+        start_date = date(year, month, 1)
+        end_date = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    else:
+        start_date = date(year, 1, 1)
+        end_date = date(year + 1, 1, 1)
+
+    return start_date, end_date
+
+
+def report_filename(year, month=None):
+    filename = f"{year}年"
+    if month:
+        filename += f"{month}月"
+    filename += "記帳明細.csv"
+
+    return filename
+
+
+def iter_csv_rows(user, year, month=None):
+    """Yield the rows of a report, reading accountings in chunks"""
+    yield CSV_HEADER
+
+    # The totals come from the rows printed above them, not from another query
+    running_balance = total_income = total_expense = 0
+    start_date, end_date = report_period(year, month)
+    accountings = Accounting.objects.filter(
+        user=user, date__gte=start_date, date__lt=end_date
+    ).order_by('date', 'id').prefetch_related('category')
+
+    for accounting in accountings.iterator(chunk_size=CSV_QUERY_CHUNK_SIZE):
+        year_str = accounting.date.year
+        month_str = accounting.date.month
+        day_str = accounting.date.day
+        categories = ", ".join([category.name for category in accounting.category.all()])
+        type_str = "收入" if accounting.type == 'income' else "支出"
+        income_amount = accounting.amount if accounting.type == 'income' else ""
+        expense_amount = accounting.amount if accounting.type == 'outcome' else ""
+        if accounting.type == 'income':
+            total_income += accounting.amount
+            running_balance += accounting.amount
+        else:
+            total_expense += accounting.amount
+            running_balance -= accounting.amount
+
+        yield [year_str, month_str, day_str, categories, type_str, accounting.title, income_amount, expense_amount, running_balance]
+
+    yield ['總計', '', '', '', '', '', total_income, total_expense, running_balance]
+
+    month_target = MonthTarget.objects.filter(user=user, year=year)
+    if month:
+        month_target = month_target.filter(month=month)
+
+    target = month_target.first()
+    if target is not None:
+        income_rate = (total_income / target.income * 100) if target.income else 0
+        outcome_rate = (total_expense / target.outcome * 100) if target.outcome else 0
+        yield [f'{month}月目標金額', '', '', '', '', '收入目標', target.income, '支出目標', target.outcome]
+        yield [f'{month}月目標達成率', '', '', '', '', '收入達成率', f"{income_rate:.2f}%", '支出達成率', f"{outcome_rate:.2f}%"]
+
+
+def report_fingerprint(user, year, month=None):
+    """Return a digest of everything a report is generated from
+
+    The accountings of the period are reduced to their count, max id, totals
+    and last modification, which changes whenever a row is added, edited,
+    removed or re-categorized. Category names and targets are small enough to
+    be hashed as they are.
+    """
+    start_date, end_date = report_period(year, month)
+    accountings = Accounting.objects.filter(
+        user=user, date__gte=start_date, date__lt=end_date
+    ).aggregate(
+        count=Count('id'),
+        max_id=Max('id'),
+        income=Sum('amount', filter=Q(type='income'), default=0),
+        outcome=Sum('amount', filter=Q(type='outcome'), default=0),
+        updated_at=Max('updated_at'),
+    )
+    categories = Category.objects.filter(user=user).order_by('id').values_list('id', 'name')
+    targets = MonthTarget.objects.filter(user=user, year=year)
+    if month:
+        targets = targets.filter(month=month)
+    targets = targets.order_by('id').values_list('month', 'income', 'outcome')
+
+    payload = json.dumps(
+        [REPORT_FORMAT_VERSION, year, month, accountings, list(categories), list(targets)],
+        default=str,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _LineBuffer:
+    """Pseudo file handing back each line csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_chunks(user, year, month=None, chunk_size=CSV_OUTPUT_CHUNK_SIZE):
+    """Yield a report as UTF-8 (with BOM) encoded chunks of about chunk_size bytes"""
+    writer = csv.writer(_LineBuffer())
+    encoder = codecs.getincrementalencoder('utf_8_sig')()
+    pending = []
+    pending_size = 0
+
+    for row in iter_csv_rows(user, year, month):
+        line = writer.writerow(row)
+        pending.append(line)
+        pending_size += len(line)
+        if pending_size >= chunk_size:
+            yield encoder.encode(''.join(pending))
+            pending = []
+            pending_size = 0
+
+    yield encoder.encode(''.join(pending), final=True)
+
+
+def generate_csv(user, year, month=None):
+    """Return the filename and the whole encoded content of a report"""
+    return report_filename(year, month), b''.join(iter_csv_chunks(user, year, month))
+
+
+def report_key(user_account, filename):
+    """Return the storage key of a user's report"""
+    return f"{user_account}/{filename}"
+
+
+def stored_fingerprint(key):
+    """Return the fingerprint of a stored report, or None when it is missing"""
+    metadata = get_report_storage().metadata(key)
+
+    return metadata.get(FINGERPRINT_METADATA_KEY) if metadata else None
+
+
+def cached_report_key(user, year, month=None):
+    """Return the key of a user's stored report when it is still current, else None"""
+    key = report_key(user.account, report_filename(year, month))
+    if stored_fingerprint(key) == report_fingerprint(user, year, month):
+        return key
+
+    return None
+
+
+def store_report(user, year, month=None):
+    """Upload a user's report unless the stored copy is current, and return its key"""
+    key = report_key(user.account, report_filename(year, month))
+    fingerprint = report_fingerprint(user, year, month)
+
+    if stored_fingerprint(key) != fingerprint:
+        get_report_storage().save(
+            key,
+            iter_csv_chunks(user, year, month),
+            metadata={FINGERPRINT_METADATA_KEY: fingerprint},
+        )
+
+    return key
+
+
+def stream_csv_response(user, year, month=None):
+    """Return a report as a streamed file download"""
+    response = StreamingHttpResponse(
+        iter_csv_chunks(user, year, month),
+        content_type='text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = content_disposition_header(True, report_filename(year, month))
+
+    return response
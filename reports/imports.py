@@ -0,0 +1,126 @@
+"""
+CSV import in the layout written by reports.exports
+"""
+import csv
+import io
+
+from datetime import date
+
+from django.db import transaction
+
+from account.bulk import bulk_create_accountings
+from core import summaries
+
+
+# Records inserted per bulk_create round
+IMPORT_CHUNK_SIZE = 2000
+# Errors reported before the import stops reading the file
+IMPORT_MAX_ERRORS = 100
+
+TYPE_LABELS = {'收入': 'income', '支出': 'outcome'}
+TITLE_MAX_LENGTH = 255
+
+
+class CsvImportError(Exception):
+    """Raised with the row errors of a rejected import"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} invalid rows')
+        self.errors = errors
+
+
+def open_csv_text(binary_file):
+    """Return a text stream over an uploaded or opened CSV file, dropping a UTF-8 BOM"""
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+def parse_csv_row(row):
+    """Return the record of a report row, None for header and footer rows
+
+    Raises ValueError with a message for invalid rows.
+    """
+    if not row or not row[0].strip().isdigit():
+        # The header and the total/target footer rows do not start with a year
+        return None
+    if len(row) < 8:
+        raise ValueError(f'Expected at least 8 columns, got {len(row)}')
+
+    year, month, day, categories, type_label, title, income, outcome = (value.strip() for value in row[:8])
+    try:
+        record_date = date(int(year), int(month), int(day))
+    except ValueError:
+        raise ValueError(f'Invalid date {year}-{month}-{day}')
+
+    record_type = TYPE_LABELS.get(type_label)
+    if record_type is None:
+        raise ValueError(f'Invalid type {type_label!r}, expected 收入 or 支出')
+
+    amount = income if record_type == 'income' else outcome
+    try:
+        amount = int(amount)
+    except ValueError:
+        raise ValueError(f'Invalid amount {amount!r}')
+
+    if len(title) > TITLE_MAX_LENGTH:
+        raise ValueError(f'Title longer than {TITLE_MAX_LENGTH} characters')
+
+    names = dict.fromkeys(name.strip() for name in categories.split(','))
+    names.pop('', None)
+
+    return {
+        'date': record_date,
+        'type': record_type,
+        'amount': amount,
+        'title': title,
+        'category': [{'name': name} for name in names],
+    }
+
+
+def iter_csv_records(text_stream):
+    """Yield (line number, record or error message) for the data rows of a CSV stream"""
+    reader = csv.reader(text_stream)
+    for row in reader:
+        try:
+            record = parse_csv_row(row)
+        except ValueError as e:
+            yield reader.line_num, str(e)
+            continue
+        if record is not None:
+            yield reader.line_num, record
+
+
+def import_csv(user, text_stream, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import the records of a CSV stream for a user and return how many were created
+
+    Rows are read one at a time and inserted in chunks of chunk_size, so
+    memory does not grow with the file. The import is atomic: when any row
+    is invalid nothing is created and CsvImportError lists the first
+    IMPORT_MAX_ERRORS errors with their line numbers.
+    """
+    created = 0
+    errors = []
+    categories = {}
+    chunk = []
+
+    with transaction.atomic(), summaries.batch():
+        for line, record in iter_csv_records(text_stream):
+            if isinstance(record, str):
+                errors.append({'line': line, 'error': record})
+                if len(errors) >= IMPORT_MAX_ERRORS:
+                    break
+                continue
+            if errors:
+                # Keep reading for errors only, the import is rolled back
+                continue
+
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                created += len(bulk_create_accountings(user, chunk, categories, prefetch=False))
+                chunk = []
+
+        if errors:
+            raise CsvImportError(errors)
+        if chunk:
+            created += len(bulk_create_accountings(user, chunk, categories, prefetch=False))
+
+    return created
@@ -0,0 +1,129 @@
+"""
+Report job queue processed by the run_report_worker command
+"""
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import ReportJob
+from reports.exports import cached_report_key, store_report
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (ReportJob.STATUS_PENDING, ReportJob.STATUS_RUNNING)
+
+
+def requeue_expired_jobs(queryset=None):
+    """Queue again the running jobs claimed more than REPORT_JOB_TIMEOUT seconds ago
+
+    Such jobs were left by a worker which crashed or was restarted. Jobs
+    already claimed REPORT_JOB_MAX_ATTEMPTS times are marked failed instead.
+    Returns the number of requeued jobs.
+    """
+    if queryset is None:
+        queryset = ReportJob.objects.all()
+
+    now = timezone.now()
+    expired = queryset.filter(
+        status=ReportJob.STATUS_RUNNING,
+        started_at__lt=now - timedelta(seconds=settings.REPORT_JOB_TIMEOUT),
+    )
+    failed = expired.filter(attempts__gte=settings.REPORT_JOB_MAX_ATTEMPTS).update(
+        status=ReportJob.STATUS_FAILED,
+        error=f'Timed out {settings.REPORT_JOB_MAX_ATTEMPTS} times',
+        finished_at=now,
+    )
+    requeued = expired.filter(attempts__lt=settings.REPORT_JOB_MAX_ATTEMPTS).update(
+        status=ReportJob.STATUS_PENDING,
+        started_at=None,
+    )
+    if failed or requeued:
+        logger.warning('Requeued %s and failed %s expired report jobs', requeued, failed)
+
+    return requeued
+
+
+def enqueue_report_job(user, year, month=None):
+    """Queue a report, reusing a queued or running job for the same report
+
+    An expired running job of the report is requeued and reused, or replaced
+    once it ran out of attempts. When the stored report is still current the
+    latest done job of that file is returned, or one is recorded as done
+    right away, and nothing is queued.
+    """
+    jobs = ReportJob.objects.filter(user=user, year=year, month=month)
+    requeue_expired_jobs(jobs)
+
+    job = jobs.filter(status__in=ACTIVE_STATUSES).order_by('-id').first()
+    if job is not None:
+        return job
+
+    file_key = cached_report_key(user, year, month)
+    if file_key is not None:
+        # Polling an unchanged report does not add a job per request
+        job = jobs.filter(status=ReportJob.STATUS_DONE, file_key=file_key).order_by('-id').first()
+        if job is not None:
+            return job
+
+        now = timezone.now()
+        return ReportJob.objects.create(
+            user=user, year=year, month=month, status=ReportJob.STATUS_DONE,
+            file_key=file_key, started_at=now, finished_at=now,
+        )
+
+    return ReportJob.objects.create(user=user, year=year, month=month)
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None when idle
+
+    Expired running jobs are requeued first.
+    """
+    requeue_expired_jobs()
+
+    while True:
+        job = ReportJob.objects.filter(
+            status=ReportJob.STATUS_PENDING
+        ).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+
+        claimed = ReportJob.objects.filter(id=job.id, status=ReportJob.STATUS_PENDING).update(
+            status=ReportJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_report_job(job):
+    """Generate and upload the report of a claimed job and record the outcome
+
+    The outcome is dropped when the job expired and was claimed again
+    meanwhile, the newer attempt records its own.
+    """
+    try:
+        file_key = store_report(job.user, job.year, job.month)
+    except Exception as e:
+        logger.exception('Report job %s failed', job.id)
+        job.status = ReportJob.STATUS_FAILED
+        job.error = str(e)
+    else:
+        job.status = ReportJob.STATUS_DONE
+        job.file_key = file_key
+
+    job.finished_at = timezone.now()
+    updated = ReportJob.objects.filter(
+        id=job.id, status=ReportJob.STATUS_RUNNING, attempts=job.attempts,
+    ).update(status=job.status, file_key=job.file_key, error=job.error, finished_at=job.finished_at)
+    if not updated:
+        logger.warning('Report job %s expired before attempt %s finished', job.id, job.attempts)
+
+    return job
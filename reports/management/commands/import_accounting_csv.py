@@ -0,0 +1,41 @@
+"""
+Django command to import accounting records from CSV files
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.imports import IMPORT_CHUNK_SIZE, CsvImportError, import_csv, open_csv_text
+
+
+class Command(BaseCommand):
+    """Django command to import CSV files in the report layout"""
+    help = 'Import accounting records for an account from CSV files written in the report layout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='CSV files to import')
+        parser.add_argument('--account', required=True, help='Account the records are imported for')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Records per bulk insert')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        try:
+            user = get_user_model().objects.get(account=options['account'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Unknown account {options['account']}")
+
+        for path in options['files']:
+            started = time.perf_counter()
+            try:
+                with open(path, 'rb') as binary_file:
+                    created = import_csv(user, open_csv_text(binary_file), chunk_size=max(options['chunk_size'], 1))
+            except CsvImportError as e:
+                for error in e.errors:
+                    self.stderr.write(f"{path}:{error['line']}: {error['error']}")
+                raise CommandError(f'{path} was not imported, {len(e.errors)} invalid rows')
+            except (OSError, UnicodeDecodeError) as e:
+                raise CommandError(f'{path} could not be read: {e}')
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f'Imported {created} records from {path} in {elapsed:.1f}s'))
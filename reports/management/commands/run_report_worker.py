@@ -0,0 +1,55 @@
+"""
+Django command to process queued report jobs
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from reports.jobs import claim_next_job, run_report_job
+
+
+def _run_in_thread(job):
+    """Run a job on a pool thread and release the thread's database connection"""
+    try:
+        return run_report_job(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """Django command to process queued report jobs"""
+    help = 'Generate queued reports with a local thread pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Reports generated in parallel')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between queue polls when idle')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        workers = max(options['workers'], 1)
+        self.stdout.write(f'Report worker started with {workers} threads')
+
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                while len(in_flight) < workers:
+                    job = claim_next_job()
+                    if job is None:
+                        break
+                    in_flight.add(pool.submit(_run_in_thread, job))
+
+                if not in_flight:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, in_flight = wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = future.result()
+                    self.stdout.write(f'Report job {job.id} {job.status}')
+
+        self.stdout.write(self.style.SUCCESS('Report worker stopped'))
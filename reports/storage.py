@@ -0,0 +1,223 @@
+"""
+Report storage backends selected by the REPORT_STORAGE_BACKEND setting
+"""
+import json
+import os
+import tempfile
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+
+MB = 1024 * 1024
+
+# Reports above one part are sent as a multipart upload, holding at most
+# REPORT_UPLOAD_CONCURRENCY parts in flight plus the one being filled
+REPORT_PART_SIZE = 8 * MB
+REPORT_UPLOAD_CONCURRENCY = 2
+
+REPORT_URL_EXPIRES_IN = 180
+
+REPORT_URL_SALT = 'reports.storage.report_url'
+
+
+class ReportStorage:
+    """Interface of a report storage backend"""
+
+    def save(self, key, chunks, metadata=None):
+        """Store a report from an iterable of byte chunks"""
+        raise NotImplementedError
+
+    def metadata(self, key):
+        """Return the metadata of a stored report, or None when it is missing"""
+        raise NotImplementedError
+
+    def url(self, key):
+        """Return a download URL for a stored report, valid for REPORT_URL_EXPIRES_IN seconds"""
+        raise NotImplementedError
+
+
+class S3ReportStorage(ReportStorage):
+    """Reports stored in the AWS_STORAGE_BUCKET_NAME bucket
+
+    The client is created once per process and shared by every thread, so
+    credentials are resolved once and connections are kept in its pool.
+    """
+
+    def __init__(self):
+        self.bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = boto3.session.Session().client(
+                        's3',
+                        region_name=settings.AWS_S3_REGION_NAME,
+                        config=Config(max_pool_connections=settings.REPORT_S3_MAX_POOL_CONNECTIONS),
+                    )
+        return self._client
+
+    def save(self, key, chunks, metadata=None):
+        """Upload a report, reading its chunks on the calling thread
+
+        The chunks usually query the database, so they are consumed here, in
+        the caller's transaction and connection. Only the filled parts are
+        handed to the upload threads.
+        """
+        extra_args = {'Metadata': metadata} if metadata else {}
+        chunks = iter(chunks)
+        part = self._fill_part(chunks)
+        if len(part) < REPORT_PART_SIZE:
+            self.client.put_object(Bucket=self.bucket_name, Key=key, Body=part, **extra_args)
+            return
+
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket_name, Key=key, **extra_args)['UploadId']
+        try:
+            parts = self._upload_parts(key, upload_id, part, chunks)
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket_name, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts},
+            )
+        except BaseException:
+            self.client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+            raise
+
+    def _fill_part(self, chunks):
+        """Return the next REPORT_PART_SIZE bytes of the chunks, fewer at the end"""
+        part = bytearray()
+        for chunk in chunks:
+            part += chunk
+            if len(part) >= REPORT_PART_SIZE:
+                break
+        return bytes(part)
+
+    def _upload_parts(self, key, upload_id, part, chunks):
+        """Upload the parts of a multipart upload and return their numbers and ETags"""
+        parts = []
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=REPORT_UPLOAD_CONCURRENCY) as pool:
+            while part:
+                if len(in_flight) >= REPORT_UPLOAD_CONCURRENCY:
+                    parts.append(in_flight.popleft().result())
+                number = len(parts) + len(in_flight) + 1
+                in_flight.append(pool.submit(self._upload_part, key, upload_id, number, part))
+                part = self._fill_part(chunks)
+            parts += [future.result() for future in in_flight]
+        return parts
+
+    def _upload_part(self, key, upload_id, number, part):
+        response = self.client.upload_part(
+            Bucket=self.bucket_name, Key=key, UploadId=upload_id, PartNumber=number, Body=part,
+        )
+        return {'PartNumber': number, 'ETag': response['ETag']}
+
+    def metadata(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket_name, Key=key)
+        except (BotoCoreError, ClientError):
+            return None
+
+        return head.get('Metadata', {})
+
+    def url(self, key):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': key},
+            ExpiresIn=REPORT_URL_EXPIRES_IN
+        )
+
+
+class LocalReportStorage(ReportStorage):
+    """Reports stored under REPORT_STORAGE_ROOT and served by the report_file view
+
+    Metadata is kept next to each report in a .json file. URLs carry a signed,
+    timestamped key which the view accepts for REPORT_URL_EXPIRES_IN seconds.
+    """
+
+    def __init__(self):
+        self.root = os.path.abspath(settings.REPORT_STORAGE_ROOT)
+
+    def path(self, key):
+        """Return the file path of a report, refusing keys outside the root"""
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f'Invalid report key: {key}')
+
+        return path
+
+    def save(self, key, chunks, metadata=None):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        def write_report(file):
+            for chunk in chunks:
+                file.write(chunk)
+
+        # The report is replaced first, a report left with older metadata is
+        # only taken for stale and generated again
+        self.write_atomically(path, write_report)
+        self.write_atomically(f'{path}.json', lambda file: file.write(json.dumps(metadata or {}).encode('utf-8')))
+
+    def write_atomically(self, path, write):
+        """Write a file through a temporary file, so readers never see a partial one"""
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                write(file)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def metadata(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(f'{path}.json', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def url(self, key):
+        token = signing.dumps(key, salt=REPORT_URL_SALT)
+        return reverse('reports:report_file', args=[token])
+
+    def open(self, token):
+        """Return the key and an open file for a signed URL token
+
+        Raises signing.BadSignature (or SignatureExpired) for invalid or
+        expired tokens and FileNotFoundError for missing reports.
+        """
+        key = signing.loads(token, salt=REPORT_URL_SALT, max_age=REPORT_URL_EXPIRES_IN)
+        return key, open(self.path(key), 'rb')
+
+
+@lru_cache(maxsize=None)
+def get_report_storage():
+    """Return the process-wide instance of the configured report storage"""
+    return import_string(settings.REPORT_STORAGE_BACKEND)()
+
+
+@receiver(setting_changed)
+def reset_report_storage(setting, **kwargs):
+    """Drop the cached storage when its settings are overridden"""
+    if setting.startswith('REPORT_STORAGE') or setting.startswith('AWS_') or setting.startswith('REPORT_S3'):
+        get_report_storage.cache_clear()
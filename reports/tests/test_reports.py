@@ -3,23 +3,61 @@ Test for reports
 """
 
 
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from core.models import Accounting, Category
 
+import codecs
+import csv
+import io
 import json
 import os
 import tempfile
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import PropertyMock, patch
+
+from django.conf import settings
+from django.core import signing
+from django.test import override_settings
+from botocore.exceptions import ClientError
+
+from core.models import MonthTarget, ReportJob
+from reports.exports import generate_csv, iter_csv_chunks, iter_csv_rows, report_fingerprint
+from reports.imports import CsvImportError, import_csv
+from reports.jobs import claim_next_job, enqueue_report_job, run_report_job
+from reports.storage import LocalReportStorage, S3ReportStorage, get_report_storage
 
 
 def create_user(account='testaccount', password='testpass123', name='testuser'):
     """Helper function to create a user"""
     return get_user_model().objects.create_user(account, password, name=name)
 
+
+class LocalStorageMixin:
+    """Store reports in a temporary directory through the local storage backend"""
+
+    def setUp(self):
+        super().setUp()
+        storage_root = tempfile.TemporaryDirectory()
+        self.addCleanup(storage_root.cleanup)
+        settings_override = override_settings(
+            REPORT_STORAGE_BACKEND='reports.storage.LocalReportStorage',
+            REPORT_STORAGE_ROOT=storage_root.name,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage_root = storage_root.name
+
 '''
 class PublicReportsApiTests(TestCase):
     """Test the publicly available reports API"""
@@ -118,4 +156,531 @@ class PrivateReportsApiTests(TestCase):
         self.assertEqual(len(res.data), 1)
         self.assertEqual(res.data[0]['category'], category.name)
         self.assertEqual(res.data[0]['amount'], 100)
-'''
\ No newline at end of file
+'''
+
+class ReportCsvTests(LocalStorageMixin, TestCase):
+    """Test the streamed report generation"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        food = Category.objects.create(user=self.user, name='食')
+        accounting = Accounting.objects.create(
+            user=self.user, date='2024-03-02', type='outcome', amount=200, title='午餐',
+        )
+        accounting.category.add(food)
+        Accounting.objects.create(user=self.user, date='2024-03-01', type='income', amount=1000, title='薪水')
+        Accounting.objects.create(user=self.user, date='2024-04-01', type='income', amount=5, title='other')
+
+    def test_generate_csv(self):
+        """Test the report rows are ordered by date with a running balance"""
+        filename, content = generate_csv(self.user, 2024, 3)
+
+        self.assertEqual(filename, '2024年3月記帳明細.csv')
+        self.assertTrue(content.startswith(codecs.BOM_UTF8))
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows[1], ['2024', '3', '1', '', '收入', '薪水', '1000', '', '1000'])
+        self.assertEqual(rows[2], ['2024', '3', '2', '食', '支出', '午餐', '', '200', '800'])
+        self.assertEqual(rows[3], ['總計', '', '', '', '', '', '1000', '200', '800'])
+        self.assertEqual(len(rows), 4)
+
+    def test_totals_match_streamed_rows(self):
+        """Test the totals add up the rows above them when a record is added while streaming"""
+        Accounting.objects.create(user=self.user, date='2024-03-03', type='outcome', amount=50, title='晚餐')
+        rows = iter_csv_rows(self.user, 2024, 3)
+        streamed = [next(rows), next(rows)]
+
+        Accounting.objects.create(user=self.user, date='2024-03-01', type='income', amount=999, title='late')
+        streamed += list(rows)
+
+        self.assertEqual(streamed[-1], ['總計', '', '', '', '', '', 1000, 250, 750])
+
+    def test_csv_chunks_are_bounded(self):
+        """Test the report is produced in chunks with a single BOM"""
+        for day in range(1, 29):
+            Accounting.objects.create(user=self.user, date=f'2024-02-{day:02d}', type='income', amount=day)
+
+        chunks = list(iter_csv_chunks(self.user, 2024, chunk_size=64))
+
+        self.assertGreater(len(chunks), 5)
+        self.assertTrue(all(len(chunk) < 256 for chunk in chunks))
+        content = b''.join(chunks)
+        self.assertEqual(content.count(codecs.BOM_UTF8), 1)
+        self.assertEqual(content, generate_csv(self.user, 2024)[1])
+
+    def test_report_job_stores_report(self):
+        """Test a processed job stores the report and returns a signed download url"""
+        res = self.client.get(reverse('reports:get_month_reports', args=[2024, 3]))
+        run_report_job(claim_next_job())
+        res = self.client.get(res.data['status_url'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(os.path.exists(os.path.join(self.storage_root, 'testaccount', '2024年3月記帳明細.csv')))
+
+        download = APIClient().get(res.data['url'])
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment', download['Content-Disposition'])
+        self.assertEqual(b''.join(download.streaming_content), generate_csv(self.user, 2024, 3)[1])
+
+    def test_download_streams_csv(self):
+        """Test download=1 streams the report as an attachment"""
+        res = self.client.get(reverse('reports:get_year_reports', args=[2024]), {'download': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertIn('attachment', res['Content-Disposition'])
+        self.assertEqual(b''.join(res.streaming_content), generate_csv(self.user, 2024)[1])
+
+
+class ReportJobTests(LocalStorageMixin, TestCase):
+    """Test the queued report jobs"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_report_request_is_queued(self):
+        """Test requesting a report queues a job instead of generating it"""
+        res = self.client.get(reverse('reports:get_year_reports', args=[2024]))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], ReportJob.STATUS_PENDING)
+        self.assertEqual(res.data['filename'], '2024年記帳明細.csv')
+        self.assertNotIn('url', res.data)
+
+        again = self.client.get(reverse('reports:get_year_reports', args=[2024]))
+        self.assertEqual(again.data['job_id'], res.data['job_id'])
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    @patch.object(LocalReportStorage, 'save', side_effect=OSError('disk full'))
+    def test_failed_job_reports_error(self, patched_save):
+        """Test a failing upload marks the job as failed"""
+        res = self.client.get(reverse('reports:get_month_reports', args=[2024, 3]))
+
+        with self.assertLogs('reports.jobs', level='ERROR'):
+            job = run_report_job(claim_next_job())
+
+        self.assertEqual(job.status, ReportJob.STATUS_FAILED)
+        res = self.client.get(res.data['status_url'])
+        self.assertEqual(res.data['status'], ReportJob.STATUS_FAILED)
+        self.assertEqual(res.data['error'], 'disk full')
+
+    def test_claim_next_job(self):
+        """Test jobs are claimed oldest first and only once"""
+        first = ReportJob.objects.create(user=self.user, year=2023)
+        second = ReportJob.objects.create(user=self.user, year=2024)
+
+        self.assertEqual(claim_next_job().id, first.id)
+        self.assertEqual(claim_next_job().id, second.id)
+        self.assertIsNone(claim_next_job())
+        first.refresh_from_db()
+        self.assertEqual(first.status, ReportJob.STATUS_RUNNING)
+
+    def expire(self, job):
+        """Move the claim of a running job past REPORT_JOB_TIMEOUT"""
+        ReportJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(hours=1))
+
+    @override_settings(REPORT_JOB_TIMEOUT=60, REPORT_JOB_MAX_ATTEMPTS=2)
+    def test_expired_job_is_requeued(self):
+        """Test a job left running by a stopped worker is claimed again up to the attempt limit"""
+        job = ReportJob.objects.create(user=self.user, year=2024)
+        claimed = claim_next_job()
+        self.assertIsNone(claim_next_job())
+
+        self.expire(claimed)
+        with self.assertLogs('reports.jobs', level='WARNING'):
+            reclaimed = claim_next_job()
+        self.assertEqual((reclaimed.id, reclaimed.attempts), (job.id, 2))
+
+        # The first worker finishing late does not overwrite the new attempt
+        with self.assertLogs('reports.jobs', level='WARNING'):
+            run_report_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.STATUS_RUNNING)
+
+        self.expire(reclaimed)
+        with self.assertLogs('reports.jobs', level='WARNING'):
+            self.assertIsNone(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.STATUS_FAILED)
+        self.assertEqual(job.error, 'Timed out 2 times')
+
+    @override_settings(REPORT_JOB_TIMEOUT=60, REPORT_JOB_MAX_ATTEMPTS=1)
+    def test_enqueue_ignores_expired_job(self):
+        """Test a report can be requested again after its job expired"""
+        job = enqueue_report_job(self.user, 2024, 3)
+        claim_next_job()
+        self.assertEqual(enqueue_report_job(self.user, 2024, 3).id, job.id)
+
+        self.expire(job)
+        with self.assertLogs('reports.jobs', level='WARNING'):
+            again = enqueue_report_job(self.user, 2024, 3)
+
+        self.assertNotEqual(again.id, job.id)
+        self.assertEqual(again.status, ReportJob.STATUS_PENDING)
+        self.assertEqual(ReportJob.objects.get(id=job.id).status, ReportJob.STATUS_FAILED)
+
+    def test_job_limited_to_user(self):
+        """Test a user cannot read another user's report job"""
+        other_user = create_user(account='testaccount2')
+        job = ReportJob.objects.create(user=other_user, year=2024)
+
+        res = self.client.get(reverse('reports:report_job', args=[job.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReportCacheTests(LocalStorageMixin, TestCase):
+    """Test stored reports are reused while their data is unchanged"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.food = Category.objects.create(user=self.user, name='食')
+        self.accounting = Accounting.objects.create(
+            user=self.user, date='2024-03-02', type='outcome', amount=200, title='午餐',
+        )
+
+    def request_report(self):
+        """Request the March 2024 report"""
+        return self.client.get(reverse('reports:get_month_reports', args=[2024, 3]))
+
+    def store_current_report(self):
+        """Generate and store the report for the current data"""
+        self.request_report()
+        run_report_job(claim_next_job())
+
+    def assertFingerprintChanges(self, change):
+        """Assert a data change gives the report a new fingerprint"""
+        before = report_fingerprint(self.user, 2024, 3)
+        change()
+        self.assertNotEqual(report_fingerprint(self.user, 2024, 3), before)
+
+    def test_current_report_is_not_regenerated(self):
+        """Test a report with a matching fingerprint is only given a new url"""
+        self.store_current_report()
+
+        with patch.object(LocalReportStorage, 'save') as patched_save:
+            res = self.request_report()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], ReportJob.STATUS_DONE)
+        self.assertIn('url', res.data)
+        self.assertIsNone(claim_next_job())
+        patched_save.assert_not_called()
+
+    def test_current_report_reuses_done_job(self):
+        """Test polling an unchanged report returns the same done job"""
+        self.store_current_report()
+        jobs = ReportJob.objects.count()
+
+        first = self.request_report()
+        second = self.request_report()
+
+        self.assertEqual(first.data['job_id'], second.data['job_id'])
+        self.assertEqual(ReportJob.objects.count(), jobs)
+
+        Accounting.objects.create(user=self.user, date='2024-03-05', type='income', amount=1)
+        self.store_current_report()
+        self.assertNotEqual(self.request_report().data['job_id'], first.data['job_id'])
+
+    def test_worker_skips_current_report(self):
+        """Test a queued job does not upload a report stored in the meantime"""
+        self.request_report()
+        ReportJob.objects.create(user=self.user, year=2024, month=3)
+        run_report_job(claim_next_job())
+
+        with patch.object(LocalReportStorage, 'save') as patched_save:
+            job = run_report_job(claim_next_job())
+
+        self.assertEqual(job.status, ReportJob.STATUS_DONE)
+        self.assertEqual(job.file_key, 'testaccount/2024年3月記帳明細.csv')
+        patched_save.assert_not_called()
+
+    def test_stale_report_is_queued(self):
+        """Test a report is regenerated once its data changed"""
+        self.store_current_report()
+        Accounting.objects.create(user=self.user, date='2024-03-05', type='income', amount=1)
+
+        res = self.request_report()
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        with patch.object(LocalReportStorage, 'save') as patched_save:
+            run_report_job(claim_next_job())
+        patched_save.assert_called_once()
+
+    def test_fingerprint_follows_report_data(self):
+        """Test edits that keep the totals still change the fingerprint"""
+        def edit_title():
+            self.accounting.title = '晚餐'
+            self.accounting.save()
+
+        def rename_category():
+            self.food.name = '吃'
+            self.food.save()
+
+        self.assertFingerprintChanges(edit_title)
+        self.assertFingerprintChanges(lambda: self.accounting.category.add(self.food))
+        self.assertFingerprintChanges(rename_category)
+        self.assertFingerprintChanges(
+            lambda: MonthTarget.objects.create(user=self.user, year=2024, month=3, income=1, outcome=1)
+        )
+
+    def test_fingerprint_limited_to_period(self):
+        """Test changes outside the report period keep the fingerprint"""
+        before = report_fingerprint(self.user, 2024, 3)
+
+        Accounting.objects.create(user=self.user, date='2024-04-01', type='income', amount=5)
+        MonthTarget.objects.create(user=self.user, year=2024, month=4, income=1, outcome=1)
+
+        self.assertEqual(report_fingerprint(self.user, 2024, 3), before)
+
+
+class LocalReportStorageTests(LocalStorageMixin, TestCase):
+    """Test the local filesystem report storage"""
+
+    def setUp(self):
+        super().setUp()
+        self.storage = get_report_storage()
+        self.storage.save('testaccount/report.csv', [b'a,b\n', b'1,2\n'], metadata={'fingerprint': 'abc'})
+
+    def test_save_and_read_metadata(self):
+        """Test a saved report keeps its content and metadata"""
+        self.assertIsInstance(self.storage, LocalReportStorage)
+        self.assertEqual(self.storage.metadata('testaccount/report.csv'), {'fingerprint': 'abc'})
+        self.assertIsNone(self.storage.metadata('testaccount/missing.csv'))
+
+        key, file = self.storage.open(signing.dumps('testaccount/report.csv', salt='reports.storage.report_url'))
+        with file:
+            self.assertEqual(file.read(), b'a,b\n1,2\n')
+
+    def test_failed_replace_keeps_old_metadata(self):
+        """Test a report which could not be replaced keeps the metadata of the stored one"""
+        with patch('reports.storage.os.replace', side_effect=OSError('disk full')), self.assertRaises(OSError):
+            self.storage.save('testaccount/report.csv', [b'new\n'], metadata={'fingerprint': 'new'})
+
+        self.assertEqual(self.storage.metadata('testaccount/report.csv'), {'fingerprint': 'abc'})
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.storage_root, 'testaccount'))), ['report.csv', 'report.csv.json'],
+        )
+
+    def test_key_outside_root_rejected(self):
+        """Test keys cannot point outside the storage root"""
+        with self.assertRaises(ValueError):
+            self.storage.save('../escape.csv', [b'x'])
+
+    def test_invalid_or_expired_url_not_found(self):
+        """Test tampered and expired download urls are rejected"""
+        url = self.storage.url('testaccount/report.csv')
+
+        self.assertEqual(self.client.get(url + 'x').status_code, status.HTTP_404_NOT_FOUND)
+        with patch('reports.storage.REPORT_URL_EXPIRES_IN', -1):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+
+@override_settings(REPORT_STORAGE_BACKEND='reports.storage.S3ReportStorage')
+class S3ReportStorageTests(TestCase):
+    """Test the S3 report storage"""
+
+    def setUp(self):
+        patcher = patch('reports.storage.boto3.session.Session')
+        self.session = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.s3_client = self.session.return_value.client.return_value
+        get_report_storage.cache_clear()
+
+    def test_client_shared_by_process(self):
+        """Test the storage and its client are created once"""
+        storage = get_report_storage()
+        storage.url('a.csv')
+        get_report_storage().url('b.csv')
+
+        self.assertIs(get_report_storage(), storage)
+        self.assertIsInstance(storage, S3ReportStorage)
+        self.session.return_value.client.assert_called_once()
+
+    def test_save_tags_metadata(self):
+        """Test a small report is uploaded at once with its metadata"""
+        get_report_storage().save('testaccount/report.csv', [b'a,b\n', b'1,2\n'], metadata={'fingerprint': 'abc'})
+
+        self.s3_client.put_object.assert_called_once_with(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key='testaccount/report.csv', Body=b'a,b\n1,2\n',
+            Metadata={'fingerprint': 'abc'},
+        )
+        self.s3_client.create_multipart_upload.assert_not_called()
+
+    @patch('reports.storage.REPORT_PART_SIZE', 4)
+    def test_save_multipart(self):
+        """Test a large report is read on the calling thread and uploaded in parts"""
+        read_by = set()
+
+        def chunks():
+            for chunk in (b'ab', b'cd', b'efghij', b'k'):
+                read_by.add(threading.get_ident())
+                yield chunk
+
+        self.s3_client.create_multipart_upload.return_value = {'UploadId': 'upload'}
+        self.s3_client.upload_part.side_effect = lambda **kwargs: {'ETag': f'"{kwargs["Body"].decode()}"'}
+
+        get_report_storage().save('testaccount/report.csv', chunks(), metadata={'fingerprint': 'abc'})
+
+        self.assertEqual(read_by, {threading.get_ident()})
+        self.s3_client.create_multipart_upload.assert_called_once_with(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key='testaccount/report.csv', Metadata={'fingerprint': 'abc'},
+        )
+        self.s3_client.complete_multipart_upload.assert_called_once_with(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key='testaccount/report.csv', UploadId='upload',
+            MultipartUpload={'Parts': [
+                {'PartNumber': 1, 'ETag': '"abcd"'},
+                {'PartNumber': 2, 'ETag': '"efghij"'},
+                {'PartNumber': 3, 'ETag': '"k"'},
+            ]},
+        )
+
+    @patch('reports.storage.REPORT_PART_SIZE', 4)
+    def test_save_multipart_aborts_on_error(self):
+        """Test a failing report aborts its multipart upload with the original error"""
+        def chunks():
+            yield b'abcdef'
+            raise ValueError('query failed')
+
+        self.s3_client.create_multipart_upload.return_value = {'UploadId': 'upload'}
+        self.s3_client.upload_part.return_value = {'ETag': '"x"'}
+
+        with self.assertRaisesMessage(ValueError, 'query failed'):
+            get_report_storage().save('testaccount/report.csv', chunks())
+
+        self.s3_client.abort_multipart_upload.assert_called_once_with(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key='testaccount/report.csv', UploadId='upload',
+        )
+        self.s3_client.complete_multipart_upload.assert_not_called()
+
+    def test_missing_object_has_no_metadata(self):
+        """Test a missing object reads as no metadata"""
+        self.s3_client.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+
+        self.assertIsNone(get_report_storage().metadata('testaccount/report.csv'))
+
+
+class ReportWorkerCommandTests(LocalStorageMixin, TransactionTestCase):
+    """Test the report worker command"""
+
+    def test_worker_processes_queue(self):
+        """Test the worker generates every queued report and exits when idle"""
+        user = create_user()
+        Accounting.objects.create(user=user, date='2024-03-01', type='income', amount=100)
+        jobs = [ReportJob.objects.create(user=user, year=2024, month=month) for month in (1, 2, 3)]
+
+        call_command('run_report_worker', workers=2, once=True, stdout=io.StringIO())
+
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, ReportJob.STATUS_DONE)
+        self.assertEqual(len(os.listdir(os.path.join(self.storage_root, 'testaccount'))), 6)
+
+
+class ReportImportTests(TestCase):
+    """Test importing csv files in the report layout"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.source = create_user(account='source')
+        food = Category.objects.create(user=self.source, name='食')
+        for day in range(1, 6):
+            accounting = Accounting.objects.create(
+                user=self.source, date=f'2024-03-{day:02d}', type='outcome', amount=day * 10, title=f'午餐{day}',
+            )
+            accounting.category.add(food)
+        Accounting.objects.create(user=self.source, date='2024-03-10', type='income', amount=1000, title='薪水')
+        MonthTarget.objects.create(user=self.source, year=2024, month=3, income=2000, outcome=500)
+        self.content = generate_csv(self.source, 2024, 3)[1]
+
+    def csv_stream(self, content):
+        return io.StringIO(content.decode('utf-8-sig'))
+
+    def test_import_round_trip(self):
+        """Test an exported report imports back to the same report"""
+        MonthTarget.objects.create(user=self.user, year=2024, month=3, income=2000, outcome=500)
+
+        created = import_csv(self.user, self.csv_stream(self.content), chunk_size=2)
+
+        self.assertEqual(created, 6)
+        self.assertEqual(generate_csv(self.user, 2024, 3)[1], self.content)
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 1)
+
+    def test_import_rejects_invalid_rows(self):
+        """Test invalid rows are reported by line and nothing is imported"""
+        content = self.content.decode('utf-8-sig').replace('支出,午餐2', '其他,午餐2').replace('2024,3,4,', '2024,13,4,')
+
+        with self.assertRaises(CsvImportError) as raised:
+            import_csv(self.user, io.StringIO(content), chunk_size=2)
+
+        self.assertEqual([error['line'] for error in raised.exception.errors], [3, 5])
+        self.assertFalse(Accounting.objects.filter(user=self.user).exists())
+
+    def test_import_without_returned_keys(self):
+        """Test rows are inserted in bulk on backends which cannot return their keys (MySQL)"""
+        def import_rows(count, month):
+            content = ''.join(
+                f'2024,{month},{index % 28 + 1},類別{month}-{index % 3},支出,項目{index},,{index + 1}\n'
+                for index in range(count)
+            )
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(import_csv(self.user, io.StringIO(content)), count)
+            return len(captured.captured_queries)
+
+        with patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=PropertyMock,
+            return_value=False,
+        ):
+            self.assertEqual(import_rows(10, 1), import_rows(100, 2))
+
+        for accounting in Accounting.objects.filter(user=self.user).prefetch_related('category'):
+            index = int(accounting.title.removeprefix('項目'))
+            self.assertEqual(
+                [category.name for category in accounting.category.all()],
+                [f'類別{accounting.date.month}-{index % 3}'],
+            )
+            self.assertEqual(accounting.amount, index + 1)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+    def test_import_upload(self):
+        """Test uploading a csv file imports its records"""
+        upload = SimpleUploadedFile('report.csv', self.content, content_type='text/csv')
+
+        res = self.client.post(reverse('reports:import_csv'), {'file': upload}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 6)
+        self.assertEqual(Accounting.objects.filter(user=self.user, type='outcome').count(), 5)
+
+    def test_import_upload_errors(self):
+        """Test an invalid upload returns its row errors"""
+        upload = SimpleUploadedFile('report.csv', '2024,3,1,,收入,x,abc,,\n'.encode('utf-8'))
+
+        res = self.client.post(reverse('reports:import_csv'), {'file': upload}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors'], [{'line': 1, 'error': "Invalid amount 'abc'"}])
+
+    def test_import_command(self):
+        """Test the import command reads csv files for an account"""
+        with tempfile.NamedTemporaryFile(suffix='.csv') as file:
+            file.write(self.content)
+            file.flush()
+
+            out = io.StringIO()
+            call_command('import_accounting_csv', file.name, account='testaccount', stdout=out)
+
+            self.assertIn('Imported 6 records', out.getvalue())
+            with self.assertRaises(CommandError):
+                call_command('import_accounting_csv', file.name, account='missing')
@@ -11,4 +11,7 @@ urlpatterns = [
     path('get_month_reports/<int:year>/<int:month>', views.MonthlyReportAPIView.as_view(), name='get_month_reports'),
     path('get_year_reports/<int:year>', views.YearlyReportAPIView.as_view(), name='get_year_reports'),
     path('get_monthly_analysis/<int:year>/<int:month>', views.MonthlyAnalysisAPIView.as_view(), name='get_monthly_analysis'),
+    path('jobs/<int:job_id>', views.ReportJobAPIView.as_view(), name='report_job'),
+    path('import', views.ImportCsvAPIView.as_view(), name='import_csv'),
+    path('files/<str:token>', views.ReportFileAPIView.as_view(), name='report_file'),
 ]
@@ -1,19 +1,24 @@
-import csv
-
-from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.utils.http import content_disposition_header
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
-
-import boto3
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework import status
 
-from core.models import Accounting , MonthTarget, SaveMoneyTarget
+from core.authentication import CachedTokenAuthentication
+from core.models import ReportJob
 
-from io import BytesIO, StringIO
+from reports import jobs
+from reports.exports import generate_csv, report_filename, stream_csv_response
+from reports.imports import CsvImportError, import_csv, open_csv_text
+from reports.storage import LocalReportStorage, get_report_storage
 
 from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
 
 import g4f
 
@@ -21,117 +26,171 @@ g4f.logging = True # enable logging
 g4f.check_version = False # Disable automatic version checking
 
 
-def generate_csv(user, year, month=None):
-    filename = f"{year}年"
-    if month:
-        filename += f"{month}月"
-    filename += "記帳明細.csv"
-
-    csv_output = StringIO()
-    writer = csv.writer(csv_output)
-    writer.writerow(['年份', '月份', '日期', '項目', '類別', '名稱', '收入金額', '支出金額', '小計餘額'])
+DOWNLOAD_PARAMETER = openapi.Parameter(
+    name='download',
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_INTEGER,
+    description='1: stream the csv file instead of returning an S3 url',
+    required=False,
+)
 
-    total_income = 0
-    total_expense = 0
-    running_balance = 0
-    accountings = Accounting.objects.filter(user=user, date__year=year)
-    if month:
-        accountings = accountings.filter(date__month=month)
 
-    for accounting in accountings:
-        year_str = accounting.date.year
-        month_str = accounting.date.month
-        day_str = accounting.date.day
-        categories = ", ".join([category.name for category in accounting.category.all()])
-        type_str = "收入" if accounting.type == 'income' else "支出"
-        income_amount = accounting.amount if accounting.type == 'income' else ""
-        expense_amount = accounting.amount if accounting.type == 'outcome' else ""
-        running_balance += accounting.amount if accounting.type == 'income' else -accounting.amount
-        if accounting.type == 'income':
-            total_income += accounting.amount
-        else:
-            total_expense += accounting.amount
+def job_response(request, job):
+    """Return the status payload of a report job"""
+    data = {
+        "job_id": job.id,
+        "status": job.status,
+        "filename": report_filename(job.year, job.month),
+        "status_url": request.build_absolute_uri(reverse('reports:report_job', args=[job.id])),
+    }
+    if job.status == ReportJob.STATUS_DONE:
+        data["url"] = request.build_absolute_uri(get_report_storage().url(job.file_key))
+    elif job.status == ReportJob.STATUS_FAILED:
+        data["error"] = job.error
 
-        writer.writerow([year_str, month_str, day_str, categories, type_str, accounting.title, income_amount, expense_amount, running_balance])
+    return data
 
-    writer.writerow(['總計', '', '', '', '', '', total_income, total_expense, running_balance])
 
-    month_target = MonthTarget.objects.filter(user=user, year=year)
-    if month:
-        month_target = month_target.filter(month=month)
+def enqueued_response(request, job):
+    """Return a queued job as 202, or as 200 when a current report was already stored"""
+    code = status.HTTP_200_OK if job.status == ReportJob.STATUS_DONE else status.HTTP_202_ACCEPTED
 
-    if month_target.exists():
-        target = month_target.first()
-        income_rate = (total_income / target.income * 100) if target.income else 0
-        outcome_rate = (total_expense / target.outcome * 100) if target.outcome else 0
-        writer.writerow([f'{month}月目標金額', '', '', '', '', '收入目標', target.income, '支出目標', target.outcome])
-        writer.writerow([f'{month}月目標達成率', '', '', '', '', '收入達成率', f"{income_rate:.2f}%", '支出達成率', f"{outcome_rate:.2f}%"])
+    return Response(job_response(request, job), status=code)
 
-    csv_content = csv_output.getvalue()
-    csv_output.close()
 
-    return filename, csv_content.encode('utf_8_sig')
+class MonthlyReportAPIView(APIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
 
+    @swagger_auto_schema(
+        operation_description="queue a monthly report and return its job, poll status_url for the url \
+                               (the url will be expired in 180 seconds), \
+                               an unchanged stored report is returned without queueing",
+        manual_parameters=[DOWNLOAD_PARAMETER],
+        responses={
+            200: "report unchanged since it was stored, url included",
+            202: "queued",
+            401: "unauthorized",
+        }
+    )
+    def get(self, request, year, month):
+        if request.query_params.get('download') == '1':
+            return stream_csv_response(request.user, year, month)
 
-def store_csv_file(user_account, filename, csv_content):
-    s3_client = boto3.client('s3')
-    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+        job = jobs.enqueue_report_job(request.user, year, month)
 
-    s3_file_key = f"{user_account}/{filename}"
+        return enqueued_response(request, job)
 
-    csv_bytes = BytesIO(csv_content)
 
-    s3_client.upload_fileobj(csv_bytes, bucket_name, s3_file_key)
+class YearlyReportAPIView(APIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
 
-    presigned_url = s3_client.generate_presigned_url(
-        'get_object',
-        Params={'Bucket': bucket_name, 'Key': s3_file_key},
-        ExpiresIn=180
+    @swagger_auto_schema(
+        operation_description="queue a yearly report and return its job, poll status_url for the url \
+                               (the url will be expired in 180 seconds), \
+                               an unchanged stored report is returned without queueing",
+        manual_parameters=[DOWNLOAD_PARAMETER],
+        responses={
+            200: "report unchanged since it was stored, url included",
+            202: "queued",
+            401: "unauthorized",
+        }
     )
+    def get(self, request, year):
+        if request.query_params.get('download') == '1':
+            return stream_csv_response(request.user, year)
 
-    return presigned_url
+        job = jobs.enqueue_report_job(request.user, year)
 
-class MonthlyReportAPIView(APIView):
-    authentication_classes = (TokenAuthentication,)
+        return enqueued_response(request, job)
+
+
+class ReportJobAPIView(APIView):
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     @swagger_auto_schema(
-        operation_description="get monthly report, the url will be expired in 180 seconds",
+        operation_description="get the status of a report job, done jobs include a url expiring in 180 seconds",
         responses={
             200: "success",
             401: "unauthorized",
+            404: "not found",
         }
     )
-    def get(self, request, year, month):
-        filename, csv_content = generate_csv(request.user, year, month)
-        file_url = store_csv_file(request.user.account, filename, csv_content)
-        print(file_url)
+    def get(self, request, job_id):
+        job = ReportJob.objects.filter(id=job_id, user=request.user).first()
+        if job is None:
+            return Response({"error": "Report job not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response({
-            "filename": filename,
-            "url": file_url
-        })
+        return Response(job_response(request, job))
 
 
-class YearlyReportAPIView(APIView):
-    authentication_classes = (TokenAuthentication,)
+class ImportCsvAPIView(APIView):
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    parser_classes = (MultiPartParser,)
 
     @swagger_auto_schema(
-        operation_description="get yearly report, the url will be expired in 180 seconds",
+        operation_description="import accounting records from a csv file in the report layout \
+                               (年份, 月份, 日期, 項目, 類別, 名稱, 收入金額, 支出金額), \
+                               either every row is imported or none is and the invalid rows are returned",
+        manual_parameters=[
+            openapi.Parameter(
+                name='file',
+                in_=openapi.IN_FORM,
+                type=openapi.TYPE_FILE,
+                description='csv file',
+                required=True,
+            ),
+        ],
         responses={
-            200: "success",
+            201: "imported",
+            400: "invalid file or rows",
             401: "unauthorized",
         }
     )
-    def get(self, request, year):
-        filename, csv_content = generate_csv(request.user, year)
-        file_url = store_csv_file(request.user.account, filename, csv_content)
+    def post(self, request):
+        uploaded = request.FILES.get('file')
+        if uploaded is None:
+            return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({
-            "filename": filename,
-            "url": file_url
-        })
+        try:
+            created = import_csv(request.user, open_csv_text(uploaded.open('rb')))
+        except CsvImportError as e:
+            return Response({"errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({"error": "The file is not UTF-8 encoded"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"created": created}, status=status.HTTP_201_CREATED)
+
+
+class ReportFileAPIView(APIView):
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    @swagger_auto_schema(
+        operation_description="download a report stored on the local filesystem through a signed url \
+                               (the url will be expired in 180 seconds)",
+        responses={
+            200: "success",
+            404: "not found or expired",
+        }
+    )
+    def get(self, request, token):
+        storage = get_report_storage()
+        if not isinstance(storage, LocalReportStorage):
+            raise Http404
+
+        try:
+            key, file = storage.open(token)
+        except (signing.BadSignature, ValueError, FileNotFoundError):
+            raise Http404
+
+        response = FileResponse(file, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = content_disposition_header(True, key.rsplit('/', 1)[-1])
+
+        return response
 
 
 DEFINE_WORD = '''
@@ -152,7 +211,7 @@ DEFINE_WORD = '''
 建議您優先掌握支出，尋找降低成本的方式，同時積極提升收入。制定明確的預算，規劃未來的金融目標，有助於改善財務狀況。
 '''
 class MonthlyAnalysisAPIView(APIView):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get(self, request, year, month):
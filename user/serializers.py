@@ -42,15 +42,20 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
     def update(self, instance, validated_data):
-        """Update and return a user """
+        """Update and return a user, saving only the fields sent"""
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        update_fields = list(validated_data)
 
         if password:
-            user.set_password(password)
-            user.save()
+            instance.set_password(password)
+            update_fields.append('password')
 
-        return user
+        if update_fields:
+            instance.save(update_fields=update_fields)
+
+        return instance
 
 class AuthTokenSerializer(serializers.Serializer):
     """Serializer for the user auth token"""
@@ -7,6 +7,9 @@ from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from core.authentication import reset_token_cache
 
 
 CREATE_USER_URL = reverse('auth:register')
@@ -209,3 +212,38 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn('token', res.data)
         self.assertNotEqual(first_token, second_token)
+
+
+class CachedUserUpdateTests(TestCase):
+    """Test updates of the authenticated user are not made from the token cache copy"""
+
+    def setUp(self):
+        reset_token_cache()
+        self.user = create_user(account='apiccount', password='testpass123', email='old@example.com', name='ApiTest')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        # Caches the token and its user
+        self.client.get(ME_URL)
+
+    def test_update_keeps_other_changes(self):
+        """Test fields changed since the user was cached are not written back"""
+        get_user_model().objects.filter(pk=self.user.pk).update(email='new@example.com', is_staff=True)
+
+        res = self.client.patch(ME_URL, {'name': 'NewName'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'NewName')
+        self.assertEqual(self.user.email, 'new@example.com')
+        self.assertTrue(self.user.is_staff)
+
+    def test_deactivated_user_cannot_update(self):
+        """Test a user deactivated since it was cached stays inactive"""
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+
+        res = self.client.patch(ME_URL, {'name': 'NewName'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(self.user.name, 'ApiTest')
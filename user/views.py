@@ -1,14 +1,20 @@
 """
 Views for user api
 """
-from rest_framework import generics, authentication, permissions, status
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from rest_framework.authtoken.models import Token
 
+from core.authentication import CachedTokenAuthentication
+
 from user.serializers import (UserSerializer, AuthTokenSerializer)
 
 
@@ -27,7 +33,7 @@ class CreateUserView(generics.CreateAPIView):
 
 class LogoutView(APIView):
     """Handle logout requests"""
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def post(self, request):
@@ -60,9 +66,23 @@ class CreateTokenView(ObtainAuthToken):
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
-        """Retrieve and return the authenticated user"""
-        return self.request.user
\ No newline at end of file
+        """Retrieve and return the authenticated user
+
+        request.user may come from the token cache, so writes lock and read
+        the current row instead of saving older values back.
+        """
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+
+        user = get_user_model().objects.select_for_update().get(pk=self.request.user.pk)
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return user
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)